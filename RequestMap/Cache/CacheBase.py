@@ -0,0 +1,50 @@
+from typing import Any, NamedTuple
+
+
+class CachePolicy(NamedTuple):
+    '''
+    The caching policy of an endpoint, compiled from its "cache" metadata:
+    cache={'ttl': 30, 'maxsize': 10000, 'varyOn': ['userId']}
+    - ttl: seconds a result stays fresh. Required.
+    - maxsize: the maximum number of results kept for the endpoint. Defaults to 1024.
+    - varyOn: the parameters that make up the cache key. Defaults to every named parameter of the handler.
+      This is compiled into the dispatch plan, as it is shared with single-flight.
+    '''
+    ttl: float
+    maxsize: int
+
+    @classmethod
+    def fromEndpoint(cls, endpoint):
+        'Returns the policy of the endpoint, or None if the endpoint is not cached.'
+        config = endpoint.metadata.get('cache')
+        if not config:
+            return None
+        if not isinstance(config, dict) or not isinstance(config.get('ttl'), (int, float)):
+            raise TypeError(
+                f"Cache metadata of {endpoint.endpointIdentifier} must be a dict with a numeric ttl.")
+        return cls(config['ttl'], config.get('maxsize', 1024))
+
+
+class StandardCacheBackend():
+    '''
+    Stores endpoint results. Results are grouped by namespace (the endpointIdentifier).
+    Keys are hashable tuples built by the Map.
+    Backends must be thread-safe.
+    '''
+
+    def __init__(self) -> None:
+        pass
+
+    def get(self, namespace: str, key: tuple) -> Any:
+        'Returns the stored value. Raises KeyError if the key is missing or expired.'
+        raise NotImplementedError()
+
+    def set(self, namespace: str, key: tuple, value: Any, ttl: float, maxsize: int) -> None:
+        raise NotImplementedError()
+
+    def invalidate(self, namespace: str = None, key: tuple = None) -> None:
+        '''
+        Removes stored values.
+        Without a namespace, everything is removed. Without a key, the whole namespace is removed.
+        '''
+        raise NotImplementedError()
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from typing import Any
+import threading
+import time
+
+from .CacheBase import StandardCacheBackend
+
+
+class LRUCacheBackend(StandardCacheBackend):
+    def __init__(self) -> None:
+        '''
+        An in-process cache. Each namespace keeps at most `maxsize` values and evicts the least recently used one.
+        '''
+        super().__init__()
+        self.namespaces = {}
+        self.lock = threading.Lock()
+
+    def get(self, namespace: str, key: tuple) -> Any:
+        with self.lock:
+            entries = self.namespaces[namespace]
+            expiresAt, value = entries[key]
+            if expiresAt <= time.monotonic():
+                del entries[key]
+                raise KeyError(key)
+            entries.move_to_end(key)
+            return value
+
+    def set(self, namespace: str, key: tuple, value: Any, ttl: float, maxsize: int) -> None:
+        with self.lock:
+            entries = self.namespaces.get(namespace)
+            if entries is None:
+                entries = self.namespaces[namespace] = OrderedDict()
+            entries[key] = (time.monotonic() + ttl, value)
+            entries.move_to_end(key)
+            while len(entries) > maxsize:
+                entries.popitem(last=False)
+
+    def invalidate(self, namespace: str = None, key: tuple = None) -> None:
+        with self.lock:
+            if namespace is None:
+                self.namespaces.clear()
+            elif key is None:
+                self.namespaces.pop(namespace, None)
+            elif namespace in self.namespaces:
+                self.namespaces[namespace].pop(key, None)
@@ -0,0 +1,2 @@
+from . import CacheBase as CacheBase
+from . import LRU as LRU
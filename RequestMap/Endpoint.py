@@ -0,0 +1,84 @@
+from typing import Any, Callable, NamedTuple
+
+
+class Endpoint():
+    '''
+    A registered endpoint.
+    Item access (endpoint['metadata']) is supported so protocols and validators
+    written against the dictionary form of an endpoint keep working.
+    '''
+    __slots__ = ('endpointIdentifier', 'endpointHandler', 'dataConverters', 'varKeyword',
+                 'nonOptionalParameters', 'optionalParameters', 'metadata', 'batchHandler', 'plans')
+
+    def __init__(self, endpointIdentifier: str, endpointHandler: Callable, dataConverters: dict, varKeyword: str, nonOptionalParameters: tuple, optionalParameters: tuple, metadata: dict) -> None:
+        self.endpointIdentifier = endpointIdentifier
+        self.endpointHandler = endpointHandler
+        self.dataConverters = dataConverters
+        self.varKeyword = varKeyword
+        self.nonOptionalParameters = nonOptionalParameters
+        self.optionalParameters = optionalParameters
+        self.metadata = metadata
+        # Receives a list of callDicts and returns a list of responses. See Map.registerBatchHandler.
+        self.batchHandler = None
+        # Protocol -> DispatchPlan. Maintained by the Map.
+        self.plans = {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'plans' or key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key != 'plans' and key in self.__slots__
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self) -> str:
+        return f'<Endpoint {self.endpointIdentifier}>'
+
+
+class CompiledValidator(NamedTuple):
+    'The evaluation method of a validator for an endpoint and protocol, analysed by Map.compilePlan.'
+    evaluate: Callable
+    varKeyword: str
+    nonOptionalParameters: list
+    optionalParameters: dict
+    validator: Any
+    # The parameters that identify a successful evaluation in the validator cache, or None if it is not cached
+    cacheKey: tuple
+    # Whether it may run at the same time as the other concurrent validators next to it
+    concurrent: bool
+
+
+class DispatchPlan(NamedTuple):
+    '''
+    The precompiled dispatch plan of an endpoint for a single protocol.
+    Built by Map.compilePlan whenever the endpoints, protocols or validators change,
+    so that a request only has to fetch parameters and call.
+    '''
+    endpoint: Endpoint
+    protocol: Any
+    # Tuple of groups (tuples) of CompiledValidator, from the cheapest to the most expensive.
+    # The validators of a group run concurrently.
+    validators: tuple
+    makeResponse: Callable
+    # Whether the handler, a validator or a data converter is a coroutine function
+    isAsync: bool
+    # CachePolicy, or None if the results of the endpoint are not cached
+    cache: Any
+    # Whether concurrent identical calls are coalesced
+    singleFlight: bool
+    # The parameters that identify a call for the cache and single-flight, or None if neither is used
+    varyOn: tuple
+    # ProcessPolicy, or None if the handler runs in the calling thread
+    process: Any
+    # Tuple of (AdmissionLimiter, priority) to acquire before the call, or None if the endpoint is not limited
+    admission: tuple
+    # ETagPolicy, or None if the responses of the endpoint have no entity tag
+    etag: Any
+    # Whether the handler can be called directly, without going through Map.callEndpoint
+    direct: bool
@@ -1,25 +1,84 @@
-from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
+from functools import partial, wraps
 import inspect
+import os
+import signal
+import threading
 from typing import Callable
 
+from .Endpoint import CompiledValidator, Endpoint, DispatchPlan
+from .Cache.CacheBase import CachePolicy, StandardCacheBackend
+from .Cache.LRU import LRUCacheBackend
 from .Response.ResponseBase import NoResponseHandler, StandardResponseHandler
 from .Protocols.ProtocolBase import StandardProtocolHandler
+from .Protocols.Local import LocalClient, LocalProtocol
 from .Validators.ValidatorBase import StandardValidator
+from .Utilities.Admission import PRIORITIES, AdmissionLimiter, AdmissionPolicy
+from .Utilities.ETag import CONDITIONAL_REQUEST, ConditionalRequest, ETagPolicy
 from .Utilities.JITDictionary import JITDict
+from .Utilities.SingleFlight import SingleFlight
+from .Utilities.Streaming import isStream
+from .Utilities.Metrics import DEFAULT_BUCKETS, MetricsCollector
+from .Utilities.Profiling import Profiler
+from .Utilities.ProcessPool import DeferredResponse, ProcessPolicy, discardBytes, loadBytes, \
+    releaseSharedMemory, runInProcess, shareBytes
 from .Exceptions import MissingParameter, ParameterConversionFailure, \
-    EndpointNotFound, RequestMapException
+    EndpointNotFound, ExecutionTimeout, RequestMapException
 
 import time
 import logging
 
 
+# The longest delay before a worker of Map.serve is restarted, in seconds
+MAX_RESTART_DELAY = 30
+
+# Data names that are provided by the Map rather than by the request
+RESERVED_DATA_NAMES = ('makeResponse', 'getData',
+                       'protocol', 'endpoint', 'sendData', CONDITIONAL_REQUEST)
+
+
+async def _resolve(value):
+    'Awaits value if it is awaitable.'
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
 class Map():
-    def __init__(self) -> None:
-        'Note: DataName of \'makeResponse\' is reserved for the response handler'
+    def __init__(self, maxExecutorWorkers: int = None, maxProcessWorkers: int = None) -> None:
+        '''
+        Note: DataName of \'makeResponse\' is reserved for the response handler
+        :param maxExecutorWorkers: The size of the thread pool that runs synchronous endpoint handlers for incomingRequestAsync.
+        :param maxProcessWorkers: The size of the process pool that runs endpoints with {'executor': 'process'} metadata.
+        '''
         self.endpointMap = {}
         self.installedProtocols = []
         self.installedResponseHandler = NoResponseHandler()
         self.installedValidators = []
+        self.maxExecutorWorkers = maxExecutorWorkers
+        self.executor = None
+        self.maxProcessWorkers = maxProcessWorkers
+        self.processPool = None
+        # endpointIdentifier -> BoundedSemaphore limiting its calls in the process pool
+        self.processSemaphores = {}
+        # The limit shared by every endpoint, see useAdmissionControl
+        self.admissionLimiter = None
+        # endpointIdentifier -> AdmissionLimiter of the endpoint
+        self.admissionLimiters = {}
+        self.cacheBackend = LRUCacheBackend()
+        # Successful validator evaluations, by validator (see StandardValidator.cacheKey)
+        self.validatorCache = LRUCacheBackend()
+        self.singleFlight = SingleFlight()
+        self.metrics = None
+        self.profiler = None
+        # Installed by client()
+        self.localProtocol = None
+        # (event loop, pid of the process it runs in) of asynchronous plans called through incomingRequest, see getEventLoop
+        self.loop = None
+        self.loopLock = threading.Lock()
+        # Set by stop()
+        self.stopped = threading.Event()
 
     def analyseParameters(self, func):
         parameters = inspect.signature(func).parameters
@@ -43,7 +102,7 @@ class Map():
                     nonOptionalParameters.append(name)
         return varKeyword, nonOptionalParameters, optionalParameters
 
-    def getCallDict(self, getData: Callable, varKeyword: str = None, nonOptionalParameters: list = [], optionalParameters: dict = {}, dataConverters: dict = {}) -> dict:
+    def getCallDict(self, getData: Callable, varKeyword: str = None, nonOptionalParameters: list = [], optionalParameters: dict = {}, dataConverters: dict = {}, getKeys: Callable = None) -> dict:
         # Check if all required parameters are present
         callDict = {}
 
@@ -72,7 +131,28 @@ class Map():
                     raise ParameterConversionFailure(parameter)
 
         if varKeyword is not None:
-            callDict[varKeyword] = JITDict(getData)
+            callDict[varKeyword] = JITDict(getData, getKeys=getKeys)
+
+        return callDict
+
+    async def getCallDictAsync(self, getData: Callable, varKeyword: str = None, nonOptionalParameters: list = [], optionalParameters: dict = {}, dataConverters: dict = {}, getKeys: Callable = None) -> dict:
+        'Same as getCallDict, except that data converters may be coroutine functions.'
+        callDict = self.getCallDict(
+            getData, None, nonOptionalParameters, optionalParameters)
+
+        # Convert Parameters
+        for parameter in dataConverters:
+            if parameter in callDict:
+                try:
+                    callDict[parameter] = await _resolve(dataConverters[parameter](
+                        callDict[parameter]))
+                except RequestMapException:
+                    raise
+                except Exception:
+                    raise ParameterConversionFailure(parameter)
+
+        if varKeyword is not None:
+            callDict[varKeyword] = JITDict(getData, getKeys=getKeys)
 
         return callDict
 
@@ -103,27 +183,22 @@ class Map():
             endpointHandler)
 
         # Register endpoint
-        self.endpointMap[endpointIdentifier] = {
-            "endpointIdentifier": endpointIdentifier,
-            "endpointHandler": endpointHandler,
-            "dataConverters": dataConverters,
-            "varKeyword": varKeyword,
-            "nonOptionalParameters": nonOptionalParameters,
-            "optionalParameters": optionalParameters,
-            "metadata": metadata
-        }
+        endpoint = Endpoint(endpointIdentifier, endpointHandler, dataConverters,
+                            varKeyword, nonOptionalParameters, optionalParameters, metadata)
+        # The plans are compiled before the endpoint is added, so invalid metadata does not leave it half-registered.
+        try:
+            self.validateMetadata(endpoint)
+            for protocolHandler in self.installedProtocols:
+                self.compilePlan(endpoint, protocolHandler)
+        except BaseException:
+            self.processSemaphores.pop(endpointIdentifier, None)
+            self.admissionLimiters.pop(endpointIdentifier, None)
+            raise
+        self.endpointMap[endpointIdentifier] = endpoint
 
         # Notify installed protocols
         for protocolHandler in self.installedProtocols:
-            protocolHandler.onNewEndpoint({
-                "endpointIdentifier": endpointIdentifier,
-                "endpointHandler": endpointHandler,
-                "dataConverters": dataConverters,
-                "varKeyword": varKeyword,
-                "nonOptionalParameters": nonOptionalParameters,
-                "optionalParameters": optionalParameters,
-                "metadata": metadata
-            })
+            protocolHandler.onNewEndpoint(endpoint)
 
     def endpoint(self, endpointIdentifier: str, metadata: dict = {}, **dataConverters: dict) -> None:
         def _endpoint_internal(func):
@@ -136,6 +211,29 @@ class Map():
             return __endpoint_internal
         return _endpoint_internal
 
+    def registerBatchHandler(self, batchHandler: Callable, endpointIdentifier: str) -> None:
+        '''
+        Register the batched form of an endpoint, used by incomingRequestBatch.
+        :param batchHandler: Receives a list of callDicts, each with the parameters of the endpoint handler, and returns
+        a list with the response to each of them, in the same order. An Exception in that list fails only its call.
+        :param endpointIdentifier: The identifier of a registered endpoint.
+        '''
+        if not callable(batchHandler):
+            raise TypeError("BatchHandler is not callable.")
+        if inspect.iscoroutinefunction(batchHandler):
+            raise TypeError("BatchHandler can not be a coroutine function.")
+        if endpointIdentifier not in self.endpointMap:
+            raise ValueError(
+                f"Endpoint {endpointIdentifier} must be registered before its batch handler.")
+        self.endpointMap[endpointIdentifier].batchHandler = batchHandler
+
+    def batched(self, endpointIdentifier: str) -> Callable:
+        'Decorator form of registerBatchHandler.'
+        def _batched_internal(func):
+            self.registerBatchHandler(func, endpointIdentifier)
+            return func
+        return _batched_internal
+
     def responseStandardizerProxy(self, realProtocol):
         'Adds the protocol to the standardizer call'
         def _responseStandardizerProxy(*args, protocol=None, **kw):
@@ -143,26 +241,162 @@ class Map():
             return self.installedResponseHandler.standardizeResponse(*args, protocol=realProtocol, **kw)
         return _responseStandardizerProxy
 
-    def getDataProxy(self, getData, sendData, protocol, endpoint):
+    def compilePlan(self, endpoint: Endpoint, protocol: StandardProtocolHandler) -> DispatchPlan:
+        '''
+        Compiles and stores the dispatch plan of an endpoint for a protocol.
+        Validator evaluation methods are resolved and analysed here, once, instead of on every request.
+        '''
+        validators = []
+        # sorted is stable, so validators of the same cost keep their installation order.
+        for validator in sorted(self.installedValidators, key=lambda validator: getattr(validator, 'cost', 0)):
+            evaluate = validator.getEvaluationMethod(
+                endpoint, protocol=protocol)
+            if not callable(evaluate):
+                raise TypeError(
+                    "Evaluation method is not callable. Validator: " + str(validator) + ', endpointIdentifier: ' + str(endpoint.endpointIdentifier) + ', protocolName: ' + str(protocol.name))
+            varKeyword, nonOptionalParameters, optionalParameters = self.analyseParameters(evaluate)
+            cacheKey = getattr(validator, 'cacheKey', None)
+            if cacheKey is not None and getattr(validator, 'cacheTTL', None):
+                cacheKey = tuple(cacheKey)
+                for name in cacheKey:
+                    # Data the evaluation method reads through getData or **kw is not part of the key,
+                    # so a key naming it would let one successful evaluation pass every request.
+                    if name in RESERVED_DATA_NAMES or (name not in nonOptionalParameters and name not in optionalParameters):
+                        raise TypeError(
+                            f"The cacheKey of {validator} names {name}, which is not a named parameter of its evaluation method for {endpoint.endpointIdentifier}.")
+            else:
+                cacheKey = None
+            compiled = CompiledValidator(evaluate, varKeyword, nonOptionalParameters, optionalParameters, validator,
+                                         cacheKey, bool(getattr(validator, 'concurrent', False)))
+            if compiled.concurrent and validators and validators[-1][-1].concurrent:
+                validators[-1].append(compiled)
+            else:
+                validators.append([compiled])
+
+        etag = ETagPolicy.fromEndpoint(endpoint)
+
+        isAsync = inspect.iscoroutinefunction(endpoint.endpointHandler) or \
+            any(inspect.iscoroutinefunction(validator.evaluate) for group in validators for validator in group) or \
+            any(inspect.iscoroutinefunction(converter)
+                for converter in endpoint.dataConverters.values()) or \
+            (etag is not None and inspect.iscoroutinefunction(etag.version))
+
+        cache = CachePolicy.fromEndpoint(endpoint)
+        singleFlight = endpoint.metadata.get('singleFlight', False)
+        varyOn = None
+        if cache is not None or singleFlight:
+            varyOn = self.getVaryOn(endpoint)
+
+        process = ProcessPolicy.fromEndpoint(endpoint, RESERVED_DATA_NAMES)
+        if process is not None and process.concurrency and endpoint.endpointIdentifier not in self.processSemaphores:
+            self.processSemaphores[endpoint.endpointIdentifier] = threading.BoundedSemaphore(
+                process.concurrency)
+
+        admission = []
+        policy = AdmissionPolicy.fromEndpoint(endpoint)
+        priority = PRIORITIES['normal'] if policy is None else policy.priority
+        if policy is not None and policy.maxInFlight:
+            limiter = self.admissionLimiters.get(endpoint.endpointIdentifier)
+            if limiter is None:
+                limiter = self.admissionLimiters[endpoint.endpointIdentifier] = AdmissionLimiter(
+                    endpoint.endpointIdentifier, policy.maxInFlight, policy.maxQueue, policy.queueTimeout)
+            admission.append((limiter, priority))
+        if self.admissionLimiter is not None:
+            # Acquired last, so calls waiting for their endpoint do not hold a shared slot.
+            admission.append((self.admissionLimiter, priority))
+
+        plan = DispatchPlan(
+            endpoint=endpoint,
+            protocol=protocol,
+            validators=tuple(tuple(group) for group in validators),
+            makeResponse=self.responseStandardizerProxy(protocol),
+            isAsync=isAsync,
+            cache=cache,
+            singleFlight=bool(singleFlight),
+            varyOn=varyOn,
+            process=process,
+            admission=tuple(admission) if admission else None,
+            etag=etag,
+            direct=varyOn is None and process is None
+        )
+        endpoint.plans[protocol] = plan
+        return plan
+
+    def validateMetadata(self, endpoint: Endpoint) -> None:
+        'Raises if the metadata of the endpoint is invalid, whatever the protocol.'
+        ETagPolicy.fromEndpoint(endpoint)
+        AdmissionPolicy.fromEndpoint(endpoint)
+        if CachePolicy.fromEndpoint(endpoint) is not None or endpoint.metadata.get('singleFlight', False):
+            self.getVaryOn(endpoint)
+        if ProcessPolicy.fromEndpoint(endpoint, RESERVED_DATA_NAMES) is not None and \
+                inspect.iscoroutinefunction(endpoint.endpointHandler):
+            raise TypeError(
+                f"The handler of {endpoint.endpointIdentifier} can not be a coroutine function as it runs in a process.")
+
+    def getVaryOn(self, endpoint: Endpoint) -> tuple:
+        '''
+        Returns the parameters that identify a call to the endpoint:
+        "varyOn" of the cache or singleFlight metadata, or every parameter of the handler,
+        including its variable keyword arguments. Handlers that take getData can read any data of the request,
+        so they must name their varyOn parameters.
+        '''
+        for name in ('cache', 'singleFlight'):
+            config = endpoint.metadata.get(name)
+            if isinstance(config, dict) and config.get('varyOn') is not None:
+                return tuple(config['varyOn'])
+        parameters = (*endpoint.nonOptionalParameters,
+                      *endpoint.optionalParameters)
+        if 'getData' in parameters:
+            raise TypeError(
+                f"The handler of {endpoint.endpointIdentifier} takes getData, so its cache or singleFlight metadata must have a varyOn.")
+        if endpoint.varKeyword is not None:
+            parameters += (endpoint.varKeyword,)
+        return tuple(name for name in parameters if name not in RESERVED_DATA_NAMES)
+
+    def recompilePlans(self) -> None:
+        'Recompiles every dispatch plan. Called when the installed validators change.'
+        for endpoint in self.endpointMap.values():
+            protocols = set(endpoint.plans) | set(self.installedProtocols)
+            endpoint.plans = {}
+            for protocol in protocols:
+                self.compilePlan(endpoint, protocol)
+
+    def getConditionalRequest(self, getData) -> ConditionalRequest:
+        'Returns the ConditionalRequest the protocol passes, or one that never matches if the protocol does not support them.'
+        conditionalRequest = getData(CONDITIONAL_REQUEST)
+        if isinstance(conditionalRequest, ConditionalRequest):
+            return conditionalRequest
+        return ConditionalRequest()
+
+    def getVersion(self, plan: DispatchPlan, callDict: dict):
+        'Calls the version function of the endpoint (see ETagPolicy) with the parameters it names.'
+        return plan.etag.version(**{name: callDict.get(name) for name in plan.etag.versionParameters})
+
+    def getDataProxy(self, getData, sendData, plan: DispatchPlan):
+        'Returns a getData function that also handles "makeResponse" and other reserved data names'
+        # Keep in sync with RESERVED_DATA_NAMES
+        reservedDataNames = {
+            'makeResponse': plan.makeResponse,
+            'protocol': plan.protocol,
+            'endpoint': plan.endpoint,
+            'sendData': sendData,
+            CONDITIONAL_REQUEST: None if plan.etag is None else self.getConditionalRequest(getData)
+        }
+
         def _getDataProxy(key):
-            reservedDataNames = {
-                'makeResponse': self.responseStandardizerProxy(protocol),
-                'getData': self.getDataProxy(getData, sendData, protocol, endpoint),
-                'protocol': protocol,
-                'endpoint': endpoint,
-                'sendData': sendData
-            }
             if key in reservedDataNames:
                 return reservedDataNames[key]
             return getData(key)
+        reservedDataNames['getData'] = _getDataProxy
         return _getDataProxy
 
-    def incomingRequest(self, protocol: StandardProtocolHandler, endpointIdentifier: str, getData: Callable, sendData: Callable):
+    def incomingRequest(self, protocol: StandardProtocolHandler, endpointIdentifier: str, getData: Callable, sendData: Callable, getKeys: Callable = None):
         '''
         Handle an incoming request.
         :param endpointIdentifier: The endpoint identifier.
         :param getData: The getData function.
         :param sendData: The sendData function.
+        :param getKeys: Optional. Returns the keys of the request data, so variable keyword arguments can be iterated.
         :return:
 
         Notes on data priority:
@@ -172,46 +406,678 @@ class Map():
         '''
 
         # Validate endpointIdentifier
-        if endpointIdentifier not in self.endpointMap:
+        endpoint = self.endpointMap.get(endpointIdentifier)
+        if endpoint is None:
             return sendData(self.installedResponseHandler.exceptionHandler(EndpointNotFound(endpointIdentifier), protocol=protocol))
-        endpoint = self.endpointMap[endpointIdentifier]
+        plan = endpoint.plans.get(protocol)
+        if plan is None:
+            # The protocol was not installed through useProtocol.
+            plan = self.compilePlan(endpoint, protocol)
+        if plan.isAsync:
+            # Coroutine handlers, validators or converters need an event loop.
+            import asyncio
+            loop = self.getEventLoop()
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                raise RuntimeError(
+                    f"{endpointIdentifier} is asynchronous and can not be called synchronously from the event loop of the map. Use incomingRequestAsync.")
+            return asyncio.run_coroutine_threadsafe(
+                self.incomingRequestAsync(protocol, endpointIdentifier, getData, sendData, getKeys), loop).result()
 
-        # Replaces getData with proxy so it can handle "makeResponse" and other reserved data names
-        getData = self.getDataProxy(getData, sendData, protocol, endpoint)
+        observer = None if self.metrics is None else self.metrics.begin(
+            endpointIdentifier, protocol.name)
+        getData = self.getDataProxy(getData, sendData, plan)
 
-        # Validate the request
-        for validator in self.installedValidators:
-            evaluate = validator.getEvaluationMethod(
-                endpoint, protocol=protocol)
-            if not callable(evaluate):
-                raise TypeError(
-                    "Evaluation method is not callable. Validator: " + str(validator) + ', endpointIdentifier: ' + str(endpoint['endpointIdentifier']) + ', protocolName: ' + str(protocol.name))
-            varKeyword, nonOptionalParameters, optionalParameters = self.analyseParameters(
-                evaluate)
+        admitted = ()
+        profile = None
+        try:
+            if plan.admission is not None:
+                admitted = self.admit(plan)
+                if observer is not None:
+                    observer.mark('admission')
+
+            if self.profiler is not None:
+                # Profiles the validators, getCallDict and the handler
+                profile = self.profiler.begin(endpointIdentifier)
+
+            # Validate the request
+            if plan.validators:
+                self.evaluateValidators(plan, getData, getKeys)
+            if observer is not None:
+                observer.mark('validators')
+
+            # Prepare to call the endpoint
+            callDict = self.getCallDict(
+                getData, endpoint.varKeyword, endpoint.nonOptionalParameters, endpoint.optionalParameters, endpoint.dataConverters, getKeys)
+            if plan.etag is not None and plan.etag.version is not None:
+                # Raises NotModified if the client has the current version
+                getData(CONDITIONAL_REQUEST).check(
+                    self.getVersion(plan, callDict), plan.etag.weak)
+            if observer is not None:
+                observer.mark('getCallDict')
+
+            # Calls the endpoint
+            # Note: This does NOT return the data from the handler.
+            if plan.direct:
+                response = endpoint.endpointHandler(**callDict)
+            else:
+                response = self.callEndpoint(plan, callDict)
+            if observer is not None:
+                observer.mark('handler')
+            if profile is not None:
+                self.profiler.end(profile)
+                profile = None
+
+            response = sendData(response)
+            if observer is not None:
+                observer.mark('response')
+            return response
+        except Exception as e:
+            response = sendData(
+                self.installedResponseHandler.exceptionHandler(e, protocol=protocol))
+            if observer is not None:
+                observer.fail(e)
+            return response
+        finally:
+            if profile is not None:
+                self.profiler.end(profile)
+            for limiter in admitted:
+                limiter.release()
+
+    async def incomingRequestAsync(self, protocol: StandardProtocolHandler, endpointIdentifier: str, getData: Callable, sendData: Callable, getKeys: Callable = None):
+        '''
+        Handle an incoming request on the running event loop.
+        Endpoint handlers, validator evaluation methods and data converters may be coroutine functions.
+        Synchronous endpoint handlers are run in the executor of the Map (see getExecutor).
+        :param endpointIdentifier: The endpoint identifier.
+        :param getData: The getData function.
+        :param sendData: The sendData function. It may be a coroutine function, in which case it is awaited.
+        :param getKeys: Optional. Returns the keys of the request data, so variable keyword arguments can be iterated.
+        :return:
+        '''
+
+        # Validate endpointIdentifier
+        endpoint = self.endpointMap.get(endpointIdentifier)
+        if endpoint is None:
+            return await _resolve(sendData(self.installedResponseHandler.exceptionHandler(EndpointNotFound(endpointIdentifier), protocol=protocol)))
+        plan = endpoint.plans.get(protocol)
+        if plan is None:
+            plan = self.compilePlan(endpoint, protocol)
+
+        observer = None if self.metrics is None else self.metrics.begin(
+            endpointIdentifier, protocol.name)
+        getData = self.getDataProxy(getData, sendData, plan)
+
+        admitted = ()
+        try:
+            if plan.admission is not None:
+                admitted = await self.admitAsync(plan)
+                if observer is not None:
+                    observer.mark('admission')
+
+            # Validate the request
+            if plan.validators:
+                await self.evaluateValidatorsAsync(plan, getData, getKeys)
+            if observer is not None:
+                observer.mark('validators')
+
+            # Prepare to call the endpoint
+            callDict = await self.getCallDictAsync(
+                getData, endpoint.varKeyword, endpoint.nonOptionalParameters, endpoint.optionalParameters, endpoint.dataConverters, getKeys)
+            if plan.etag is not None and plan.etag.version is not None:
+                getData(CONDITIONAL_REQUEST).check(
+                    await _resolve(self.getVersion(plan, callDict)), plan.etag.weak)
+            if observer is not None:
+                observer.mark('getCallDict')
+
+            # Calls the endpoint
+            response = await self.callEndpointAsync(plan, callDict)
+            if observer is not None:
+                observer.mark('handler')
+
+            response = await _resolve(sendData(response))
+            if observer is not None:
+                observer.mark('response')
+            return response
+        except Exception as e:
+            response = await _resolve(sendData(self.installedResponseHandler.exceptionHandler(e, protocol=protocol)))
+            if observer is not None:
+                observer.fail(e)
+            return response
+        finally:
+            for limiter in admitted:
+                limiter.release()
+
+    def getValidatorKey(self, plan: DispatchPlan, validator: CompiledValidator, callDict: dict):
+        'Returns the key of an evaluation in the validator cache, or None if its parameters are not hashable.'
+        values = tuple(callDict.get(name) for name in validator.cacheKey)
+        if validator.validator.cacheShared:
+            key = values
+        else:
+            key = (plan.endpoint.endpointIdentifier, plan.protocol.name, values)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def evaluateValidator(self, plan: DispatchPlan, validator: CompiledValidator, getData: Callable, getKeys: Callable = None) -> None:
+        'Evaluates a validator, unless it is cached. Raises if validation fails.'
+        callDict = self.getCallDict(getData, validator.varKeyword,
+                                    validator.nonOptionalParameters, validator.optionalParameters, {}, getKeys)
+        if validator.cacheKey is None:
+            validator.evaluate(**callDict)
+            return
+        key = self.getValidatorKey(plan, validator, callDict)
+        if key is not None:
             try:
-                evaluationCallDict = self.getCallDict(varKeyword=varKeyword, nonOptionalParameters=nonOptionalParameters,
-                                                      optionalParameters=optionalParameters, getData=getData)
-            except Exception as e:
-                return sendData(self.installedResponseHandler.exceptionHandler(e, protocol=protocol))
+                self.validatorCache.get(validator.validator, key)
+                return
+            except KeyError:
+                pass
+        validator.evaluate(**callDict)
+        if key is not None:
+            self.validatorCache.set(validator.validator, key, True,
+                                    validator.validator.cacheTTL, validator.validator.cacheMaxSize)
+
+    def evaluateValidators(self, plan: DispatchPlan, getData: Callable, getKeys: Callable = None) -> None:
+        '''
+        Evaluates the validators of the plan, in cost order. Raises the first validation failure.
+        The validators of a concurrent group run in the executor, except for the first one, which runs in the calling thread.
+        '''
+        for group in plan.validators:
+            if len(group) == 1:
+                evaluate, varKeyword, nonOptionalParameters, optionalParameters, _, cacheKey, _ = group[0]
+                if cacheKey is None:
+                    evaluate(**self.getCallDict(getData, varKeyword,
+                             nonOptionalParameters, optionalParameters, {}, getKeys))
+                else:
+                    self.evaluateValidator(plan, group[0], getData, getKeys)
+                continue
+            executor = self.getExecutor()
+            futures = [executor.submit(self.evaluateValidator, plan, validator, getData, getKeys)
+                       for validator in group[1:]]
+            try:
+                self.evaluateValidator(plan, group[0], getData, getKeys)
+                for future in concurrent.futures.as_completed(futures):
+                    # Fails as soon as any validator does.
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    async def evaluateValidatorAsync(self, plan: DispatchPlan, validator: CompiledValidator, getData: Callable, getKeys: Callable = None, inExecutor: bool = False) -> None:
+        '''
+        Same as evaluateValidator, on the running event loop.
+        :param inExecutor: Run a synchronous evaluation method in the executor instead of on the event loop.
+        '''
+        callDict = self.getCallDict(getData, validator.varKeyword,
+                                    validator.nonOptionalParameters, validator.optionalParameters, {}, getKeys)
+        key = None
+        if validator.cacheKey is not None:
+            key = self.getValidatorKey(plan, validator, callDict)
+            if key is not None:
+                try:
+                    self.validatorCache.get(validator.validator, key)
+                    return
+                except KeyError:
+                    pass
+        if inExecutor and not inspect.iscoroutinefunction(validator.evaluate):
+            import asyncio
+            await asyncio.get_running_loop().run_in_executor(self.getExecutor(), partial(validator.evaluate, **callDict))
+        else:
+            await _resolve(validator.evaluate(**callDict))
+        if key is not None:
+            self.validatorCache.set(validator.validator, key, True,
+                                    validator.validator.cacheTTL, validator.validator.cacheMaxSize)
+
+    async def evaluateValidatorsAsync(self, plan: DispatchPlan, getData: Callable, getKeys: Callable = None) -> None:
+        'Same as evaluateValidators, on the running event loop. Concurrent groups run as tasks.'
+        for group in plan.validators:
+            if len(group) == 1:
+                await self.evaluateValidatorAsync(plan, group[0], getData, getKeys)
+                continue
+            import asyncio
+            tasks = [asyncio.ensure_future(self.evaluateValidatorAsync(plan, validator, getData, getKeys, True))
+                     for validator in group]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+
+    def admit(self, plan: DispatchPlan) -> list:
+        '''
+        Waits for the admission slots of the plan. Returns the limiters to release after the call.
+        Raises Overloaded if the call is rejected.
+        '''
+        admitted = []
+        try:
+            for limiter, priority in plan.admission:
+                limiter.acquire(priority)
+                admitted.append(limiter)
+        except BaseException:
+            for limiter in admitted:
+                limiter.release()
+            raise
+        return admitted
+
+    async def admitAsync(self, plan: DispatchPlan) -> list:
+        'Same as admit, on the running event loop.'
+        admitted = []
+        try:
+            for limiter, priority in plan.admission:
+                await limiter.acquireAsync(priority)
+                admitted.append(limiter)
+        except BaseException:
+            for limiter in admitted:
+                limiter.release()
+            raise
+        return admitted
+
+    def incomingRequestBatch(self, protocol: StandardProtocolHandler, endpointIdentifier: str, requests: list, sendData: Callable) -> list:
+        '''
+        Handle several requests to the same endpoint.
+        If the endpoint has a batch handler (see registerBatchHandler), every request is validated and converted
+        on its own, then the batch handler is called once with the callDicts of the requests that passed.
+        Results are looked up in and stored to the cache of the endpoint, if it has one, per request.
+        Otherwise, each request is handled by incomingRequest.
+        :param requests: A list of (getData, getKeys). getKeys may be None.
+        :param sendData: The sendData function.
+        :return: The list of responses, in the order of requests.
+        '''
+        endpoint = self.endpointMap.get(endpointIdentifier)
+        plan = None
+        if endpoint is not None and endpoint.batchHandler is not None:
+            plan = endpoint.plans.get(protocol)
+            if plan is None:
+                plan = self.compilePlan(endpoint, protocol)
+        if plan is None or plan.isAsync:
+            return [self.incomingRequest(protocol, endpointIdentifier, getData, sendData, getKeys)
+                    for getData, getKeys in requests]
 
+        exceptionHandler = self.installedResponseHandler.exceptionHandler
+        responses = [None] * len(requests)
+        # List of (index, callDict, cache key, observer) of the requests that reach the batch handler
+        pending = []
+        for index, (getData, getKeys) in enumerate(requests):
+            observer = None if self.metrics is None else self.metrics.begin(
+                endpointIdentifier, protocol.name)
+            getData = self.getDataProxy(getData, sendData, plan)
             try:
-                evaluate(**evaluationCallDict)
+                if plan.validators:
+                    self.evaluateValidators(plan, getData, getKeys)
+                if observer is not None:
+                    observer.mark('validators')
+
+                callDict = self.getCallDict(
+                    getData, endpoint.varKeyword, endpoint.nonOptionalParameters, endpoint.optionalParameters, endpoint.dataConverters, getKeys)
+                if plan.etag is not None and plan.etag.version is not None:
+                    getData(CONDITIONAL_REQUEST).check(
+                        self.getVersion(plan, callDict), plan.etag.weak)
+                if observer is not None:
+                    observer.mark('getCallDict')
+
+                key = None
+                if plan.cache is not None:
+                    key = self.getCallKey(plan, callDict)
+                    if key is not None:
+                        try:
+                            response = protocol.copyResponse(self.cacheBackend.get(
+                                endpointIdentifier, key))
+                        except KeyError:
+                            pass
+                        else:
+                            if observer is not None:
+                                observer.mark('handler')
+                            responses[index] = sendData(response)
+                            if observer is not None:
+                                observer.mark('response')
+                            continue
+                pending.append((index, callDict, key, observer))
             except Exception as e:
-                return sendData(self.installedResponseHandler.exceptionHandler(e, protocol=protocol))
+                responses[index] = sendData(exceptionHandler(e, protocol=protocol))
+                if observer is not None:
+                    observer.fail(e)
+
+        if not pending:
+            return responses
 
-        # Prepare to call the endpoint
+        admitted = ()
         try:
-            callDict = self.getCallDict(
-                getData, varKeyword=endpoint["varKeyword"], nonOptionalParameters=endpoint["nonOptionalParameters"], optionalParameters=endpoint["optionalParameters"], dataConverters=endpoint["dataConverters"])
+            if plan.admission is not None:
+                # The batch is a single call in flight.
+                admitted = self.admit(plan)
+            results = endpoint.batchHandler(
+                [callDict for _, callDict, _, _ in pending])
+            if len(results) != len(pending):
+                raise ValueError(
+                    f"The batch handler of {endpointIdentifier} returned {len(results)} responses for {len(pending)} requests.")
         except Exception as e:
-            return sendData(self.installedResponseHandler.exceptionHandler(e, protocol=protocol))
+            results = [e] * len(pending)
+        finally:
+            for limiter in admitted:
+                limiter.release()
+
+        for (index, _, key, observer), response in zip(pending, results):
+            try:
+                if isinstance(response, Exception):
+                    raise response
+                if observer is not None:
+                    observer.mark('handler')
+                if key is not None and not isStream(response):
+                    self.cacheBackend.set(endpointIdentifier, key, protocol.copyResponse(response),
+                                          plan.cache.ttl, plan.cache.maxsize)
+                responses[index] = sendData(response)
+                if observer is not None:
+                    observer.mark('response')
+            except Exception as e:
+                responses[index] = sendData(exceptionHandler(e, protocol=protocol))
+                if observer is not None:
+                    observer.fail(e)
+        return responses
 
-        # Calls the endpoint
-        # Note: This does NOT return the data from the handler.
+    def getCallKey(self, plan: DispatchPlan, callDict: dict):
+        '''
+        Returns the key that identifies a call, or None if its parameters are not hashable.
+        Variable keyword arguments are part of the key only if all their keys are known (see getKeys).
+        '''
+        values = []
+        for name in plan.varyOn:
+            value = callDict.get(name)
+            if isinstance(value, (dict, JITDict)):
+                if isinstance(value, JITDict) and value.getKeys is None:
+                    return None
+                value = frozenset(value.items())
+            values.append(value)
+        key = (plan.protocol.name, tuple(values))
         try:
-            return sendData(endpoint["endpointHandler"](**callDict))
-        except Exception as e:
-            return sendData(self.installedResponseHandler.exceptionHandler(e, protocol=protocol))
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def callEndpoint(self, plan: DispatchPlan, callDict: dict):
+        'Calls the endpoint handler through the result cache and single-flight, if the endpoint uses them.'
+        endpoint = plan.endpoint
+        if plan.process is None:
+            call = partial(endpoint.endpointHandler, **callDict)
+        else:
+            call = partial(self.callInProcess, plan, callDict)
+
+        key = None if plan.varyOn is None else self.getCallKey(plan, callDict)
+        if key is None:
+            return call()
+
+        if plan.cache is not None:
+            try:
+                return plan.protocol.copyResponse(self.cacheBackend.get(endpoint.endpointIdentifier, key))
+            except KeyError:
+                pass
+
+        if plan.singleFlight:
+            token = object()
+
+            def lead():
+                response = call()
+                # Copied before the leader's protocol can modify the response.
+                # Streams can only be read once, so they are neither shared nor cached.
+                return token, response, None if isStream(response) else plan.protocol.copyResponse(response)
+            leader, response, shared = self.singleFlight.call(
+                (endpoint.endpointIdentifier, key), lead)
+            if leader is not token:
+                # The leader's response was a stream, so this call is made on its own.
+                return call() if shared is None else plan.protocol.copyResponse(shared)
+        else:
+            response = call()
+            shared = None if isStream(response) else plan.protocol.copyResponse(response)
+
+        if plan.cache is not None and shared is not None:
+            # The protocol may modify the response it is given, so the cache keeps a copy.
+            self.cacheBackend.set(endpoint.endpointIdentifier, key, shared,
+                                  plan.cache.ttl, plan.cache.maxsize)
+        return response
+
+    async def callEndpointAsync(self, plan: DispatchPlan, callDict: dict):
+        '''
+        Same as callEndpoint, on the running event loop.
+        Coroutine endpoint handlers are awaited, synchronous ones are run in the executor.
+        '''
+        endpoint = plan.endpoint
+        if inspect.iscoroutinefunction(endpoint.endpointHandler):
+            def call():
+                return endpoint.endpointHandler(**callDict)
+        else:
+            if plan.process is None:
+                handler = partial(endpoint.endpointHandler, **callDict)
+            else:
+                handler = partial(self.callInProcess, plan, callDict)
+
+            def call():
+                import asyncio
+                return asyncio.get_running_loop().run_in_executor(self.getExecutor(), handler)
+
+        key = None if plan.varyOn is None else self.getCallKey(plan, callDict)
+        if key is None:
+            return await call()
+
+        if plan.cache is not None:
+            try:
+                return plan.protocol.copyResponse(self.cacheBackend.get(endpoint.endpointIdentifier, key))
+            except KeyError:
+                pass
+
+        if plan.singleFlight:
+            token = object()
+
+            async def lead():
+                response = await call()
+                # Copied before the leader's protocol can modify the response.
+                # Streams can only be read once, so they are neither shared nor cached.
+                return token, response, None if isStream(response) else plan.protocol.copyResponse(response)
+            leader, response, shared = await self.singleFlight.callAsync(
+                (endpoint.endpointIdentifier, key), lead)
+            if leader is not token:
+                # The leader's response was a stream, so this call is made on its own.
+                return (await call()) if shared is None else plan.protocol.copyResponse(shared)
+        else:
+            response = await call()
+            shared = None if isStream(response) else plan.protocol.copyResponse(response)
+
+        if plan.cache is not None and shared is not None:
+            # The protocol may modify the response it is given, so the cache keeps a copy.
+            self.cacheBackend.set(endpoint.endpointIdentifier, key, shared,
+                                  plan.cache.ttl, plan.cache.maxsize)
+        return response
+
+    def callInProcess(self, plan: DispatchPlan, callDict: dict):
+        '''
+        Calls the endpoint handler in the process pool and waits for the result.
+        Validators and data converters have already run in this process; only the converted parameters are sent.
+        bytes parameters and results of SHARED_MEMORY_THRESHOLD or more are passed through shared memory.
+        '''
+        policy = plan.process
+        semaphore = self.processSemaphores.get(plan.endpoint.endpointIdentifier)
+        if semaphore is not None and not semaphore.acquire(timeout=policy.timeout if policy.timeout else -1):
+            raise ExecutionTimeout(plan.endpoint.endpointIdentifier, policy.timeout)
+
+        memories = []
+        try:
+            arguments = {}
+            for name, value in callDict.items():
+                if name == 'makeResponse':
+                    continue
+                arguments[name], memory = shareBytes(value)
+                if memory is not None:
+                    memories.append(memory)
+            future = self.getProcessPool().submit(
+                runInProcess, policy.handlerReference, arguments, 'makeResponse' in callDict)
+        except BaseException:
+            releaseSharedMemory(memories)
+            if semaphore is not None:
+                semaphore.release()
+            raise
+
+        def release(future):
+            # The call holds its concurrency slot and shared memory until the worker is done, even after a timeout.
+            releaseSharedMemory(memories)
+            if semaphore is not None:
+                semaphore.release()
+        future.add_done_callback(release)
+
+        def discardResult(future):
+            if not future.cancelled() and future.exception() is None:
+                discardBytes(future.result())
+
+        try:
+            response = loadBytes(future.result(policy.timeout), unlink=True)
+        except concurrent.futures.TimeoutError:
+            if not future.cancel():
+                # The worker still finishes the call, and its result is never read.
+                future.add_done_callback(discardResult)
+            raise ExecutionTimeout(plan.endpoint.endpointIdentifier, policy.timeout)
+
+        if isinstance(response, DeferredResponse):
+            return callDict['makeResponse'](*response.args, **response.kw)
+        return response
+
+    def invalidateCache(self, endpointIdentifier: str = None, **parameters) -> None:
+        '''
+        Removes cached results.
+        :param endpointIdentifier: The endpoint to invalidate. Without it, every cached result is removed.
+        :param **parameters: Only remove the result for these (converted) parameters, for every protocol.
+        Parameters of the varyOn list that are not given are taken as None.
+        '''
+        if endpointIdentifier is None:
+            return self.cacheBackend.invalidate()
+        if not parameters:
+            return self.cacheBackend.invalidate(endpointIdentifier)
+        endpoint = self.endpointMap[endpointIdentifier]
+        for plan in endpoint.plans.values():
+            if plan.cache is not None:
+                key = self.getCallKey(plan, parameters)
+                if key is not None:
+                    self.cacheBackend.invalidate(endpointIdentifier, key)
+
+    def invalidateValidatorCache(self, validator: StandardValidator = None) -> None:
+        '''
+        Removes remembered validator evaluations, for example when a token is revoked.
+        :param validator: The validator to invalidate. Without it, every remembered evaluation is removed.
+        '''
+        self.validatorCache.invalidate(validator)
+
+    def getExecutor(self) -> ThreadPoolExecutor:
+        'Returns the bounded thread pool used to run synchronous endpoint handlers from incomingRequestAsync.'
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.maxExecutorWorkers, thread_name_prefix='RequestMap')
+        return self.executor
+
+    def getEventLoop(self):
+        '''
+        Returns the event loop that runs asynchronous endpoints called through incomingRequest.
+        It runs in a background thread, started on first use, and is kept for the following calls.
+        '''
+        with self.loopLock:
+            # A forked worker does not have the thread of its parent's loop.
+            if self.loop is None or self.loop[1] != os.getpid():
+                import asyncio
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever,
+                                 name='RequestMap-EventLoop', daemon=True).start()
+                self.loop = (loop, os.getpid())
+            return self.loop[0]
+
+    def useAdmissionControl(self, maxInFlight: int, maxQueue: int = 0, queueTimeout: float = None) -> None:
+        '''
+        Limits the calls in flight across every endpoint. Calls over the limit wait in a queue and are admitted
+        by the priority in the admission metadata of their endpoint, so critical endpoints such as health checks go first.
+        Calls that can not be queued, or wait longer than queueTimeout, are rejected with Overloaded.
+        Per-endpoint limits are set with {'admission': {'maxInFlight', 'maxQueue', 'queueTimeout', 'priority'}} metadata.
+        :param maxInFlight: The maximum number of calls in flight.
+        :param maxQueue: The maximum number of waiting calls.
+        :param queueTimeout: Seconds a call may wait. Defaults to no limit.
+        '''
+        self.admissionLimiter = AdmissionLimiter(
+            'Map', maxInFlight, maxQueue, queueTimeout)
+        self.recompilePlans()
+
+    def getProcessPool(self) -> 'ProcessPoolExecutor':
+        'Returns the process pool that runs endpoints with {\'executor\': \'process\'} metadata.'
+        if self.processPool is None:
+            # Imported here as it imports multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.processPool = ProcessPoolExecutor(
+                max_workers=self.maxProcessWorkers)
+        return self.processPool
+
+    def enableMetrics(self, endpointIdentifier: str = None, metadata: dict = {}, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        '''
+        Starts recording request counts, error counts by exception code and per-phase latency histograms
+        for every endpoint and protocol. See getMetrics.
+        :param endpointIdentifier: If given, an endpoint that returns getMetrics() is registered under this identifier,
+        so installed protocols can serve it. It goes through the installed validators like any other endpoint.
+        :param metadata: The metadata of that endpoint.
+        :param buckets: The upper bounds, in seconds, of the latency histogram buckets.
+        '''
+        if self.metrics is None:
+            self.metrics = MetricsCollector(buckets)
+        if endpointIdentifier is not None:
+            self.register(self.getMetrics, endpointIdentifier, metadata)
+
+    def getMetrics(self) -> dict:
+        '''
+        Returns a snapshot of the metrics:
+        {endpointIdentifier: {protocolName: {'requests', 'errors', 'phases': {phase: {'count', 'sum', 'buckets'}}}}}
+        Phases are admission (for endpoints with admission control), validators, getCallDict, handler and response (sendData, or the exception handler on failure).
+        '''
+        if self.metrics is None:
+            return {}
+        return self.metrics.snapshot()
+
+    def enableProfiling(self, sampleRate: float = 0.01, mode: str = 'cprofile', interval: float = 0.005) -> None:
+        '''
+        Profiles a fraction of the calls of every endpoint: their validators, getCallDict and handler.
+        Profiles are aggregated per endpointIdentifier, see dumpProfiles.
+        Only calls through incomingRequest are profiled, as the calls of incomingRequestAsync share their thread.
+        :param sampleRate: The fraction of calls that are profiled.
+        :param mode: "cprofile" or "sampler". See Utilities.Profiling.Profiler.
+        :param interval: The seconds between stack samples, in sampler mode.
+        '''
+        self.disableProfiling()
+        self.profiler = Profiler(sampleRate, mode, interval)
+
+    def disableProfiling(self) -> None:
+        'Stops profiling. The profiles collected so far are discarded.'
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+
+    def dumpProfiles(self, directory: str, reset: bool = False) -> list:
+        '''
+        Writes the profile of every endpoint to directory, as <endpointIdentifier>.pstats in cprofile mode
+        or <endpointIdentifier>.collapsed in sampler mode. Returns the paths written.
+        :param reset: Start over after writing them.
+        '''
+        if self.profiler is None:
+            return []
+        return self.profiler.dump(directory, reset)
+
+    def client(self) -> LocalClient:
+        '''
+        Returns a client that calls endpoints in this process, for example API.client().call('addition', a=1, b=2).
+        A LocalProtocol is installed the first time.
+        '''
+        if self.localProtocol is None:
+            protocol = LocalProtocol()
+            self.useProtocol(protocol)
+            self.localProtocol = protocol
+        return LocalClient(self, self.localProtocol)
 
     def useProtocol(self, protocolHandlerInstance: StandardProtocolHandler):
         if not isinstance(protocolHandlerInstance, StandardProtocolHandler):
@@ -219,6 +1085,8 @@ class Map():
                 "protocolHandlerInstance must be an instance of StandardProtocolHandler.")
         protocolHandlerInstance.install(self)
         self.installedProtocols.append(protocolHandlerInstance)
+        for endpoint in self.endpointMap.values():
+            self.compilePlan(endpoint, protocolHandlerInstance)
 
     def useResponseHandler(self, standardizerInstance: StandardResponseHandler):
         'Standardizes the response'
@@ -230,6 +1098,13 @@ class Map():
                 "ResponseHandler must be an instance of StandardResponseHandler")
         self.installedResponseHandler = standardizerInstance
 
+    def useCacheBackend(self, cacheBackend: StandardCacheBackend):
+        'Replaces the in-process LRU cache that stores the results of cached endpoints.'
+        if not isinstance(cacheBackend, StandardCacheBackend):
+            raise TypeError(
+                "CacheBackend must be an instance of StandardCacheBackend.")
+        self.cacheBackend = cacheBackend
+
     def useValidator(self, validator: StandardValidator):
         '''
         Install a validator.
@@ -240,13 +1115,179 @@ class Map():
                 "Validator must be an instance of StandardValidator.")
         validator.install(self)
         self.installedValidators.append(validator)
+        try:
+            self.recompilePlans()
+        except BaseException:
+            self.installedValidators.remove(validator)
+            self.recompilePlans()
+            raise
 
     def wait(self):
-        while True:
-            time.sleep(10000000)
+        'Blocks until the map is stopped.'
+        while not self.stopped.wait(10000):
+            pass
 
     def start(self):
         'Starts the server'
         for protocol in self.installedProtocols:
             if not protocol.start():
                 logging.warn(f"Failed to start protocol: {protocol.name}")
+
+    def stop(self, timeout: float = None) -> None:
+        '''
+        Stops the installed protocols: they stop accepting requests, and the requests in flight are given
+        timeout seconds in total to finish. Then the executors are shut down.
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for protocol in self.installedProtocols:
+            protocol.stop(None if deadline is None else max(
+                0, deadline - time.monotonic()))
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        if self.processPool is not None:
+            self.processPool.shutdown(wait=False)
+        with self.loopLock:
+            if self.loop is not None:
+                self.loop[0].call_soon_threadsafe(self.loop[0].stop)
+                self.loop = None
+        self.stopped.set()
+
+    def serve(self, workers: int = None, drainTimeout: float = 30, healthCheckInterval: float = 1, healthCheckTimeout: float = 10,
+              restartDelay: float = 0.5, maxRestarts: int = 10, restartWindow: float = 60) -> None:
+        '''
+        Serves the installed protocols until SIGTERM or SIGINT, then stops gracefully (see stop).
+        Must be called from the main thread.
+        With more than one worker, the protocols are bound once (see StandardProtocolHandler.bind), then the worker
+        processes are forked and each of them starts the protocols. Protocols created with reusePort=True bind a
+        SO_REUSEPORT socket in every worker instead. Workers that exit, or miss their health checks for
+        healthCheckTimeout seconds, are restarted. A worker only sends its heartbeat while every protocol is alive
+        (see StandardProtocolHandler.isAlive). On SIGTERM, every worker is drained.
+        :param workers: The number of worker processes. Defaults to the number of CPUs.
+        With 1 worker, or where fork is not available, the protocols are served in this process.
+        :param drainTimeout: Seconds the requests in flight are given to finish when stopping.
+        :param healthCheckInterval: Seconds between the heartbeats of the workers.
+        :param healthCheckTimeout: Seconds without a heartbeat after which a worker is restarted.
+        :param restartDelay: Seconds before a worker is restarted. It doubles with every restart within restartWindow,
+        up to MAX_RESTART_DELAY, so workers that fail on start are not restarted in a tight loop.
+        :param maxRestarts: The number of restarts within restartWindow seconds after which serve stops the workers
+        and raises RuntimeError.
+        '''
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1 or not hasattr(os, 'fork'):
+            return self.runWorker(drainTimeout, healthCheckInterval)
+
+        for protocol in self.installedProtocols:
+            protocol.bind()
+
+        stopRequested = threading.Event()
+
+        def requestStop(signum, frame):
+            stopRequested.set()
+        signal.signal(signal.SIGTERM, requestStop)
+        signal.signal(signal.SIGINT, requestStop)
+
+        # pid -> [heartbeat pipe, time of the last heartbeat]
+        processes = {}
+
+        def spawn():
+            heartbeatRead, heartbeatWrite = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(heartbeatRead)
+                exitCode = 0
+                try:
+                    self.runWorker(drainTimeout, healthCheckInterval, heartbeatWrite)
+                except BaseException:
+                    logging.exception('Worker failed.')
+                    exitCode = 1
+                finally:
+                    os._exit(exitCode)
+            os.close(heartbeatWrite)
+            os.set_blocking(heartbeatRead, False)
+            processes[pid] = [heartbeatRead, time.monotonic()]
+
+        def reap(pid):
+            'Returns True if the worker has exited.'
+            if os.waitpid(pid, os.WNOHANG)[0] == 0:
+                return False
+            os.close(processes.pop(pid)[0])
+            return True
+
+        for _ in range(workers):
+            spawn()
+
+        # The times of the restarts within restartWindow, and the times at which exited workers are restarted
+        restarts = []
+        pendingRestarts = []
+        failed = False
+        while not stopRequested.wait(healthCheckInterval):
+            now = time.monotonic()
+            for pid, process in list(processes.items()):
+                if reap(pid):
+                    restarts = [restart for restart in restarts if now - restart < restartWindow]
+                    if len(restarts) >= maxRestarts:
+                        logging.error(
+                            f'Worker {pid} exited, and workers were restarted {len(restarts)} times in {restartWindow} seconds. Stopping.')
+                        failed = True
+                        break
+                    delay = min(restartDelay * 2 ** len(restarts), MAX_RESTART_DELAY)
+                    logging.warning(f'Worker {pid} exited. Restarting it in {delay} seconds.')
+                    restarts.append(now)
+                    pendingRestarts.append(now + delay)
+                    continue
+                try:
+                    if os.read(process[0], 4096):
+                        process[1] = now
+                except BlockingIOError:
+                    pass
+                if now - process[1] > healthCheckTimeout:
+                    logging.warning(f'Worker {pid} missed its health checks. Killing it.')
+                    os.kill(pid, signal.SIGKILL)
+                    process[1] = now
+            if failed:
+                break
+            for restartAt in list(pendingRestarts):
+                if restartAt <= now:
+                    pendingRestarts.remove(restartAt)
+                    spawn()
+
+        # Drain the workers, then kill the ones that are left.
+        for pid in processes:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + drainTimeout + healthCheckInterval
+        while processes and time.monotonic() < deadline:
+            for pid in list(processes):
+                reap(pid)
+            time.sleep(0.05)
+        for pid in list(processes):
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            os.close(processes.pop(pid)[0])
+        if failed:
+            raise RuntimeError(
+                f'Workers were restarted {maxRestarts} times in {restartWindow} seconds.')
+
+    def runWorker(self, drainTimeout: float, healthCheckInterval: float, heartbeat: int = None) -> None:
+        '''
+        Starts the protocols, and stops them on SIGTERM or SIGINT. Used by serve.
+        :param heartbeat: A pipe that a byte is written to every healthCheckInterval seconds, while every protocol
+        is alive (see StandardProtocolHandler.isAlive).
+        '''
+        stopRequested = threading.Event()
+
+        def requestStop(signum, frame):
+            stopRequested.set()
+        signal.signal(signal.SIGTERM, requestStop)
+        signal.signal(signal.SIGINT, requestStop)
+        if heartbeat is not None:
+            os.set_blocking(heartbeat, False)
+
+        self.start()
+        while not stopRequested.wait(healthCheckInterval):
+            if heartbeat is not None and all(protocol.isAlive(healthCheckInterval) for protocol in self.installedProtocols):
+                try:
+                    os.write(heartbeat, b'.')
+                except BlockingIOError:
+                    pass
+        self.stop(drainTimeout)
@@ -25,6 +25,31 @@ class EndpointNotFound(RequestMapException):
         self.code = -10000
 
 
+class ExecutionTimeout(RequestMapException):
+    def __init__(self, name, timeout):
+        super().__init__(
+            f"Endpoint {name} did not finish within {timeout} seconds")
+        self.name = name
+        self.timeout = timeout
+        self.code = -10003
+
+
+class Overloaded(RequestMapException):
+    def __init__(self, name, reason):
+        super().__init__(
+            f"{name} is overloaded: {reason}")
+        self.name = name
+        self.reason = reason
+        self.code = -10004
+
+
+class NotModified(RequestMapException):
+    def __init__(self, etag):
+        super().__init__(f"Not modified: {etag}")
+        self.etag = etag
+        self.code = -10005
+
+
 class ValidationError(RequestMapException):
     def __init__(self, code, message=None):
         self.message = message
@@ -0,0 +1,311 @@
+from .ProtocolBase import StandardProtocolHandler
+from ..Utilities.JSONEncoding import StandardJSONEncoder, getDefaultEncoder
+from ..Utilities.Streaming import ResponseStream
+from urllib.parse import parse_qsl
+import time
+import json
+import threading
+import logging
+
+
+class ASGIApplication():
+    def __init__(self, maxBodySize: int = 16 * 1024 * 1024, encoder: StandardJSONEncoder = None):
+        '''
+        A minimal ASGI application that routes HTTP requests by path and method.
+        It is shared between the ASGI protocols in the same way a Flask app is shared between the Flask protocols.
+        Serve it with any ASGI server, for example: uvicorn yourmodule:protocol.app
+        :param maxBodySize: Requests with a larger body are rejected with 413.
+        :param encoder: Encodes responses that are not str or bytes. Defaults to the shared default encoder: StandardJSONEncoder, or ORJSONEncoder after setDefaultEncoder(ORJSONEncoder()).
+        '''
+        self.routes = {}
+        self.maxBodySize = maxBodySize
+        self.encoder = encoder if encoder else getDefaultEncoder()
+
+    def addRoute(self, route: str, methods: list, handler) -> None:
+        '''
+        Adds a route.
+        :param handler: A coroutine function that receives the parsed request values (a dict) and returns
+        the response body, or a tuple of (body, status).
+        '''
+        routeMethods = self.routes.setdefault(route, {})
+        for method in methods:
+            if method.upper() in routeMethods:
+                raise ValueError(f"Route {route} [{method}] is already defined.")
+            routeMethods[method.upper()] = handler
+
+    async def readValues(self, scope, receive) -> dict:
+        '''
+        Parses the query string and url-encoded form body once per request.
+        Like flask's request.values, query parameters take priority over form fields.
+        '''
+        body = bytearray()
+        more = True
+        while more:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ConnectionError('Client disconnected.')
+            body += message.get('body', b'')
+            if len(body) > self.maxBodySize:
+                raise OverflowError('Request body is too large.')
+            more = message.get('more_body', False)
+
+        values = {}
+        contentType = b''
+        for name, value in scope.get('headers', []):
+            if name == b'content-type':
+                contentType = value
+                break
+        if body and contentType.split(b';')[0].strip() == b'application/x-www-form-urlencoded':
+            values.update(parse_qsl(body.decode('latin-1'), keep_blank_values=True))
+        if scope.get('query_string'):
+            values.update(parse_qsl(
+                scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        return values
+
+    async def sendResponse(self, send, response) -> None:
+        status = 200
+        if isinstance(response, tuple):
+            response, status = response
+
+        stream = ResponseStream.fromResponse(response)
+        if stream is not None:
+            return await self.sendStream(send, stream, status)
+
+        if isinstance(response, (bytes, bytearray)):
+            body, contentType = bytes(response), b'application/octet-stream'
+        elif isinstance(response, str):
+            body, contentType = response.encode(), b'text/plain; charset=utf-8'
+        else:
+            body, contentType = self.encoder.dumps(
+                response), self.encoder.contentType.encode()
+
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', contentType),
+                (b'content-length', str(len(body)).encode())
+            ]
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': body
+        })
+
+    async def sendStream(self, send, stream: ResponseStream, status: int) -> None:
+        'Sends the chunks of a streamed response as they are produced. The server frames them (chunked transfer encoding).'
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', stream.contentType.encode())
+            ]
+        })
+        async for chunk in stream:
+            if chunk:
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True
+                })
+        await send({
+            'type': 'http.response.body',
+            'body': b''
+        })
+
+    async def lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise NotImplementedError(
+                f"ASGIApplication does not support {scope['type']}.")
+
+        routeMethods = self.routes.get(scope['path'])
+        if routeMethods is None:
+            return await self.sendResponse(send, ({
+                'code': -1,
+                'message': 'Not found.'
+            }, 404))
+        handler = routeMethods.get(scope['method'])
+        if handler is None:
+            return await self.sendResponse(send, ({
+                'code': -1,
+                'message': 'Method not allowed.'
+            }, 405))
+
+        try:
+            values = await self.readValues(scope, receive)
+        except ConnectionError:
+            return
+        except OverflowError:
+            return await self.sendResponse(send, ({
+                'code': -1,
+                'message': 'Request body is too large.'
+            }, 413))
+        await self.sendResponse(send, await handler(values))
+
+    def run(self, **serverConfig) -> None:
+        'Runs the application with uvicorn. For development only.'
+        import uvicorn
+        uvicorn.run(self, **serverConfig)
+
+
+class ASGIProtocolBase(StandardProtocolHandler):
+    def __init__(self, app: ASGIApplication = None, **serverConfig):
+        '''
+        Base class of the ASGI protocols.
+        Variable keyword arguments are passed to uvicorn when the development server starts.
+        '''
+        super().__init__()
+        self.app = app
+        if not app:
+            self.app = ASGIApplication()
+        self.config = serverConfig
+
+    def sendDataProxy(self, data):
+        return data
+
+    def start(self) -> bool:
+        if self.config.get('ALLOW_DEV_SERVER'):
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                logging.warn(
+                    f'Can not start {self.name}: the development server requires uvicorn.')
+                return False
+            config = {key: value for key, value in self.config.items()
+                      if key != 'ALLOW_DEV_SERVER'}
+            threading.Thread(target=self.app.run, kwargs=config).start()
+            return True
+
+        logging.warn(f'''Not starting {self.name} in development mode. If you intend to launch the development server, pass through ALLOW_DEV_SERVER=True. If you are using a production server such as uvicorn, please ignore this message.''')
+        return False
+
+
+class HTTPViaASGI(ASGIProtocolBase):
+    def __init__(self, app: ASGIApplication = None, **serverConfig):
+        '''
+        The ASGI protocol.
+        Configure each endpoint using the metadata field "httpmethods" and "httproute".
+        '''
+        super().__init__(app, **serverConfig)
+        self.name = "HTTPViaASGI"
+        self.supportsStreaming = True
+
+    def initialise(self):
+        for endpointIdentifier, endpoint in self.map.endpointMap.items():
+            self.onNewEndpoint(endpoint)
+
+    def asgiProxy(self, endpointIdentifier):
+        async def proxyInternal(values):
+            return await self.map.incomingRequestAsync(self, endpointIdentifier, values.get, self.sendDataProxy, values.keys)
+        return proxyInternal
+
+    def onNewEndpoint(self, endpoint):
+        methods = endpoint['metadata'].get('httpmethods', ['GET', 'POST'])
+        route = endpoint['metadata'].get(
+            'httproute', '/' + endpoint['endpointIdentifier'])
+        self.app.addRoute(route, methods, self.asgiProxy(
+            endpoint['endpointIdentifier']))
+
+
+class HTTPBatchRequestViaASGI(ASGIProtocolBase):
+    def __init__(self, app: ASGIApplication = None, route='/batch', **serverConfig):
+        super().__init__(app, **serverConfig)
+        self.route = route
+        self.name = "HTTPBatchRequestViaASGI"
+
+    def initialise(self):
+        self.app.addRoute(self.route, ['GET', 'POST'], self.handleBatch)
+
+    async def handleBatch(self, values):
+        '''Format of a batch request:
+        [{
+            "endpointIdentifier": "<endpointIdentifier>",
+            "data": {
+                "<key>": "<value>"
+            }
+        }, {...}]
+        '''
+        # Get batch data.
+        batch = values.get('batch')
+        if not batch:
+            return {
+                'code': -1,
+                'message': 'No batch data is provided.'
+            }, 400
+        try:
+            batch = json.loads(batch)
+            assert isinstance(batch, list)
+        except Exception:
+            return {
+                'code': -1,
+                'message': 'Invalid batch JSON was provided.'
+            }, 400
+
+        batchResponse = []
+        for request in batch:
+            # Check if all required fields are present
+            if 'endpointIdentifier' not in request:
+                batchResponse.append({
+                    'code': -1,
+                    'message': 'Missing parameter: endpointIdentifier.'
+                })
+                continue
+            if 'data' not in request:
+                batchResponse.append({
+                    'code': -1,
+                    'message': 'Missing parameter: data.'
+                })
+                continue
+            if not isinstance(request['data'], dict):
+                batchResponse.append({
+                    'code': -1,
+                    'message': 'Invalid request: data must be a dictionary.'
+                })
+                continue
+            # Request endpoint
+            response = await self.map.incomingRequestAsync(
+                self, request['endpointIdentifier'], request['data'].get, self.sendDataProxy, request['data'].keys)
+
+            batchResponse.append({
+                'endpointIdentifier': request['endpointIdentifier'],
+                'response': response,
+                'handledAt': time.time()
+            })
+        return batchResponse
+
+
+class HTTPRequestByEndpointIdentifierViaASGI(ASGIProtocolBase):
+    def __init__(self, app: ASGIApplication = None, route='/science', **serverConfig):
+        super().__init__(app, **serverConfig)
+        self.route = route
+        self.name = "HTTPRequestByEndpointIdentifierViaASGI"
+
+    def initialise(self):
+        self.app.addRoute(self.route, ['GET', 'POST'], self.handleCall)
+
+    async def handleCall(self, values):
+        '''Request Format
+
+        @param endpointIdentifier = "<endpointIdentifier>"
+        @param <key> = "<value>"
+        '''
+        endpointIdentifier = values.get('endpointIdentifier')
+        if not endpointIdentifier:
+            return {
+                'code': -1,
+                'message': 'No endpointIdentifier is provided.'
+            }, 400
+
+        return await self.map.incomingRequestAsync(
+            self, endpointIdentifier, values.get, self.sendDataProxy, values.keys)
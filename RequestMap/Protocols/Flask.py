@@ -1,17 +1,136 @@
 from .ProtocolBase import StandardProtocolHandler
-from flask import Flask, request, jsonify
+from ..Exceptions import ExecutionTimeout
+from ..Utilities.Compression import CompressionPolicy, Compressor
+from ..Utilities.ETag import ConditionalRequest, ETagPolicy, hashETag, withConditionalRequest
+from ..Utilities.JSONEncoding import getDefaultEncoder
+from ..Utilities.Streaming import BodyStream, ResponseStream
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import Flask, Response, current_app, request, jsonify, copy_current_request_context, stream_with_context
 import time
 import json
 import threading
 import logging
 
 
+# The request data sources, from the highest priority to the lowest.
+DEFAULT_PRECEDENCE = ('args', 'form', 'json')
+
+
+def getRequestSnapshot(precedence=DEFAULT_PRECEDENCE) -> dict:
+    '''
+    Parses the current request once into a flat dictionary.
+    :param precedence: The sources to merge, from the highest priority to the lowest:
+    "args" (the query string), "form" and "json" (the keys of a JSON object body).
+    '''
+    snapshot = {}
+    for source in reversed(precedence):
+        if source == 'json':
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                snapshot.update(body)
+        elif source in ('args', 'form'):
+            snapshot.update(getattr(request, source).to_dict())
+        else:
+            raise ValueError(f"Unknown request data source: {source}")
+    return snapshot
+
+
+def copyResponse(response):
+    '''
+    Returns a copy of a flask Response, with its own body and headers, as flask and after_request functions modify
+    the response of a request (for example, to set its cookies). Other responses are returned as they are.
+    '''
+    if isinstance(response, tuple) and response and isinstance(response[0], Response):
+        return (copyResponse(response[0]),) + response[1:]
+    if isinstance(response, Response):
+        return Response(response.get_data(), status=response.status, headers=response.headers.copy())
+    return response
+
+
+def compressResponse(response, policy: CompressionPolicy, compressor: Compressor):
+    '''
+    Compresses the response of a view with the coding the client prefers (Accept-Encoding), if policy allows it.
+    When policy.precompress is set, the compressed bytes of the body are kept and reused for as long as the same body
+    is sent, as cached endpoints do.
+    '''
+    if policy is None:
+        return response
+    response = current_app.make_response(response)
+    if response.direct_passthrough or 'Content-Encoding' in response.headers or \
+            response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    coding = compressor.negotiate(request.headers.get('Accept-Encoding'), policy)
+    if coding is None:
+        return response
+
+    if response.is_streamed:
+        # A new response is returned, so that the one of a cached endpoint is left unchanged.
+        compressed = Response(compressor.compressStream(
+            response.iter_encoded(), coding, policy), status=response.status, headers=response.headers.copy())
+        del compressed.headers['Content-Length']
+    else:
+        body = response.get_data()
+        if len(body) < policy.minSize:
+            return response
+        if policy.precompress:
+            body = compressor.compressCached(body, coding, policy)
+        else:
+            body = compressor.compress(body, coding, policy)
+        compressed = Response(body, status=response.status, headers=response.headers.copy())
+        compressed.headers['Content-Length'] = str(len(body))
+    compressed.headers['Content-Encoding'] = coding
+    compressed.vary.add('Accept-Encoding')
+    etag = compressed.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        # A strong entity tag identifies the exact bytes, and these are not the ones it was computed from.
+        compressed.headers['ETag'] = 'W/' + etag
+    return compressed
+
+
+def notModifiedResponse(etag: str, policy: ETagPolicy):
+    response = Response(status=304)
+    response.headers['ETag'] = etag
+    if policy.cacheControl:
+        response.headers['Cache-Control'] = policy.cacheControl
+    return response
+
+
+def conditionalResponse(response, policy: ETagPolicy, conditionalRequest: ConditionalRequest):
+    '''
+    Adds the ETag and Cache-Control headers of policy to the response of a view,
+    or answers 304 Not Modified if the client already has it.
+    The entity tag is the version of the endpoint, or a hash of the response body.
+    '''
+    if policy is None:
+        return response
+    if conditionalRequest.notModified:
+        return notModifiedResponse(conditionalRequest.etag, policy)
+    response = current_app.make_response(response)
+    if response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+        return response
+    body = response.get_data()
+    etag = conditionalRequest.etag or hashETag(body, policy.weak)
+    if conditionalRequest.matches(etag):
+        return notModifiedResponse(etag, policy)
+    # A new response is returned, so that the one of a cached endpoint is left unchanged.
+    tagged = Response(body, status=response.status, headers=response.headers.copy())
+    tagged.headers['ETag'] = etag
+    if policy.cacheControl:
+        tagged.headers['Cache-Control'] = policy.cacheControl
+    return tagged
+
+
 class HTTPViaFlask(StandardProtocolHandler):
-    def __init__(self, app=None, **flaskConfig):
+    def __init__(self, app=None, precedence=DEFAULT_PRECEDENCE, compression=None, **flaskConfig):
         '''
         The flask protocol.
         Configure each endpoint using the metadata field "httpmethods" and "httproute".
+        An endpoint with the metadata field "streamBody" receives the request body as a BodyStream in the parameter
+        it names, instead of having it parsed. Generator responses are streamed.
+        Endpoints with the metadata field "etag" answer conditional requests (If-None-Match), see ETagPolicy.
         Variable keyword arguments are passed to the flask app when it starts.
+        :param precedence: The order in which query, form and JSON body data take priority. See getRequestSnapshot.
+        :param compression: The compression of endpoints without "compression" metadata. See CompressionPolicy.
         '''
         super().__init__()
         self.app = app
@@ -19,23 +138,49 @@ class HTTPViaFlask(StandardProtocolHandler):
         if not app:
             self.app = Flask(__name__)
         self.name = "HTTPViaFlask"
+        self.precedence = precedence
+        self.supportsStreaming = True
+        self.compression = compression
+        self.compressor = Compressor()
 
     def initialise(self):
         for endpointIdentifier, endpoint in self.map.endpointMap.items():
             self.onNewEndpoint(endpoint)
 
     def flaskGetDataProxy(self):
-        def runtimeProxy(key):
-            # This is neccessary as request.values can only be accessed within an endpoint.
-            return request.values.get(key)
-        return runtimeProxy
+        # This is neccessary as the request can only be accessed within an endpoint.
+        return getRequestSnapshot(self.precedence).get
 
     def sendDataProxy(self, data):
         return data
 
-    def flaskProxy(self, endpointIdentifier):
+    def copyResponse(self, response):
+        return copyResponse(response)
+
+    def flaskProxy(self, endpointIdentifier, streamBody=None, compression: CompressionPolicy = None, etag: ETagPolicy = None):
         def proxyInternal():
-            return self.map.incomingRequest(self, endpointIdentifier, self.flaskGetDataProxy(), self.sendDataProxy)
+            if streamBody:
+                # The body is left unread for the endpoint, so only the query string is parsed.
+                snapshot = request.args.to_dict()
+                snapshot[streamBody] = BodyStream(
+                    request.stream, request.content_length)
+            else:
+                snapshot = getRequestSnapshot(self.precedence)
+            getData = snapshot.get
+            if etag is not None:
+                conditionalRequest = ConditionalRequest(
+                    request.headers.get('If-None-Match'))
+                getData = withConditionalRequest(getData, conditionalRequest)
+            response = self.map.incomingRequest(
+                self, endpointIdentifier, getData, self.sendDataProxy, snapshot.keys)
+            stream = ResponseStream.fromResponse(response)
+            if stream is not None:
+                response = Response(stream_with_context(
+                    iter(stream)), mimetype=stream.contentType)
+            elif etag is not None:
+                response = conditionalResponse(
+                    response, etag, conditionalRequest)
+            return compressResponse(response, compression, self.compressor)
         return proxyInternal
 
     def onNewEndpoint(self, endpoint):
@@ -47,12 +192,15 @@ class HTTPViaFlask(StandardProtocolHandler):
         if 'httproute' in endpoint['metadata']:
             route = endpoint['metadata']['httproute']
         else:
-            route = '/' + endpoint['identifier']
+            route = '/' + endpoint['endpointIdentifier']
 
         self.app.add_url_rule(
             route,
             endpoint['endpointIdentifier'],
-            self.flaskProxy(endpoint['endpointIdentifier']),
+            self.flaskProxy(endpoint['endpointIdentifier'],
+                            endpoint['metadata'].get('streamBody'),
+                            CompressionPolicy.fromEndpoint(endpoint, self.compression),
+                            ETagPolicy.fromEndpoint(endpoint)),
             methods=methods
         )
 
@@ -68,7 +216,17 @@ class HTTPViaFlask(StandardProtocolHandler):
 
 
 class HTTPBatchRequestViaFlask(StandardProtocolHandler):
-    def __init__(self, app=None, route='/batch', **flaskConfig):
+    def __init__(self, app=None, route='/batch', parallelism=1, itemTimeout=None, maxWorkers=None, precedence=DEFAULT_PRECEDENCE, compression=None, **flaskConfig):
+        '''
+        The batch protocol.
+        :param parallelism: The maximum number of items of a batch that are handled at the same time.
+        A batch may ask for less through the "parallelism" parameter.
+        :param itemTimeout: The number of seconds after which an item that has not finished is answered with ExecutionTimeout.
+        It counts from when the item is handed to the thread pool. Only enforced when items run in the thread pool.
+        :param maxWorkers: The size of the thread pool shared by all batches. Defaults to four times parallelism.
+        :param precedence: The order in which query, form and JSON body data take priority. See getRequestSnapshot.
+        :param compression: The compression of batch responses. See CompressionPolicy.
+        '''
         super().__init__()
         self.app = app
         if not app:
@@ -76,20 +234,34 @@ class HTTPBatchRequestViaFlask(StandardProtocolHandler):
         self.route = route
         self.name = "HTTPBatchRequestViaFlask"
         self.config = flaskConfig
+        self.parallelism = parallelism
+        self.itemTimeout = itemTimeout
+        self.maxWorkers = maxWorkers
+        self.executor = None
+        self.encoder = getDefaultEncoder()
+        self.precedence = precedence
+        self.compression = CompressionPolicy.fromConfig(compression)
+        self.compressor = Compressor()
+        # endpointIdentifier -> ETagPolicy
+        self.etagPolicies = {}
 
     def initialise(self):
+        for endpointIdentifier, endpoint in self.map.endpointMap.items():
+            self.onNewEndpoint(endpoint)
+
+        def handleBatchRequest():
+            return compressResponse(self.handleBatch(), self.compression, self.compressor)
+
         self.app.add_url_rule(
             self.route,
             'HTTPBatchRequestViaFlask-Main',
-            self.handleBatch,
+            handleBatchRequest,
             methods=['GET', 'POST']
         )
 
     def flaskGetDataProxy(self):
-        def runtimeProxy(key):
-            # This is neccessary as request.values can only be accessed within an endpoint.
-            return request.values.get(key)
-        return runtimeProxy
+        # This is neccessary as the request can only be accessed within an endpoint.
+        return getRequestSnapshot(self.precedence).get
 
     def sendDataProxy(self, data):
         return data
@@ -102,16 +274,28 @@ class HTTPBatchRequestViaFlask(StandardProtocolHandler):
                 "<key>": "<value>"
             }
         }, {...}]
+
+        The batch can be sent as a JSON string in the "batch" field, or as a list in a JSON body: {"batch": [...]}.
+        An item can be marked with "sequential": true to run it on its own, after the items before it.
+        Items for an endpoint with a batch handler are handled together, see getUnits.
+        Items for an endpoint with "etag" metadata get the "etag" of their response. An item can send the entity tag
+        it has as "ifNoneMatch", and is answered with {"endpointIdentifier", "notModified": true, "etag", "handledAt"}
+        instead of the response if it is unchanged.
+
+        When "stream" is true or the client prefers application/x-ndjson, each item is sent as a
+        newline-delimited JSON record as soon as it completes, tagged with its "index" in the batch.
         '''
         # Get batch data.
-        batch = self.flaskGetDataProxy()('batch')
+        snapshot = getRequestSnapshot(self.precedence)
+        batch = snapshot.get('batch')
         if not batch:
             return jsonify({
                 'code': -1,
                 'message': 'No batch data is provided.'
             }), 400
         try:
-            batch = json.loads(batch)
+            if isinstance(batch, str):
+                batch = json.loads(batch)
             assert isinstance(batch, list)
         except Exception:
             return jsonify({
@@ -119,41 +303,195 @@ class HTTPBatchRequestViaFlask(StandardProtocolHandler):
                 'message': 'Invalid batch JSON was provided.'
             }), 400
 
-        batchResponse = []
-        for request in batch:
-            # Check if all required fields are present
-            if 'endpointIdentifier' not in request:
-                batchResponse.append({
-                    'code': -1,
-                    'message': 'Missing parameter: endpointIdentifier.'
-                })
-                continue
-            if 'data' not in request:
-                batchResponse.append({
-                    'code': -1,
-                    'message': 'Missing parameter: data.'
-                })
-                continue
-            if not isinstance(request['data'], dict):
-                batchResponse.append({
-                    'code': -1,
-                    'message': 'Invalid request: data must be a dictionary.'
-                })
-                continue
-            # Request endpoint
-            response = self.map.incomingRequest(
-                self, request['endpointIdentifier'], request['data'].get, lambda data: data)
-
-            batchResponse.append({
-                'endpointIdentifier': request['endpointIdentifier'],
-                'response': response,
-                'handledAt': time.time()
-            })
-        return jsonify(batchResponse)
+        try:
+            parallelism = max(1, min(
+                int(snapshot.get('parallelism') or self.parallelism), self.parallelism))
+        except (TypeError, ValueError):
+            parallelism = self.parallelism
+
+        if snapshot.get('stream') in ('1', 'true', True) or \
+                request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+            def generateRecords():
+                for index, entry in self.iterItems(batch, parallelism):
+                    yield self.encoder.dumps({'index': index, **entry}) + b'\n'
+            return Response(stream_with_context(generateRecords()), mimetype='application/x-ndjson')
+
+        batchResponse = [None] * len(batch)
+        for index, entry in self.iterItems(batch, parallelism):
+            batchResponse[index] = entry
+        # Items are dictionaries, so the whole batch is encoded once.
+        return Response(self.encoder.dumps(batchResponse), mimetype=self.encoder.contentType)
+
+    def handleItem(self, request):
+        'Handles a single item of a batch and returns its entry in the batch response.'
+        # Check if all required fields are present
+        if 'endpointIdentifier' not in request:
+            return {
+                'code': -1,
+                'message': 'Missing parameter: endpointIdentifier.'
+            }
+        if 'data' not in request:
+            return {
+                'code': -1,
+                'message': 'Missing parameter: data.'
+            }
+        if not isinstance(request['data'], dict):
+            return {
+                'code': -1,
+                'message': 'Invalid request: data must be a dictionary.'
+            }
+        # Request endpoint
+        getData = request['data'].get
+        etag = self.etagPolicies.get(request['endpointIdentifier']) if isinstance(
+            request['endpointIdentifier'], str) else None
+        conditionalRequest = None
+        if etag is not None:
+            conditionalRequest = ConditionalRequest(request.get('ifNoneMatch'))
+            getData = withConditionalRequest(getData, conditionalRequest)
+        response = self.map.incomingRequest(
+            self, request['endpointIdentifier'], getData, self.sendDataProxy, request['data'].keys)
+
+        return self.makeEntry(request['endpointIdentifier'], response, time.time(), etag, conditionalRequest)
+
+    def makeEntry(self, endpointIdentifier, response, handledAt: float, etag: ETagPolicy = None, conditionalRequest: ConditionalRequest = None) -> dict:
+        'Returns the entry of an item in the batch response, or its not-modified marker.'
+        entry = {
+            'endpointIdentifier': endpointIdentifier,
+            'response': response,
+            'handledAt': handledAt
+        }
+        if etag is None:
+            return entry
+        tag = conditionalRequest.etag
+        if not conditionalRequest.notModified:
+            if tag is None:
+                tag = hashETag(self.encoder.dumps(response), etag.weak)
+            if not conditionalRequest.matches(tag):
+                entry['etag'] = tag
+                return entry
+        return {
+            'endpointIdentifier': endpointIdentifier,
+            'notModified': True,
+            'etag': tag,
+            'handledAt': handledAt
+        }
+
+    def getExecutor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.maxWorkers or self.parallelism * 4, thread_name_prefix=self.name)
+        return self.executor
+
+    def getUnits(self, batch) -> list:
+        '''
+        Splits the batch into units of work, each a list of indices.
+        Items for an endpoint with a batch handler are grouped by endpointIdentifier, so the batch handler is called
+        once per group (see Map.incomingRequestBatch). Groups do not extend across a "sequential" item.
+        Every other item is a unit on its own.
+        '''
+        units = []
+        groups = {}
+        for index, item in enumerate(batch):
+            if isinstance(item, dict) and not item.get('sequential') and isinstance(item.get('data'), dict):
+                endpointIdentifier = item.get('endpointIdentifier')
+                endpoint = self.map.endpointMap.get(endpointIdentifier) if isinstance(
+                    endpointIdentifier, str) else None
+                if endpoint is not None and endpoint.batchHandler is not None:
+                    if endpointIdentifier in groups:
+                        groups[endpointIdentifier].append(index)
+                    else:
+                        groups[endpointIdentifier] = [index]
+                        units.append(groups[endpointIdentifier])
+                    continue
+            elif isinstance(item, dict) and item.get('sequential'):
+                groups = {}
+            units.append([index])
+        return units
+
+    def handleUnit(self, batch, unit) -> list:
+        'Handles a unit of work from getUnits and returns its [(index, entry)].'
+        if len(unit) == 1:
+            return [(unit[0], self.handleItem(batch[unit[0]]))]
+
+        endpointIdentifier = batch[unit[0]]['endpointIdentifier']
+        etag = self.etagPolicies.get(endpointIdentifier)
+        requests = []
+        conditionalRequests = []
+        for index in unit:
+            getData = batch[index]['data'].get
+            conditionalRequest = None
+            if etag is not None:
+                conditionalRequest = ConditionalRequest(
+                    batch[index].get('ifNoneMatch'))
+                getData = withConditionalRequest(getData, conditionalRequest)
+            requests.append((getData, batch[index]['data'].keys))
+            conditionalRequests.append(conditionalRequest)
+        responses = self.map.incomingRequestBatch(
+            self, endpointIdentifier, requests, self.sendDataProxy)
+        handledAt = time.time()
+        return [(index, self.makeEntry(endpointIdentifier, response, handledAt, etag, conditionalRequest))
+                for index, response, conditionalRequest in zip(unit, responses, conditionalRequests)]
+
+    def iterItems(self, batch, parallelism):
+        '''
+        Handles the items of a batch and yields (index, entry) as each item completes.
+        Units of work (see getUnits) are handled one by one unless parallelism is above 1 or itemTimeout is set,
+        in which case up to `parallelism` units are handled at the same time in the thread pool.
+        An item with "sequential": true waits for every item before it, and items after it wait for it.
+        '''
+        units = self.getUnits(batch)
+        if parallelism == 1 and self.itemTimeout is None:
+            for unit in units:
+                yield from self.handleUnit(batch, unit)
+            return
+
+        inFlight = {}  # Future -> (unit, deadline)
+
+        def drain(limit):
+            # Collects responses until at most `limit` units are in flight.
+            while len(inFlight) > limit:
+                timeout = None
+                if self.itemTimeout is not None:
+                    timeout = max(0, min(deadline for _, deadline in inFlight.values(
+                    )) - time.monotonic())
+                done, _ = wait(inFlight, timeout=timeout,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    inFlight.pop(future)
+                    yield from future.result()
+                if self.itemTimeout is not None:
+                    now = time.monotonic()
+                    for future, (unit, deadline) in list(inFlight.items()):
+                        if deadline <= now:
+                            # The unit keeps running in the background, but is no longer waited for.
+                            del inFlight[future]
+                            for index in unit:
+                                endpointIdentifier = batch[index].get(
+                                    'endpointIdentifier')
+                                yield index, {
+                                    'endpointIdentifier': endpointIdentifier,
+                                    'response': self.map.installedResponseHandler.exceptionHandler(ExecutionTimeout(endpointIdentifier, self.itemTimeout), protocol=self),
+                                    'handledAt': time.time()
+                                }
+
+        executor = self.getExecutor()
+        for unit in units:
+            item = batch[unit[0]]
+            sequential = isinstance(item, dict) and item.get('sequential')
+            if sequential:
+                yield from drain(0)
+            deadline = None
+            if self.itemTimeout is not None:
+                deadline = time.monotonic() + self.itemTimeout
+            # Each unit gets its own copy of the request context, so handlers can still use flask.request.
+            future = executor.submit(
+                copy_current_request_context(self.handleUnit), batch, unit)
+            inFlight[future] = (unit, deadline)
+            yield from drain(0 if sequential else parallelism - 1)
+        yield from drain(0)
 
     def onNewEndpoint(self, endpoint):
-        # Don't need to do anything.
-        pass
+        self.etagPolicies[endpoint['endpointIdentifier']] = ETagPolicy.fromEndpoint(endpoint)
 
     def start(self):
         if 'ALLOW_DEV_SERVER' in self.config:
@@ -167,7 +505,12 @@ class HTTPBatchRequestViaFlask(StandardProtocolHandler):
 
 
 class HTTPRequestByEndpointIdentifier(StandardProtocolHandler):
-    def __init__(self, app=None, route='/science', **flaskConfig):
+    def __init__(self, app=None, route='/science', precedence=DEFAULT_PRECEDENCE, compression=None, **flaskConfig):
+        '''
+        Calls endpoints by their identifier.
+        :param precedence: The order in which query, form and JSON body data take priority. See getRequestSnapshot.
+        :param compression: The compression of endpoints without "compression" metadata. See CompressionPolicy.
+        '''
         super().__init__()
         self.app = app
         if not app:
@@ -175,8 +518,18 @@ class HTTPRequestByEndpointIdentifier(StandardProtocolHandler):
         self.route = route
         self.name = "HTTPRequestByEndpointIdentifier"
         self.config = flaskConfig
+        self.encoder = getDefaultEncoder()
+        self.precedence = precedence
+        self.compression = compression
+        self.compressor = Compressor()
+        # endpointIdentifier -> CompressionPolicy
+        self.compressionPolicies = {}
+        # endpointIdentifier -> ETagPolicy
+        self.etagPolicies = {}
 
     def initialise(self):
+        for endpointIdentifier, endpoint in self.map.endpointMap.items():
+            self.onNewEndpoint(endpoint)
         self.app.add_url_rule(
             self.route,
             'HTTPRequestByEndpointIdentifier-Main',
@@ -185,10 +538,8 @@ class HTTPRequestByEndpointIdentifier(StandardProtocolHandler):
         )
 
     def flaskGetDataProxy(self):
-        def runtimeProxy(key):
-            # This is neccessary as request.values can only be accessed within an endpoint.
-            return request.values.get(key)
-        return runtimeProxy
+        # This is neccessary as the request can only be accessed within an endpoint.
+        return getRequestSnapshot(self.precedence).get
 
     def sendDataProxy(self, data):
         return data
@@ -197,12 +548,11 @@ class HTTPRequestByEndpointIdentifier(StandardProtocolHandler):
         '''Request Format
 
         @param endpointIdentifier = "<endpointIdentifier>"
-        @param data = json.dumps({
-            "<key>": "<value>"
-        })
+        @param <key> = "<value>"
         '''
         # Get endpointIdentifier
-        endpointIdentifier = self.flaskGetDataProxy()('endpointIdentifier')
+        snapshot = getRequestSnapshot(self.precedence)
+        endpointIdentifier = snapshot.get('endpointIdentifier')
         if not endpointIdentifier:
             return jsonify({
                 'code': -1,
@@ -210,12 +560,24 @@ class HTTPRequestByEndpointIdentifier(StandardProtocolHandler):
             }), 400
         # Get data
 
+        getData = snapshot.get
+        etag = self.etagPolicies.get(endpointIdentifier)
+        if etag is not None:
+            conditionalRequest = ConditionalRequest(
+                request.headers.get('If-None-Match'))
+            getData = withConditionalRequest(getData, conditionalRequest)
+
         response = self.map.incomingRequest(
-            self, endpointIdentifier, self.flaskGetDataProxy(), lambda data: data)
-        return jsonify(response)
+            self, endpointIdentifier, getData, self.sendDataProxy, snapshot.keys)
+        httpResponse = Response(self.encoder.dumps(response), mimetype=self.encoder.contentType)
+        if etag is not None:
+            httpResponse = conditionalResponse(httpResponse, etag, conditionalRequest)
+        return compressResponse(httpResponse, self.compressionPolicies.get(endpointIdentifier), self.compressor)
 
     def onNewEndpoint(self, endpoint):
-        pass
+        self.compressionPolicies[endpoint['endpointIdentifier']] = CompressionPolicy.fromEndpoint(
+            endpoint, self.compression)
+        self.etagPolicies[endpoint['endpointIdentifier']] = ETagPolicy.fromEndpoint(endpoint)
 
     def start(self):
         if 'ALLOW_DEV_SERVER' in self.config:
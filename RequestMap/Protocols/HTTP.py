@@ -0,0 +1,331 @@
+from .ProtocolBase import StandardProtocolHandler
+from .StreamServer import StreamServer
+from ..Utilities.JSONEncoding import StandardJSONEncoder, getDefaultEncoder
+from ..Utilities.Streaming import ResponseStream
+from http import HTTPStatus
+from typing import NamedTuple
+from urllib.parse import parse_qsl
+import asyncio
+import logging
+import threading
+
+
+class HTTPError(Exception):
+    'Raised while reading a request that can not be handled. The connection is closed after the response.'
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class HTTPRequest(NamedTuple):
+    method: str
+    path: str
+    query: bytes
+    # Lower-case header name -> value
+    headers: dict
+    body: bytes
+    keepAlive: bool
+
+
+class HTTPServer(StreamServer):
+    def __init__(self, maxHeaderSize: int = 64 * 1024, maxBodySize: int = 16 * 1024 * 1024, keepAliveTimeout: float = 5,
+                 maxPipelineDepth: int = 16, encoder: StandardJSONEncoder = None):
+        '''
+        A minimal HTTP/1.1 server on asyncio streams that routes requests by path and method.
+        Connections are kept alive, and pipelined requests on a connection are handled concurrently
+        while their responses are sent in order.
+        :param maxHeaderSize: Requests with a larger request line and headers are rejected with 431.
+        :param maxBodySize: Requests with a larger body are rejected with 413.
+        :param keepAliveTimeout: Seconds an idle connection is kept open.
+        :param maxPipelineDepth: The maximum number of requests of a connection that are handled at the same time.
+        :param encoder: Encodes responses that are not str or bytes. Defaults to the shared default encoder: StandardJSONEncoder, or ORJSONEncoder after setDefaultEncoder(ORJSONEncoder()).
+        '''
+        super().__init__()
+        self.routes = {}
+        self.maxHeaderSize = maxHeaderSize
+        self.streamLimit = maxHeaderSize
+        self.maxBodySize = maxBodySize
+        self.keepAliveTimeout = keepAliveTimeout
+        self.maxPipelineDepth = maxPipelineDepth
+        self.encoder = encoder if encoder else getDefaultEncoder()
+
+    def addRoute(self, route: str, methods: list, handler) -> None:
+        '''
+        Adds a route.
+        :param handler: A coroutine function that receives the parsed request values (a dict) and returns
+        the response body, or a tuple of (body, status).
+        '''
+        routeMethods = self.routes.setdefault(route, {})
+        for method in methods:
+            if method.upper() in routeMethods:
+                raise ValueError(f"Route {route} [{method}] is already defined.")
+            routeMethods[method.upper()] = handler
+
+    async def readRequest(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        '''
+        Reads a request from the connection. Returns None when the client has closed it, it has been idle
+        for keepAliveTimeout, or the server is shutting down.
+        '''
+        if not self.markIdle(reader):
+            return None
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keepAliveTimeout)
+        except asyncio.TimeoutError:
+            return None
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HTTPError(400, 'Incomplete request.')
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, 'Request header is too large.')
+        finally:
+            self.markBusy(reader)
+
+        lines = head[:-4].split(b'\r\n')
+        try:
+            method, target, version = lines[0].decode('latin-1').split(' ')
+        except ValueError:
+            raise HTTPError(400, 'Invalid request line.')
+        if version not in ('HTTP/1.1', 'HTTP/1.0'):
+            raise HTTPError(505, 'HTTP version not supported.')
+
+        headers = {}
+        for line in lines[1:]:
+            name, separator, value = line.partition(b':')
+            if not separator:
+                raise HTTPError(400, 'Invalid header.')
+            headers[name.strip().lower().decode('latin-1')] = value.strip().decode('latin-1')
+
+        connection = headers.get('connection', '').lower()
+        keepAlive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+        if headers.get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = await self.readChunkedBody(reader)
+        else:
+            try:
+                length = int(headers.get('content-length', 0))
+            except ValueError:
+                raise HTTPError(400, 'Invalid Content-Length.')
+            if length > self.maxBodySize:
+                raise HTTPError(413, 'Request body is too large.')
+            body = await reader.readexactly(length) if length > 0 else b''
+
+        path, _, query = target.partition('?')
+        return HTTPRequest(method.upper(), path, query.encode('latin-1'), headers, body, keepAlive)
+
+    async def readChunkedBody(self, reader: asyncio.StreamReader) -> bytes:
+        body = bytearray()
+        while True:
+            try:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            except ValueError:
+                raise HTTPError(400, 'Invalid chunk size.')
+            if size == 0:
+                # Skip the trailers
+                while await reader.readuntil(b'\r\n') != b'\r\n':
+                    pass
+                return bytes(body)
+            if len(body) + size > self.maxBodySize:
+                raise HTTPError(413, 'Request body is too large.')
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+
+    def parseValues(self, request: HTTPRequest) -> dict:
+        '''
+        Parses the query string and url-encoded form body.
+        Like flask's request.values, query parameters take priority over form fields.
+        '''
+        values = {}
+        if request.body and request.headers.get('content-type', '').split(';')[0].strip() == 'application/x-www-form-urlencoded':
+            values.update(parse_qsl(request.body.decode('latin-1'), keep_blank_values=True))
+        if request.query:
+            values.update(parse_qsl(request.query.decode('latin-1'), keep_blank_values=True))
+        return values
+
+    async def dispatch(self, request: HTTPRequest):
+        'Routes the request and returns (body, status).'
+        routeMethods = self.routes.get(request.path)
+        if routeMethods is None:
+            return {
+                'code': -1,
+                'message': 'Not found.'
+            }, 404
+        handler = routeMethods.get(request.method)
+        if handler is None:
+            return {
+                'code': -1,
+                'message': 'Method not allowed.'
+            }, 405
+
+        response = await handler(self.parseValues(request))
+        if isinstance(response, tuple):
+            return response
+        return response, 200
+
+    def formatHead(self, status: int, contentType: str, keepAlive: bool, length: int = None) -> bytes:
+        'Formats the status line and headers. Without a length, the body is sent with chunked transfer encoding.'
+        return (f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n'
+                f'Content-Type: {contentType}\r\n'
+                + (f'Content-Length: {length}\r\n' if length is not None else 'Transfer-Encoding: chunked\r\n')
+                + f'Connection: {"keep-alive" if keepAlive else "close"}\r\n\r\n').encode('latin-1')
+
+    def formatResponse(self, response, status: int, keepAlive: bool) -> bytes:
+        if isinstance(response, (bytes, bytearray)):
+            body, contentType = bytes(response), 'application/octet-stream'
+        elif isinstance(response, str):
+            body, contentType = response.encode(), 'text/plain; charset=utf-8'
+        else:
+            body, contentType = self.encoder.dumps(response), self.encoder.contentType
+
+        return self.formatHead(status, contentType, keepAlive, len(body)) + body
+
+    async def writeStream(self, stream: ResponseStream, status: int, keepAlive: bool, writer: asyncio.StreamWriter) -> bool:
+        '''
+        Sends a streamed response with chunked transfer encoding, as its chunks are produced.
+        Returns False if the stream failed, in which case the response is incomplete and the connection must be closed.
+        '''
+        writer.write(self.formatHead(status, stream.contentType, keepAlive))
+        try:
+            async for chunk in stream:
+                if chunk:
+                    writer.write(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+                    await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception:
+            return False
+        writer.write(b'0\r\n\r\n')
+        return True
+
+    async def writeResponses(self, responses: asyncio.Queue, writer: asyncio.StreamWriter) -> None:
+        'Sends the responses of a connection in the order of its requests.'
+        connected = True
+        while True:
+            item = await responses.get()
+            if item is None:
+                return
+            task, keepAlive = item
+            try:
+                response, status = await task
+            except Exception as e:
+                response, status = {
+                    'code': -1,
+                    'message': str(e)
+                }, 500
+            if not connected:
+                continue
+            try:
+                stream = ResponseStream.fromResponse(response)
+                if stream is not None:
+                    if not await self.writeStream(stream, status, keepAlive, writer):
+                        connected = False
+                        writer.close()
+                        continue
+                else:
+                    try:
+                        data = self.formatResponse(response, status, keepAlive)
+                    except Exception as e:
+                        # The client is answered, and the connection is closed, as the failure may not be the
+                        # response's alone.
+                        logging.exception('Failed to encode an HTTP response.')
+                        writer.write(self.formatResponse({
+                            'code': -1,
+                            'message': f'Failed to encode the response: {e}'
+                        }, 500, False))
+                        await writer.drain()
+                        connected = False
+                        writer.close()
+                        continue
+                    writer.write(data)
+                if responses.empty():
+                    await writer.drain()
+            except ConnectionError:
+                connected = False
+
+    async def handleConnection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        responses = asyncio.Queue(self.maxPipelineDepth)
+        responseWriter = asyncio.ensure_future(
+            self.writeResponses(responses, writer))
+        try:
+            while True:
+                try:
+                    request = await self.readRequest(reader, writer)
+                except HTTPError as e:
+                    future = asyncio.get_running_loop().create_future()
+                    future.set_result(({
+                        'code': -1,
+                        'message': e.message
+                    }, e.status))
+                    await responses.put((future, False))
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                keepAlive = request.keepAlive and not self.closing
+                await responses.put((asyncio.ensure_future(self.dispatch(request)), keepAlive))
+                if not keepAlive:
+                    break
+        finally:
+            try:
+                await responses.put(None)
+                await responseWriter
+            finally:
+                writer.close()
+
+
+class HTTPViaAsyncio(StandardProtocolHandler):
+    def __init__(self, host: str = '127.0.0.1', port: int = 8000, server: HTTPServer = None, reusePort: bool = False, **serverConfig):
+        '''
+        The standalone HTTP/1.1 protocol. It does not need Flask or an ASGI server.
+        Configure each endpoint using the metadata field "httpmethods" and "httproute".
+        Generator responses are sent with chunked transfer encoding.
+        :param server: The HTTPServer. Defaults to a new one, with the variable keyword arguments as its configuration.
+        :param reusePort: With Map.serve, every worker binds its own SO_REUSEPORT socket instead of sharing one.
+        '''
+        super().__init__()
+        self.name = "HTTPViaAsyncio"
+        self.supportsStreaming = True
+        self.host = host
+        self.port = port
+        self.reusePort = reusePort
+        self.server = server if server else HTTPServer(**serverConfig)
+
+    def sendDataProxy(self, data):
+        return data
+
+    def initialise(self):
+        for endpointIdentifier, endpoint in self.map.endpointMap.items():
+            self.onNewEndpoint(endpoint)
+
+    def httpProxy(self, endpointIdentifier):
+        async def proxyInternal(values):
+            return await self.map.incomingRequestAsync(self, endpointIdentifier, values.get, self.sendDataProxy, values.keys)
+        return proxyInternal
+
+    def onNewEndpoint(self, endpoint):
+        methods = endpoint['metadata'].get('httpmethods', ['GET', 'POST'])
+        route = endpoint['metadata'].get(
+            'httproute', '/' + endpoint['endpointIdentifier'])
+        self.server.addRoute(route, methods, self.httpProxy(
+            endpoint['endpointIdentifier']))
+
+    def bind(self) -> None:
+        if not self.reusePort:
+            self.server.bind(self.host, self.port)
+
+    def start(self) -> bool:
+        threading.Thread(target=self.server.run, args=(
+            self.host, self.port), kwargs={'reusePort': self.reusePort}).start()
+        return True
+
+    def isAlive(self, timeout: float) -> bool:
+        return self.server.isAlive(timeout)
+
+    def stop(self, timeout: float = None) -> None:
+        self.server.stop(timeout)
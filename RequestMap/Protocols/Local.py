@@ -0,0 +1,57 @@
+from .ProtocolBase import StandardProtocolHandler
+import copy
+
+
+class LocalProtocol(StandardProtocolHandler):
+    def __init__(self):
+        '''
+        The in-process protocol, used by LocalClient. Data and responses are passed as Python objects,
+        without any encoding. Get a client with Map.client().
+        '''
+        super().__init__()
+        self.name = "Local"
+
+    def sendDataProxy(self, data):
+        return data
+
+    def copyResponse(self, response):
+        # Callers receive the response objects themselves, and may modify them.
+        return copy.deepcopy(response)
+
+
+class LocalClient():
+    def __init__(self, map, protocol: LocalProtocol) -> None:
+        '''
+        Calls the endpoints of a Map in the same process. Calls go through the validators, data converters
+        and response handler like requests of any other protocol.
+        :param protocol: An installed LocalProtocol.
+        '''
+        self.map = map
+        self.protocol = protocol
+
+    def call(self, endpointIdentifier: str, **data):
+        'Calls an endpoint with data as the request data and returns its response.'
+        return self.map.incomingRequest(self.protocol, endpointIdentifier, data.get, self.protocol.sendDataProxy, data.keys)
+
+    async def callAsync(self, endpointIdentifier: str, **data):
+        'Same as call, on the running event loop.'
+        return await self.map.incomingRequestAsync(self.protocol, endpointIdentifier, data.get, self.protocol.sendDataProxy, data.keys)
+
+    def callMany(self, requests: list) -> list:
+        '''
+        Calls endpoints in bulk and returns the responses in the order of requests.
+        Requests to the same endpoint are handled together, so endpoints with a batch handler
+        are called once (see Map.incomingRequestBatch).
+        :param requests: A list of (endpointIdentifier, data).
+        '''
+        groups = {}
+        for index, (endpointIdentifier, data) in enumerate(requests):
+            groups.setdefault(endpointIdentifier, []).append(index)
+
+        responses = [None] * len(requests)
+        for endpointIdentifier, indices in groups.items():
+            groupResponses = self.map.incomingRequestBatch(self.protocol, endpointIdentifier, [
+                (requests[index][1].get, requests[index][1].keys) for index in indices], self.protocol.sendDataProxy)
+            for index, response in zip(indices, groupResponses):
+                responses[index] = response
+        return responses
@@ -2,6 +2,8 @@ class StandardProtocolHandler:
     def __init__(self):
         self.map = None
         self.name = None
+        # Whether the protocol sends generator responses as they are produced (see Utilities.Streaming)
+        self.supportsStreaming = False
 
     def install(self, map) -> None:
         self.map = map
@@ -18,6 +20,33 @@ class StandardProtocolHandler:
         'The onNewEndpoint method is called when a new endpoint is added'
         pass
 
+    def copyResponse(self, response):
+        '''
+        Returns a copy of a response that the caller may modify.
+        Responses of the result cache and single-flight are shared by requests, and each request gets a copy.
+        Responses are returned as they are by default, for protocols that only encode them.
+        '''
+        return response
+
     def start(self) -> bool:
         'The start method is called when the map is started'
         pass
+
+    def bind(self) -> None:
+        '''
+        The bind method is called by Map.serve before the worker processes are forked.
+        Protocols that listen on a socket create it here, so every worker serves on it.
+        '''
+        pass
+
+    def isAlive(self, timeout: float) -> bool:
+        '''
+        The isAlive method is called by the workers of Map.serve before each heartbeat.
+        Return False if the protocol can no longer serve requests, for example because its event loop is blocked.
+        Wait for at most timeout seconds.
+        '''
+        return True
+
+    def stop(self, timeout: float = None) -> None:
+        'The stop method is called when the map is stopped. Stop accepting requests, and finish the requests in flight within timeout seconds.'
+        pass
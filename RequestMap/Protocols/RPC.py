@@ -0,0 +1,363 @@
+from .ProtocolBase import StandardProtocolHandler
+from .StreamServer import StreamServer
+from ..Exceptions import ExecutionTimeout
+from ..Utilities.JSONEncoding import StandardJSONEncoder, getDefaultEncoder
+from concurrent.futures import Future, TimeoutError
+import asyncio
+import itertools
+import json
+import logging
+import socket
+import struct
+import threading
+
+
+# Frame: the length of the body (4 bytes, big-endian), then the body.
+FRAME_HEADER = struct.Struct('!I')
+# Body: kind (1 byte), codec (1 byte), request id (4 bytes), length of the endpoint identifier (2 bytes),
+# then the endpoint identifier in UTF-8 and the payload.
+BODY_HEADER = struct.Struct('!BBIH')
+
+# Frame kinds
+REQUEST = 0
+RESPONSE = 1
+# The request could not be handled, for example because its payload could not be decoded.
+# The payload is the error message in UTF-8.
+ERROR = 2
+
+
+class JSONPayloadCodec():
+    'Encodes payloads as JSON with the default encoder, and decodes them with orjson if it is installed.'
+    codecId = 0
+
+    def __init__(self, encoder: StandardJSONEncoder = None) -> None:
+        self.encoder = encoder if encoder else getDefaultEncoder()
+        try:
+            import orjson
+            self.orjsonLoads = orjson.loads
+        except ImportError:
+            self.orjsonLoads = None
+
+    def dumps(self, obj) -> bytes:
+        return self.encoder.dumps(obj)
+
+    def loads(self, payload: bytes):
+        if self.orjsonLoads is not None:
+            try:
+                return self.orjsonLoads(payload)
+            except ValueError:
+                # The standard library also accepts NaN and Infinity.
+                pass
+        return json.loads(payload)
+
+
+class MsgPackPayloadCodec():
+    'Encodes payloads with msgpack. bytes are sent as they are.'
+    codecId = 1
+
+    def __init__(self) -> None:
+        import msgpack
+        self.msgpack = msgpack
+        self.default = StandardJSONEncoder().default
+
+    def dumps(self, obj) -> bytes:
+        return self.msgpack.packb(obj, use_bin_type=True, default=self.default)
+
+    def loads(self, payload: bytes):
+        return self.msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+def getCodecs() -> dict:
+    'Returns {codecId: codec} of the codecs that are available.'
+    codecs = {JSONPayloadCodec.codecId: JSONPayloadCodec()}
+    try:
+        codecs[MsgPackPayloadCodec.codecId] = MsgPackPayloadCodec()
+    except ImportError:
+        pass
+    return codecs
+
+
+def getDefaultCodec():
+    'Returns the msgpack codec if msgpack is installed, otherwise the JSON codec.'
+    codecs = getCodecs()
+    return codecs.get(MsgPackPayloadCodec.codecId, codecs[JSONPayloadCodec.codecId])
+
+
+def packFrame(kind: int, codecId: int, requestId: int, endpointIdentifier: str, payload: bytes) -> bytes:
+    identifier = endpointIdentifier.encode()
+    return FRAME_HEADER.pack(BODY_HEADER.size + len(identifier) + len(payload)) + \
+        BODY_HEADER.pack(kind, codecId, requestId, len(identifier)) + \
+        identifier + payload
+
+
+def unpackBody(body: bytes):
+    'Returns (kind, codecId, requestId, endpointIdentifier, payload).'
+    kind, codecId, requestId, identifierLength = BODY_HEADER.unpack_from(body)
+    start = BODY_HEADER.size
+    return kind, codecId, requestId, body[start:start + identifierLength].decode(), body[start + identifierLength:]
+
+
+class RPCServer(StreamServer):
+    def __init__(self, handler, maxFrameSize: int = 16 * 1024 * 1024, maxConcurrency: int = 256) -> None:
+        '''
+        Serves RPC frames. A connection carries many requests at the same time, and responses are sent
+        as soon as they are ready, in any order.
+        :param handler: A coroutine function that receives the endpoint identifier and the data of a request,
+        and returns the response.
+        :param maxFrameSize: Connections that send larger frames are closed.
+        :param maxConcurrency: The maximum number of requests of a connection that are handled at the same time.
+        '''
+        super().__init__()
+        self.handler = handler
+        self.maxFrameSize = maxFrameSize
+        self.maxConcurrency = maxConcurrency
+        self.codecs = getCodecs()
+
+    async def handleRequest(self, codecId: int, requestId: int, endpointIdentifier: str, payload: bytes, writer: asyncio.StreamWriter, writeLock: asyncio.Lock, slots: asyncio.Semaphore) -> None:
+        try:
+            codec = self.codecs.get(codecId)
+            if codec is None:
+                frame = packFrame(ERROR, codecId, requestId, '',
+                                  f'Unsupported codec: {codecId}'.encode())
+            else:
+                try:
+                    data = codec.loads(payload) if payload else {}
+                    if not isinstance(data, dict):
+                        raise TypeError('The payload must be a dictionary.')
+                except Exception as e:
+                    frame = packFrame(ERROR, codecId, requestId, '',
+                                      f'Invalid payload: {e}'.encode())
+                else:
+                    try:
+                        response = await self.handler(endpointIdentifier, data)
+                        frame = packFrame(RESPONSE, codecId, requestId,
+                                          '', codec.dumps(response))
+                    except Exception as e:
+                        # The client is answered, instead of waiting for a response that is never sent.
+                        logging.exception(
+                            f'Failed to handle the RPC request to {endpointIdentifier}.')
+                        frame = packFrame(ERROR, codecId, requestId, '',
+                                          f'Failed to handle the request: {e}'.encode())
+            async with writeLock:
+                writer.write(frame)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            slots.release()
+
+    async def handleConnection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writeLock = asyncio.Lock()
+        slots = asyncio.Semaphore(self.maxConcurrency)
+        tasks = set()
+        try:
+            # Requests in flight are finished when the server shuts down, but no new ones are read.
+            while self.markIdle(reader):
+                try:
+                    length, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                    self.markBusy(reader)
+                    if length < BODY_HEADER.size or length > self.maxFrameSize:
+                        break
+                    kind, codecId, requestId, endpointIdentifier, payload = unpackBody(
+                        await reader.readexactly(length))
+                except (asyncio.IncompleteReadError, ConnectionError, UnicodeDecodeError):
+                    break
+                if kind != REQUEST:
+                    continue
+                await slots.acquire()
+                task = asyncio.ensure_future(self.handleRequest(
+                    codecId, requestId, endpointIdentifier, payload, writer, writeLock, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            writer.close()
+
+
+class RPCViaSocket(StandardProtocolHandler):
+    def __init__(self, host: str = '127.0.0.1', port: int = 8001, path: str = None, maxFrameSize: int = 16 * 1024 * 1024, maxConcurrency: int = 256, reusePort: bool = False):
+        '''
+        The RPC protocol. Requests and responses are length-prefixed binary frames over a persistent TCP or Unix socket.
+        A connection carries many requests at the same time, and responses are sent as soon as they are ready,
+        in any order. Call it with RPCClient.
+        The payload of a request is the data (a dict), and the payload of a response is the output of the
+        response handler. Both are encoded with the codec chosen by the client.
+        :param path: Listen on this Unix socket instead of host and port.
+        :param maxFrameSize: Connections that send larger frames are closed.
+        :param maxConcurrency: The maximum number of requests of a connection that are handled at the same time.
+        :param reusePort: With Map.serve, every worker binds its own SO_REUSEPORT socket instead of sharing one.
+        '''
+        super().__init__()
+        self.name = "RPCViaSocket"
+        self.host = host
+        self.port = port
+        self.path = path
+        self.reusePort = reusePort and not path
+        self.server = RPCServer(self.handleCall, maxFrameSize, maxConcurrency)
+
+    def sendDataProxy(self, data):
+        return data
+
+    async def handleCall(self, endpointIdentifier: str, data: dict):
+        return await self.map.incomingRequestAsync(
+            self, endpointIdentifier, data.get, self.sendDataProxy, data.keys)
+
+    def bind(self) -> None:
+        if not self.reusePort:
+            self.server.bind(self.host, self.port, self.path)
+
+    def start(self) -> bool:
+        threading.Thread(target=self.server.run, args=(self.host, self.port, self.path),
+                         kwargs={'reusePort': self.reusePort}).start()
+        return True
+
+    def isAlive(self, timeout: float) -> bool:
+        return self.server.isAlive(timeout)
+
+    def stop(self, timeout: float = None) -> None:
+        self.server.stop(timeout)
+
+
+class RPCConnection():
+    'A connection of RPCClient. Responses are read by a background thread and matched to requests by id.'
+
+    def __init__(self, sock: socket.socket, codec) -> None:
+        self.socket = sock
+        self.codec = codec
+        self.requestIds = itertools.count()
+        # Request id -> Future
+        self.pending = {}
+        self.sendLock = threading.Lock()
+        self.closed = False
+        threading.Thread(target=self.readResponses, daemon=True).start()
+
+    def readExactly(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.socket.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('The connection was closed.')
+            data += chunk
+        return bytes(data)
+
+    def readResponses(self) -> None:
+        try:
+            while True:
+                length, = FRAME_HEADER.unpack(self.readExactly(FRAME_HEADER.size))
+                kind, _, requestId, _, payload = unpackBody(self.readExactly(length))
+                future = self.pending.pop(requestId, None)
+                if future is None or not future.set_running_or_notify_cancel():
+                    # The caller has stopped waiting
+                    continue
+                if kind == ERROR:
+                    future.set_exception(ValueError(payload.decode()))
+                else:
+                    try:
+                        future.set_result(self.codec.loads(payload))
+                    except Exception as e:
+                        future.set_exception(e)
+        except Exception as e:
+            self.close(e)
+
+    def submit(self, endpointIdentifier: str, data: dict) -> Future:
+        future = Future()
+        requestId = next(self.requestIds) % 2 ** 32
+        frame = packFrame(REQUEST, self.codec.codecId, requestId,
+                          endpointIdentifier, self.codec.dumps(data))
+        self.pending[requestId] = future
+        try:
+            with self.sendLock:
+                self.socket.sendall(frame)
+        except OSError as e:
+            self.pending.pop(requestId, None)
+            self.close(e)
+            raise ConnectionError(str(e))
+        return future
+
+    def close(self, exception: Exception = None) -> None:
+        self.closed = True
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+        for requestId in list(self.pending):
+            future = self.pending.pop(requestId, None)
+            if future is not None and future.set_running_or_notify_cancel():
+                future.set_exception(ConnectionError(
+                    f'The connection was closed: {exception}'))
+
+
+class RPCClient():
+    def __init__(self, host: str = '127.0.0.1', port: int = 8001, path: str = None, poolSize: int = 2, timeout: float = None, codec=None) -> None:
+        '''
+        The client of RPCViaSocket. Requests are spread over a pool of persistent connections,
+        and each connection carries many requests at the same time. Closed connections are reopened when needed.
+        It can be shared between threads and event loops.
+        :param path: Connect to this Unix socket instead of host and port.
+        :param poolSize: The number of connections.
+        :param timeout: Seconds to wait for a response. Defaults to no limit.
+        :param codec: The payload codec. Defaults to msgpack if it is installed, otherwise JSON.
+        '''
+        self.host = host
+        self.port = port
+        self.path = path
+        self.timeout = timeout
+        self.codec = codec if codec else getDefaultCodec()
+        self.connections = [None] * poolSize
+        self.nextConnection = itertools.count()
+        self.lock = threading.Lock()
+
+    def connect(self) -> socket.socket:
+        if self.path:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+        else:
+            sock = socket.create_connection((self.host, self.port))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def getConnection(self) -> RPCConnection:
+        index = next(self.nextConnection) % len(self.connections)
+        connection = self.connections[index]
+        if connection is None or connection.closed:
+            with self.lock:
+                connection = self.connections[index]
+                if connection is None or connection.closed:
+                    connection = self.connections[index] = RPCConnection(
+                        self.connect(), self.codec)
+        return connection
+
+    def submit(self, endpointIdentifier: str, data: dict = None) -> Future:
+        'Sends a request and returns a Future of its response.'
+        return self.getConnection().submit(endpointIdentifier, data if data else {})
+
+    def call(self, endpointIdentifier: str, data: dict = None, timeout: float = None):
+        '''
+        Calls an endpoint and returns its response.
+        :param data: The request data.
+        :param timeout: Seconds to wait for the response. Defaults to the timeout of the client.
+        '''
+        timeout = timeout if timeout is not None else self.timeout
+        future = self.submit(endpointIdentifier, data)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise ExecutionTimeout(endpointIdentifier, timeout)
+
+    async def callAsync(self, endpointIdentifier: str, data: dict = None, timeout: float = None):
+        'Same as call, without blocking the running event loop.'
+        timeout = timeout if timeout is not None else self.timeout
+        future = self.submit(endpointIdentifier, data)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise ExecutionTimeout(endpointIdentifier, timeout)
+
+    def close(self) -> None:
+        with self.lock:
+            for connection in self.connections:
+                if connection is not None:
+                    connection.close()
+            self.connections = [None] * len(self.connections)
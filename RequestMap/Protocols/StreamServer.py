@@ -0,0 +1,131 @@
+import asyncio
+import socket
+import threading
+
+
+class StreamServer():
+    '''
+    Base class of the servers on asyncio streams (HTTPServer, RPCServer).
+    It serves on its own socket, on a socket bound before the workers of Map.serve are forked, or on a
+    SO_REUSEPORT socket per process, and shuts down gracefully.
+    Subclasses implement handleConnection, and read requests between markIdle and markBusy.
+    '''
+
+    # The buffer limit of the stream readers
+    streamLimit = 64 * 1024
+
+    def __init__(self) -> None:
+        # The asyncio server and its event loop, while serving
+        self.server = None
+        self.loop = None
+        # A listening socket created by bind
+        self.socket = None
+        self.closing = False
+        self.stopped = None
+        # The tasks of the open connections
+        self.connections = set()
+        # The readers of connections that are waiting for their next request
+        self.idleReaders = set()
+
+    async def handleConnection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        raise NotImplementedError
+
+    async def trackConnection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            await self.handleConnection(reader, writer)
+        finally:
+            self.connections.discard(task)
+            self.idleReaders.discard(reader)
+
+    def markIdle(self, reader: asyncio.StreamReader) -> bool:
+        'Marks the connection as waiting for its next request. Returns False if the server is shutting down.'
+        if self.closing:
+            return False
+        self.idleReaders.add(reader)
+        return True
+
+    def markBusy(self, reader: asyncio.StreamReader) -> None:
+        self.idleReaders.discard(reader)
+
+    def bind(self, host: str = '127.0.0.1', port: int = 8000, path: str = None) -> socket.socket:
+        '''
+        Creates the listening socket, so that processes forked afterwards serve on the same socket.
+        :param path: Listen on this Unix socket instead of host and port.
+        '''
+        if path:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.bind(path)
+        else:
+            self.socket = socket.create_server((host, port))
+        self.socket.listen(socket.SOMAXCONN)
+        self.socket.setblocking(False)
+        return self.socket
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8000, path: str = None, reusePort: bool = False) -> None:
+        '''
+        Serves on the running event loop until stopped. Uses the socket created by bind, if any.
+        :param path: Listen on this Unix socket instead of host and port.
+        :param reusePort: Bind with SO_REUSEPORT, so that several processes can listen on the same port.
+        '''
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.closing = False
+        if self.socket is not None and self.socket.family == getattr(socket, 'AF_UNIX', None):
+            self.server = await asyncio.start_unix_server(self.trackConnection, sock=self.socket, limit=self.streamLimit)
+        elif self.socket is not None:
+            self.server = await asyncio.start_server(self.trackConnection, sock=self.socket, limit=self.streamLimit)
+        elif path:
+            self.server = await asyncio.start_unix_server(self.trackConnection, path, limit=self.streamLimit)
+        else:
+            self.server = await asyncio.start_server(self.trackConnection, host, port, limit=self.streamLimit,
+                                                     reuse_port=True if reusePort else None)
+        try:
+            await self.server.serve_forever()
+        except asyncio.CancelledError:
+            # Raised when shutdown closes the server
+            pass
+        await self.stopped.wait()
+
+    async def shutdown(self, timeout: float = None) -> None:
+        '''
+        Stops accepting connections, ends idle connections, and waits up to timeout seconds for the requests in flight.
+        Connections that are still open after that are cancelled.
+        '''
+        self.closing = True
+        try:
+            self.server.close()
+            for reader in list(self.idleReaders):
+                reader.feed_eof()
+            connections = set(self.connections)
+            if connections:
+                await asyncio.wait(connections, timeout=timeout)
+            for connection in connections:
+                connection.cancel()
+        finally:
+            self.stopped.set()
+
+    def run(self, *args, **kw) -> None:
+        'Serves on a new event loop, blocking the current thread until stopped. Takes the arguments of serve.'
+        asyncio.run(self.serve(*args, **kw))
+
+    def isAlive(self, timeout: float) -> bool:
+        'Whether the event loop of the server runs a callback within timeout seconds. Called from another thread.'
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return False
+        ran = threading.Event()
+        try:
+            loop.call_soon_threadsafe(ran.set)
+        except RuntimeError:
+            # The loop was closed
+            return False
+        return ran.wait(timeout)
+
+    def stop(self, timeout: float = None) -> None:
+        'Shuts down from another thread, see shutdown.'
+        if self.loop is None or self.loop.is_closed() or self.stopped.is_set():
+            return
+        asyncio.run_coroutine_threadsafe(
+            self.shutdown(timeout), self.loop).result()
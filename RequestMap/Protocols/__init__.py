@@ -1,2 +1,15 @@
-from . import Flask as Flask
-from . import ProtocolBase as ProtocolBase
\ No newline at end of file
+import importlib
+
+# Protocol modules are imported on first access (RequestMap.Protocols.Flask), so that importing
+# RequestMap does not import Flask or the dependencies of protocols that are not used.
+__all__ = ['ASGI', 'Flask', 'HTTP', 'Local', 'ProtocolBase', 'RPC', 'StreamServer']
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return __all__
@@ -1,27 +1,90 @@
-import json
 from .ResponseBase import StandardResponseHandler
-
-# For Flask protocol only. This should be removed in the future and changed to Flask.addRule(...)
-from flask import jsonify
+from ..Utilities.JSONEncoding import StandardJSONEncoder, getDefaultEncoder
+from ..Utilities.Streaming import ResponseStream, aiterJSONEnvelope, iterAsync, iterJSONEnvelope
+from types import AsyncGeneratorType, GeneratorType
+from typing import Callable
 
 
 class JSONStandardizer(StandardResponseHandler):
     def __init__(self, standardMessages: dict = {
         0: "The request was successful",
         -1: "The request was unsuccessful",
-    }) -> None:
+    }, encoder: StandardJSONEncoder = None) -> None:
+        '''
+        Standardizes responses into {code, message, ...}.
+        :param encoder: The JSON encoder. Defaults to the shared default encoder: StandardJSONEncoder, or ORJSONEncoder after setDefaultEncoder(ORJSONEncoder()).
+        '''
         super().__init__()
         self.standardMessages = standardMessages
+        self.encoder = encoder if encoder else getDefaultEncoder()
+        # Protocol name -> function that converts the response dictionary into the output of that protocol.
+        # Protocols that are not listed get a JSON string.
+        self.outputFormats = {
+            'HTTPViaFlask': self.toFlaskResponse,
+            # Batch and by-identifier responses are encoded once, by the protocol.
+            'HTTPBatchRequestViaFlask': self.toDictionary,
+            'HTTPRequestByEndpointIdentifier': self.toDictionary,
+            # The ASGI application encodes the response
+            'HTTPViaASGI': self.toDictionary,
+            'HTTPBatchRequestViaASGI': self.toDictionary,
+            'HTTPRequestByEndpointIdentifierViaASGI': self.toDictionary,
+            # So do the HTTP server and the RPC protocol
+            'HTTPViaAsyncio': self.toDictionary,
+            'RPCViaSocket': self.toDictionary,
+            # Local calls receive Python objects
+            'Local': self.toDictionary,
+        }
+
+    def registerOutputFormat(self, protocolName: str, converter: Callable) -> None:
+        'Sets how responses are converted for a protocol. converter receives the response dictionary.'
+        self.outputFormats[protocolName] = converter
+
+    def toDictionary(self, response):
+        return response
+
+    def toJSONString(self, response):
+        return self.encoder.dumps(response).decode()
+
+    def toFlaskResponse(self, response):
+        from flask import Response
+        return Response(self.encoder.dumps(response), mimetype=self.encoder.contentType)
+
+    def toStream(self, response, key, protocol=None):
+        '''
+        Converts a response with a generator value into a stream of JSON, that is encoded one item at a time.
+        Protocols that do not support streaming get the generator's items as a list. The items of an async generator
+        are collected on a private event loop, which is not possible from a coroutine: there, it raises TypeError.
+        '''
+        items = response[key]
+        if getattr(protocol, 'supportsStreaming', False):
+            iterEnvelope = aiterJSONEnvelope if isinstance(
+                items, AsyncGeneratorType) else iterJSONEnvelope
+            return ResponseStream(iterEnvelope(self.encoder, response, key, items, self.streamErrorHandler), self.encoder.contentType)
+        if isinstance(items, GeneratorType):
+            response[key] = list(items)
+        elif isinstance(items, AsyncGeneratorType):
+            import asyncio
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                response[key] = list(iterAsync(items))
+            else:
+                raise TypeError(
+                    f"{getattr(protocol, 'name', protocol)} does not stream, and the async generator of {key} can not be collected from a coroutine. Return a list instead.")
+        return self.outputFormats.get(protocol.name, self.toJSONString)(response)
+
+    def streamErrorHandler(self, exception):
+        'The "error" of a stream that failed after its response was started.'
+        return {
+            'code': getattr(exception, 'code', -1),
+            'message': str(exception)
+        }
 
     def convertDictionaryResponse(self, response, *, protocol=None):
-        if protocol.name == 'HTTPViaFlask':
-            return jsonify(response)
-        elif protocol.name == 'HTTPBatchRequestViaFlask':
-            return response  # Do not convert to JSON for batch requests
-        elif protocol.name == 'HTTPRequestByEndpointIdentifier':
-            return response
-        else:
-            return json.dumps(response)
+        for key, value in response.items():
+            if isinstance(value, (GeneratorType, AsyncGeneratorType)):
+                return self.toStream(response, key, protocol)
+        return self.outputFormats.get(protocol.name, self.toJSONString)(response)
 
     def standardizeResponse(self, code, message=None, *, protocol=None, **kw):
         res = {
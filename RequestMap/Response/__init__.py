@@ -1,2 +1,14 @@
-from . import JSON as JSON
-from . import ResponseBase as ResponseBase
+import importlib
+
+# Response handler modules are imported on first access, see RequestMap.Protocols.
+__all__ = ['JSON', 'ResponseBase']
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return __all__
@@ -0,0 +1,159 @@
+from concurrent.futures import Future, TimeoutError
+from typing import NamedTuple
+import heapq
+import itertools
+import threading
+
+from ..Exceptions import Overloaded
+
+
+# Named priority classes. Lower values are admitted first.
+PRIORITIES = {
+    'critical': 0,
+    'high': 1,
+    'normal': 2,
+    'low': 3
+}
+
+
+def getPriority(priority) -> int:
+    if isinstance(priority, str):
+        if priority not in PRIORITIES:
+            raise ValueError(
+                f"Unknown priority {priority}. Use an int or one of {', '.join(PRIORITIES)}.")
+        return PRIORITIES[priority]
+    return int(priority)
+
+
+class AdmissionPolicy(NamedTuple):
+    '''
+    The admission control of an endpoint, compiled from its metadata:
+    {'admission': {'maxInFlight': 8, 'maxQueue': 32, 'queueTimeout': 0.5, 'priority': 'critical'}}
+    - maxInFlight: the maximum number of calls of the endpoint running at the same time. Optional.
+    - maxQueue: how many calls may wait for a slot. Further calls are rejected with Overloaded. Defaults to 0.
+    - queueTimeout: seconds a call may wait for a slot before it is rejected with Overloaded. Defaults to no limit.
+    - priority: the priority class of the endpoint, for the limit shared by every endpoint (see Map.useAdmissionControl).
+      One of PRIORITIES or an int. Defaults to normal.
+    '''
+    maxInFlight: int
+    maxQueue: int
+    queueTimeout: float
+    priority: int
+
+    @classmethod
+    def fromEndpoint(cls, endpoint):
+        'Returns the policy of the endpoint, or None if it has no admission metadata.'
+        config = endpoint.metadata.get('admission')
+        if config is None:
+            return None
+        if not isinstance(config, dict):
+            raise TypeError(
+                f"Admission metadata of {endpoint.endpointIdentifier} must be a dict.")
+        return cls(config.get('maxInFlight'), config.get('maxQueue', 0),
+                   config.get('queueTimeout'), getPriority(config.get('priority', 'normal')))
+
+
+class AdmissionLimiter():
+    '''
+    Limits the number of calls in flight. Calls over the limit wait in a bounded queue,
+    and are admitted by priority, then in arrival order.
+    When the queue is full, a call of higher priority than the lowest waiting one takes its place,
+    and the displaced call is rejected. Otherwise the new call is rejected.
+    '''
+
+    def __init__(self, name: str, maxInFlight: int, maxQueue: int = 0, queueTimeout: float = None) -> None:
+        '''
+        :param name: Reported in the Overloaded exception.
+        :param maxInFlight: The maximum number of calls in flight.
+        :param maxQueue: The maximum number of waiting calls.
+        :param queueTimeout: Seconds a call may wait. Defaults to no limit.
+        '''
+        if maxInFlight is None or maxInFlight < 1:
+            raise ValueError("maxInFlight must be at least 1.")
+        self.name = name
+        self.maxInFlight = maxInFlight
+        self.maxQueue = maxQueue or 0
+        self.queueTimeout = queueTimeout
+        self.inFlight = 0
+        # Heap of [priority, sequence, future]
+        self.waiters = []
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+
+    def join(self, priority: int):
+        'Takes a slot and returns None, or returns a Future that resolves once a slot is handed over.'
+        with self.lock:
+            if self.inFlight < self.maxInFlight and not self.waiters:
+                self.inFlight += 1
+                return None
+
+            if len(self.waiters) >= self.maxQueue:
+                if not self.waiters:
+                    raise Overloaded(self.name, 'too many calls in flight')
+                lowest = max(self.waiters)
+                if lowest[0] <= priority:
+                    raise Overloaded(self.name, 'the queue is full')
+                self.waiters.remove(lowest)
+                heapq.heapify(self.waiters)
+                lowest[2].set_exception(Overloaded(
+                    self.name, 'displaced by a call of higher priority'))
+
+            future = Future()
+            heapq.heappush(self.waiters, [priority, next(self.sequence), future])
+            return future
+
+    def leave(self, future: Future) -> None:
+        'Gives up waiting. If the slot has already been handed over, it is released.'
+        with self.lock:
+            if future.cancel():
+                for waiter in self.waiters:
+                    if waiter[2] is future:
+                        self.waiters.remove(waiter)
+                        heapq.heapify(self.waiters)
+                        break
+                return
+        if future.exception() is None:
+            self.release()
+
+    def release(self) -> None:
+        'Releases a slot, handing it over to the first waiting call.'
+        with self.lock:
+            while self.waiters:
+                future = heapq.heappop(self.waiters)[2]
+                if future.set_running_or_notify_cancel():
+                    future.set_result(None)
+                    return
+            self.inFlight -= 1
+
+    def acquire(self, priority: int = PRIORITIES['normal']) -> None:
+        'Waits for a slot. Raises Overloaded if the call is rejected or times out.'
+        future = self.join(priority)
+        if future is None:
+            return
+        try:
+            future.result(self.queueTimeout)
+        except TimeoutError:
+            self.leave(future)
+            raise Overloaded(self.name, 'timed out in the queue')
+        except BaseException:
+            # Interrupted while waiting
+            self.leave(future)
+            raise
+
+    async def acquireAsync(self, priority: int = PRIORITIES['normal']) -> None:
+        'Same as acquire, without blocking the running event loop.'
+        import asyncio
+        future = self.join(priority)
+        if future is None:
+            return
+        waiting = asyncio.wrap_future(future)
+        try:
+            done, _ = await asyncio.wait({waiting}, timeout=self.queueTimeout)
+        except BaseException:
+            # Cancelled while waiting, possibly after the slot was handed over.
+            self.leave(future)
+            raise
+        if not done:
+            self.leave(future)
+            raise Overloaded(self.name, 'timed out in the queue')
+        waiting.result()
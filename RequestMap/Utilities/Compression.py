@@ -0,0 +1,220 @@
+from collections import OrderedDict
+from typing import NamedTuple
+import hashlib
+import threading
+import zlib
+
+
+class ZlibCodec():
+    'gzip and deflate, from the standard library.'
+    defaultLevel = 6
+    maxLevel = 9
+
+    def __init__(self, name: str, wbits: int) -> None:
+        self.name = name
+        self.wbits = wbits
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, self.wbits)
+        return compressor.compress(data) + compressor.flush()
+
+    def compressStream(self, chunks, level: int):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, self.wbits)
+        for chunk in chunks:
+            # Flushed per chunk, so the client receives each chunk as soon as it is produced.
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+class BrotliCodec():
+    name = 'br'
+    defaultLevel = 4
+    maxLevel = 11
+
+    def __init__(self) -> None:
+        import brotli
+        self.brotli = brotli
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        return self.brotli.compress(data, quality=level)
+
+    def compressStream(self, chunks, level: int):
+        compressor = self.brotli.Compressor(quality=level)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+
+
+class ZstdCodec():
+    name = 'zstd'
+    defaultLevel = 3
+    maxLevel = 22
+
+    def __init__(self) -> None:
+        import zstandard
+        self.zstandard = zstandard
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        return self.zstandard.ZstdCompressor(level=level).compress(data)
+
+    def compressStream(self, chunks, level: int):
+        compressor = self.zstandard.ZstdCompressor(level=level).compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(self.zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+
+
+def getCodecs() -> dict:
+    '''
+    Returns {name: codec} of the codecs that are available, in order of preference.
+    zstd (zstandard) and br (brotli) are faster for the same ratio, and are used when they are installed.
+    '''
+    codecs = {}
+    for codec in (ZstdCodec, BrotliCodec):
+        try:
+            instance = codec()
+        except ImportError:
+            continue
+        codecs[instance.name] = instance
+    codecs['gzip'] = ZlibCodec('gzip', 16 + zlib.MAX_WBITS)
+    codecs['deflate'] = ZlibCodec('deflate', zlib.MAX_WBITS)
+    return codecs
+
+
+def parseAcceptEncoding(acceptEncoding: str) -> dict:
+    'Returns {coding: q} of an Accept-Encoding header.'
+    accepted = {}
+    for item in acceptEncoding.split(','):
+        coding, _, parameters = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        parameters = parameters.strip()
+        if parameters.startswith('q='):
+            try:
+                q = float(parameters[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class CompressionPolicy(NamedTuple):
+    '''
+    The compression policy of an endpoint, compiled from its "compression" metadata, or from the
+    compression argument of a protocol:
+    compression={'minSize': 1024, 'level': 6, 'codecs': ['gzip'], 'precompress': True}
+    - minSize: responses smaller than this many bytes are sent uncompressed. Defaults to 1024.
+    - level: the compression level, capped at the maximum of each codec. Defaults to the codec's default.
+    - codecs: the codecs that may be used. Defaults to every available codec.
+    - precompress: keep the compressed bytes of response bodies, so the bodies of cached responses are compressed once.
+      Defaults to True for endpoints with a "cache" policy.
+    True compresses with the defaults, False disables compression.
+    '''
+    minSize: int = 1024
+    level: int = None
+    codecs: tuple = None
+    precompress: bool = False
+
+    @classmethod
+    def fromConfig(cls, config, precompress: bool = False):
+        'Returns the policy of a configuration, or None if it disables compression.'
+        if not config:
+            return None
+        if config is True:
+            return cls(precompress=precompress)
+        if not isinstance(config, dict):
+            raise TypeError(
+                "Compression configuration must be True, False or a dict.")
+        codecs = config.get('codecs')
+        return cls(config.get('minSize', 1024), config.get('level'),
+                   tuple(codecs) if codecs is not None else None,
+                   config.get('precompress', precompress))
+
+    @classmethod
+    def fromEndpoint(cls, endpoint, default=None):
+        '''
+        Returns the policy of the endpoint, or None if its responses are not compressed.
+        :param default: The configuration of endpoints without "compression" metadata.
+        '''
+        config = endpoint.metadata.get('compression', default)
+        return cls.fromConfig(config, bool(endpoint.metadata.get('cache')))
+
+
+class Compressor():
+    def __init__(self, maxPrecompressedBytes: int = 64 * 1024 * 1024) -> None:
+        '''
+        Negotiates and applies the content coding of responses.
+        :param maxPrecompressedBytes: The maximum total size of the compressed bytes that are kept.
+        '''
+        self.codecs = getCodecs()
+        self.maxPrecompressedBytes = maxPrecompressedBytes
+        # blake2b digest of the body -> {(coding, level): bytes}
+        self.precompressed = OrderedDict()
+        self.precompressedBytes = 0
+        self.lock = threading.Lock()
+
+    def negotiate(self, acceptEncoding: str, policy: CompressionPolicy) -> str:
+        'Returns the coding to use, or None if the response is sent uncompressed.'
+        if not acceptEncoding:
+            return None
+        accepted = parseAcceptEncoding(acceptEncoding)
+        wildcard = accepted.get('*', 0.0)
+        best, bestQ = None, 0.0
+        for name in self.codecs:
+            if policy.codecs is not None and name not in policy.codecs:
+                continue
+            q = accepted.get(name, wildcard)
+            # Ties go to the codec that comes first in the order of preference.
+            if q > bestQ:
+                best, bestQ = name, q
+        return best
+
+    def getLevel(self, coding: str, policy: CompressionPolicy) -> int:
+        codec = self.codecs[coding]
+        if policy.level is None:
+            return codec.defaultLevel
+        return min(policy.level, codec.maxLevel)
+
+    def compress(self, body: bytes, coding: str, policy: CompressionPolicy) -> bytes:
+        return self.codecs[coding].compress(body, self.getLevel(coding, policy))
+
+    def compressStream(self, chunks, coding: str, policy: CompressionPolicy):
+        'Compresses an iterable of bytes as it is produced.'
+        for chunk in self.codecs[coding].compressStream(chunks, self.getLevel(coding, policy)):
+            if chunk:
+                yield chunk
+
+    def compressCached(self, body: bytes, coding: str, policy: CompressionPolicy) -> bytes:
+        '''
+        Compresses body once for every coding, and reuses the compressed bytes for as long as the same body is sent,
+        as cached endpoints do. Entries are looked up by a blake2b digest of the body, as ETags are.
+        The least recently used entries are removed once the compressed bytes exceed maxPrecompressedBytes.
+        '''
+        level = self.getLevel(coding, policy)
+        key = hashlib.blake2b(body, digest_size=16).digest()
+        with self.lock:
+            entry = self.precompressed.get(key)
+            if entry is not None:
+                self.precompressed.move_to_end(key)
+                compressed = entry.get((coding, level))
+                if compressed is not None:
+                    return compressed
+        compressed = self.codecs[coding].compress(body, level)
+        if len(compressed) > self.maxPrecompressedBytes:
+            return compressed
+        with self.lock:
+            entry = self.precompressed.get(key)
+            if entry is None:
+                entry = self.precompressed[key] = {}
+            previous = entry.get((coding, level))
+            if previous is not None:
+                self.precompressedBytes -= len(previous)
+            entry[(coding, level)] = compressed
+            self.precompressedBytes += len(compressed)
+            self.precompressed.move_to_end(key)
+            while self.precompressedBytes > self.maxPrecompressedBytes:
+                _, evicted = self.precompressed.popitem(last=False)
+                self.precompressedBytes -= sum(len(value) for value in evicted.values())
+        return compressed
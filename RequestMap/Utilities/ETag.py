@@ -0,0 +1,108 @@
+from typing import Callable, NamedTuple
+import hashlib
+import inspect
+
+from ..Exceptions import NotModified
+
+
+# The data name under which protocols pass the ConditionalRequest of a request
+CONDITIONAL_REQUEST = 'conditionalRequest'
+
+
+class ETagPolicy(NamedTuple):
+    '''
+    The entity tags of an endpoint, compiled from its "etag" metadata:
+    etag={'cacheControl': 'private, max-age=60', 'weak': False, 'version': getVersion}
+    - cacheControl: the Cache-Control header of its responses. Optional.
+    - weak: send weak entity tags (W/"..."). Defaults to False.
+    - version: returns the version of the response from the parameters it names, which are passed as they are passed
+      to the handler. It is called after the validators and before the handler, so a request for a version the client
+      already has is answered with "not modified" without calling the handler. It may return None to skip the check.
+      Defaults to a hash of the response body, computed after the handler.
+    True uses the defaults.
+    '''
+    cacheControl: str = None
+    weak: bool = False
+    version: Callable = None
+    # The parameters of version
+    versionParameters: tuple = ()
+
+    @classmethod
+    def fromEndpoint(cls, endpoint):
+        'Returns the policy of the endpoint, or None if it has no etag metadata.'
+        config = endpoint.metadata.get('etag')
+        if not config:
+            return None
+        if config is True:
+            return cls()
+        if not isinstance(config, dict):
+            raise TypeError(
+                f"ETag metadata of {endpoint.endpointIdentifier} must be True or a dict.")
+        version = config.get('version')
+        if version is not None and not callable(version):
+            raise TypeError(
+                f"The version of {endpoint.endpointIdentifier} must be callable.")
+        return cls(config.get('cacheControl'), config.get('weak', False), version,
+                   tuple(inspect.signature(version).parameters) if version is not None else ())
+
+
+def formatETag(version, weak: bool = False) -> str:
+    tag = '"' + str(version).replace('"', '') + '"'
+    return 'W/' + tag if weak else tag
+
+
+def hashETag(body: bytes, weak: bool = False) -> str:
+    'Returns an entity tag from the hash of a response body.'
+    return formatETag(hashlib.blake2b(body, digest_size=12).hexdigest(), weak)
+
+
+def parseIfNoneMatch(ifNoneMatch: str) -> frozenset:
+    'Returns the entity tags of an If-None-Match header, without their weak prefix, for the weak comparison.'
+    tags = set()
+    for tag in ifNoneMatch.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag:
+            tags.add(tag)
+    return frozenset(tags)
+
+
+class ConditionalRequest():
+    '''
+    The entity tags a client has (If-None-Match), and the entity tag of the response to it.
+    Protocols that support conditional requests pass it as the "conditionalRequest" data of the request.
+    Handlers of endpoints with "etag" metadata can take it as a parameter, and call check before doing expensive work.
+    '''
+    __slots__ = ('tags', 'etag', 'notModified')
+
+    def __init__(self, ifNoneMatch: str = None) -> None:
+        self.tags = parseIfNoneMatch(ifNoneMatch) if ifNoneMatch else frozenset()
+        # The entity tag of the response, once known
+        self.etag = None
+        # Whether the client already has the response
+        self.notModified = False
+
+    def matches(self, etag: str) -> bool:
+        if not self.tags:
+            return False
+        return '*' in self.tags or (etag[2:] if etag.startswith('W/') else etag) in self.tags
+
+    def check(self, version, weak: bool = False) -> None:
+        '''
+        Sets the entity tag of the response from version.
+        Raises NotModified if the client already has that version.
+        '''
+        self.etag = formatETag(version, weak)
+        if self.matches(self.etag):
+            self.notModified = True
+            raise NotModified(self.etag)
+
+
+def withConditionalRequest(getData: Callable, conditionalRequest: ConditionalRequest) -> Callable:
+    'Returns a getData function that also passes conditionalRequest.'
+    def getDataWithConditionalRequest(key):
+        if key == CONDITIONAL_REQUEST:
+            return conditionalRequest
+        return getData(key)
+    return getDataWithConditionalRequest
@@ -1,39 +1,70 @@
-from typing import Any, Callable
+from collections.abc import MutableMapping
+from typing import Any, Callable, Iterable
 
+# Marks a key that has not been fetched yet
+_NOT_FETCHED = object()
 
-class JITDict(dict):
+
+class JITDict(MutableMapping):
     '''
     Just-in-time dictionary
-    - fetches the key from getData in real time
+    - fetches the key from getData the first time it is accessed, and remembers the value
+      (including None, so a missing key is only looked up once)
     - stores a copy of any changes
     - returns None if a key does not exist
+    - iterates over the keys from getKeys, if given, plus the keys that were set.
+      Without getKeys, only keys that were accessed or set are known.
     '''
+    __slots__ = ('getData', 'getKeys', 'cache')
 
-    def __init__(self, getData: Callable, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(self, getData: Callable, *args, getKeys: Callable[[], Iterable] = None, **kwargs):
         self.getData = getData
+        self.getKeys = getKeys
+        self.cache = dict(*args, **kwargs) if args or kwargs else {}
 
     def __getitem__(self, key: str) -> Any:
-        if super().__contains__(key):
-            return super().__getitem__(key)
-        else:
-            return self.getData(key)
+        value = self.cache.get(key, _NOT_FETCHED)
+        if value is _NOT_FETCHED:
+            value = self.cache[key] = self.getData(key)
+        return value
 
     def __setitem__(self, key, value):
-        super().__setitem__(key, value)
+        self.cache[key] = value
+
+    def __delitem__(self, key: str):
+        self.cache[key] = None
 
     def __contains__(self, __o: object) -> bool:
-        sup = super().__contains__(__o)
-        if not sup:
-            return self.getData(__o) is not None
-        return True
+        value = self.cache.get(__o, _NOT_FETCHED)
+        if value is _NOT_FETCHED:
+            value = self.cache[__o] = self.getData(__o)
+        return value is not None
 
     def get(self, key: str, default: Any = None) -> Any:
-        data = self.__getitem__(key)
-        if data:
-            return data
-        else:
+        value = self.cache.get(key, _NOT_FETCHED)
+        if value is _NOT_FETCHED:
+            value = self.cache[key] = self.getData(key)
+        if value is None:
             return default
+        return value
 
-    def __delitem__(self, key: str):
-        self.__setitem__(key, None)
+    def __iter__(self):
+        if self.getKeys is not None:
+            seen = set()
+            for key in self.getKeys():
+                seen.add(key)
+                if key in self:
+                    yield key
+            for key, value in list(self.cache.items()):
+                if key not in seen and value is not None:
+                    yield key
+        else:
+            for key, value in list(self.cache.items()):
+                if value is not None:
+                    yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f'JITDict({dict(self.items())!r})'
@@ -0,0 +1,65 @@
+from dataclasses import asdict, is_dataclass
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+import json
+
+
+class StandardJSONEncoder():
+    '''
+    Encodes JSON to bytes with the standard library.
+    Dates and times are encoded in ISO 8601, UUIDs and Decimals as strings and dataclasses as objects.
+    '''
+    contentType = 'application/json'
+
+    def default(self, obj) -> Any:
+        if isinstance(obj, (datetime, date, time)):
+            return obj.isoformat()
+        if isinstance(obj, (UUID, Decimal)):
+            return str(obj)
+        if is_dataclass(obj) and not isinstance(obj, type):
+            return asdict(obj)
+        raise TypeError(
+            f'Object of type {type(obj).__name__} is not JSON serializable')
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, default=self.default, separators=(',', ':')).encode()
+
+
+class ORJSONEncoder(StandardJSONEncoder):
+    '''
+    Encodes JSON to bytes with orjson, which is several times faster than the standard library.
+    Objects that orjson does not encode, such as integers over 64 bits and named tuples, are encoded with the
+    standard library instead. Unlike the standard library, it encodes NaN and infinity as null.
+    Opt in with setDefaultEncoder(ORJSONEncoder()), or pass it as the encoder of a protocol or JSONStandardizer.
+    '''
+
+    def __init__(self) -> None:
+        import orjson
+        self.orjson = orjson
+        self.options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj) -> bytes:
+        try:
+            return self.orjson.dumps(obj, default=self.default, option=self.options)
+        except TypeError:
+            # orjson.JSONEncodeError is a TypeError
+            return super().dumps(obj)
+
+
+defaultEncoder = None
+
+
+def getDefaultEncoder() -> StandardJSONEncoder:
+    'Returns the shared encoder of the protocols and JSONStandardizer: a StandardJSONEncoder, unless set with setDefaultEncoder.'
+    global defaultEncoder
+    if defaultEncoder is None:
+        defaultEncoder = StandardJSONEncoder()
+    return defaultEncoder
+
+
+def setDefaultEncoder(encoder: StandardJSONEncoder) -> None:
+    'Sets the shared encoder. Protocols and JSONStandardizers created afterwards use it.'
+    global defaultEncoder
+    defaultEncoder = encoder
@@ -0,0 +1,145 @@
+from bisect import bisect_left
+from time import perf_counter
+import threading
+
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# The phases of Map.incomingRequest. admission is only recorded for endpoints with admission control.
+PHASES = ('admission', 'validators', 'getCallDict', 'handler', 'response')
+
+
+class EndpointStatistics():
+    'Request and error counts, and a latency histogram per phase, of an endpoint on a protocol.'
+    __slots__ = ('buckets', 'requests', 'errors', 'phases')
+
+    def __init__(self, buckets: tuple) -> None:
+        self.buckets = buckets
+        self.requests = 0
+        # Exception code -> count
+        self.errors = {}
+        # Phase -> [count, sum, bucketCounts]. The last bucket counts observations above the largest bound.
+        self.phases = {phase: [0, 0.0, [0] * (len(buckets) + 1)]
+                       for phase in PHASES}
+
+    def observe(self, phase: str, seconds: float) -> None:
+        histogram = self.phases[phase]
+        histogram[0] += 1
+        histogram[1] += seconds
+        histogram[2][bisect_left(self.buckets, seconds)] += 1
+
+    def mergeInto(self, other: 'EndpointStatistics') -> None:
+        other.requests += self.requests
+        for code, count in list(self.errors.items()):
+            other.errors[code] = other.errors.get(code, 0) + count
+        for phase, (count, total, bucketCounts) in self.phases.items():
+            histogram = other.phases[phase]
+            histogram[0] += count
+            histogram[1] += total
+            histogram[2] = [a + b for a, b in zip(histogram[2], bucketCounts)]
+
+    def snapshot(self) -> dict:
+        return {
+            'requests': self.requests,
+            'errors': dict(self.errors),
+            'phases': {
+                phase: {
+                    'count': count,
+                    'sum': total,
+                    'buckets': [[bound, bucketCount] for bound, bucketCount in zip((*self.buckets, 'inf'), bucketCounts)]
+                } for phase, (count, total, bucketCounts) in self.phases.items()
+            }
+        }
+
+
+class RequestObserver():
+    'Times the phases of a single request.'
+    __slots__ = ('statistics', 'last')
+
+    def __init__(self, statistics: EndpointStatistics) -> None:
+        self.statistics = statistics
+        self.last = perf_counter()
+
+    def mark(self, phase: str) -> None:
+        'Records the time since the previous mark as the duration of phase.'
+        now = perf_counter()
+        self.statistics.observe(phase, now - self.last)
+        self.last = now
+
+    def fail(self, exception: Exception) -> None:
+        'Records a failed request, after its error response has been sent.'
+        code = getattr(exception, 'code', -1)
+        errors = self.statistics.errors
+        errors[code] = errors.get(code, 0) + 1
+        self.mark('response')
+
+
+class MetricsCollector():
+    '''
+    Collects EndpointStatistics with per-thread aggregation: every thread records into its own
+    statistics without locking, and snapshot merges them.
+    Statistics of threads that have ended are folded into a shared total.
+    '''
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.local = threading.local()
+        # List of (thread, {(endpointIdentifier, protocolName): EndpointStatistics})
+        self.threadStatistics = []
+        self.retired = {}
+        self.lock = threading.Lock()
+
+    def begin(self, endpointIdentifier: str, protocolName: str) -> RequestObserver:
+        'Counts a request and returns the observer that times its phases.'
+        try:
+            statistics = self.local.statistics
+        except AttributeError:
+            statistics = self.local.statistics = {}
+            with self.lock:
+                self.retireEndedThreads()
+                self.threadStatistics.append(
+                    (threading.current_thread(), statistics))
+
+        endpointStatistics = statistics.get((endpointIdentifier, protocolName))
+        if endpointStatistics is None:
+            endpointStatistics = statistics[(endpointIdentifier, protocolName)] = EndpointStatistics(
+                self.buckets)
+        endpointStatistics.requests += 1
+        return RequestObserver(endpointStatistics)
+
+    def retireEndedThreads(self) -> None:
+        'Folds the statistics of ended threads into the shared total. Must hold the lock.'
+        alive = []
+        for thread, statistics in self.threadStatistics:
+            if thread.is_alive():
+                alive.append((thread, statistics))
+                continue
+            for key, endpointStatistics in statistics.items():
+                if key not in self.retired:
+                    self.retired[key] = EndpointStatistics(self.buckets)
+                endpointStatistics.mergeInto(self.retired[key])
+        self.threadStatistics = alive
+
+    def snapshot(self) -> dict:
+        '''
+        Returns the merged statistics:
+        {endpointIdentifier: {protocolName: {'requests', 'errors', 'phases'}}}
+        '''
+        merged = {}
+        with self.lock:
+            self.retireEndedThreads()
+            sources = [self.retired] + [statistics for _,
+                                        statistics in self.threadStatistics]
+            for statistics in sources:
+                for key, endpointStatistics in list(statistics.items()):
+                    if key not in merged:
+                        merged[key] = EndpointStatistics(self.buckets)
+                    endpointStatistics.mergeInto(merged[key])
+
+        result = {}
+        for (endpointIdentifier, protocolName), endpointStatistics in merged.items():
+            result.setdefault(endpointIdentifier, {})[
+                protocolName] = endpointStatistics.snapshot()
+        return result
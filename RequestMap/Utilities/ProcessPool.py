@@ -0,0 +1,145 @@
+from typing import Any, Callable, NamedTuple
+import importlib
+
+# multiprocessing is imported where it is used, so importing RequestMap does not import it.
+
+
+# bytes arguments and results at least this large are passed through shared memory instead of the pipe
+SHARED_MEMORY_THRESHOLD = 1024 * 1024
+
+
+class ProcessPolicy(NamedTuple):
+    '''
+    How an endpoint runs in the process pool, compiled from its metadata:
+    {'executor': 'process', 'processConcurrency': 2, 'processTimeout': 30}
+    - processConcurrency: the maximum number of calls of the endpoint running in the pool at the same time.
+    - processTimeout: seconds after which the call fails with ExecutionTimeout.
+    '''
+    concurrency: int
+    timeout: float
+    # (module, qualname) of the handler, used to find it in the worker process
+    handlerReference: tuple
+
+    @classmethod
+    def fromEndpoint(cls, endpoint, reservedDataNames=()):
+        'Returns the policy of the endpoint, or None if it does not run in the process pool.'
+        metadata = endpoint.metadata
+        if metadata.get('executor', 'thread') != 'process':
+            return None
+
+        handler = endpoint.endpointHandler
+        if '<locals>' in handler.__qualname__ or '<lambda>' in handler.__qualname__:
+            raise TypeError(
+                f"The handler of {endpoint.endpointIdentifier} must be defined at module level to run in a process.")
+        if endpoint.varKeyword is not None:
+            raise TypeError(
+                f"The handler of {endpoint.endpointIdentifier} can not take variable keyword arguments as it runs in a process.")
+        for name in (*endpoint.nonOptionalParameters, *endpoint.optionalParameters):
+            if name in reservedDataNames and name != 'makeResponse':
+                raise TypeError(
+                    f"The handler of {endpoint.endpointIdentifier} can not take {name} as it runs in a process.")
+
+        return cls(metadata.get('processConcurrency'), metadata.get('processTimeout'),
+                   (handler.__module__, handler.__qualname__))
+
+
+class DeferredResponse():
+    'Stands in for makeResponse in the worker process. The parent calls the real makeResponse with the same arguments.'
+
+    def __init__(self, *args, **kw) -> None:
+        self.args = args
+        self.kw = kw
+
+
+class SharedBytes():
+    'A handle to bytes placed in shared memory.'
+
+    def __init__(self, name: str, size: int) -> None:
+        self.name = name
+        self.size = size
+
+
+def attachSharedMemory(name: str):
+    from multiprocessing import resource_tracker, shared_memory
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers attached memory with the resource tracker, which would unlink it on exit.
+        memory = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
+
+
+def shareBytes(value: Any):
+    'Returns (value, memory). Large bytes are copied into shared memory, which the caller must release.'
+    if not isinstance(value, (bytes, bytearray)) or len(value) < SHARED_MEMORY_THRESHOLD:
+        return value, None
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:  # Python < 3.8
+        return value, None
+    memory = shared_memory.SharedMemory(create=True, size=len(value))
+    memory.buf[:len(value)] = value
+    return SharedBytes(memory.name, len(value)), memory
+
+
+def loadBytes(value: Any, unlink: bool = False) -> Any:
+    'Reads SharedBytes back into bytes. Other values are returned as they are.'
+    if not isinstance(value, SharedBytes):
+        return value
+    if unlink:
+        from multiprocessing import shared_memory
+        # Tracked, as unlink untracks it.
+        memory = shared_memory.SharedMemory(name=value.name)
+    else:
+        memory = attachSharedMemory(value.name)
+    try:
+        return bytes(memory.buf[:value.size])
+    finally:
+        memory.close()
+        if unlink:
+            memory.unlink()
+
+
+def discardBytes(value: Any) -> None:
+    'Unlinks the shared memory of SharedBytes that will not be read.'
+    if not isinstance(value, SharedBytes):
+        return
+    from multiprocessing import shared_memory
+    try:
+        memory = shared_memory.SharedMemory(name=value.name)
+    except FileNotFoundError:
+        return
+    memory.close()
+    memory.unlink()
+
+
+def releaseSharedMemory(memories: list) -> None:
+    for memory in memories:
+        memory.close()
+        memory.unlink()
+
+
+def resolveHandler(handlerReference: tuple) -> Callable:
+    module, qualname = handlerReference
+    handler = importlib.import_module(module)
+    for name in qualname.split('.'):
+        handler = getattr(handler, name)
+    return handler
+
+
+def runInProcess(handlerReference: tuple, arguments: dict, takesMakeResponse: bool) -> Any:
+    'Runs in the worker process: calls the handler and returns its result.'
+    callDict = {name: loadBytes(value) for name, value in arguments.items()}
+    if takesMakeResponse:
+        callDict['makeResponse'] = DeferredResponse
+    result = resolveHandler(handlerReference)(**callDict)
+
+    result, memory = shareBytes(result)
+    if memory is not None:
+        from multiprocessing import resource_tracker
+        # The parent unlinks the memory after reading it.
+        memory.close()
+        if hasattr(resource_tracker, 'unregister'):
+            resource_tracker.unregister(memory._name, 'shared_memory')
+    return result
@@ -0,0 +1,164 @@
+import os
+import random
+import re
+import sys
+import threading
+
+
+# The profiling modes of Profiler
+MODES = ('cprofile', 'sampler')
+
+
+def getFileName(endpointIdentifier: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', endpointIdentifier)
+
+
+class Profiler():
+    def __init__(self, sampleRate: float = 0.01, mode: str = 'cprofile', interval: float = 0.005) -> None:
+        '''
+        Profiles a fraction of the calls of each endpoint, and aggregates the results per endpointIdentifier.
+        :param sampleRate: The fraction of calls that are profiled.
+        :param mode: "cprofile" records every function call of the profiled calls with cProfile, and is dumped as pstats.
+        One call is profiled at a time, as a thread can only have one active profiler.
+        "sampler" records the stack of the threads running profiled calls every interval seconds, from a background
+        thread, and is dumped as collapsed stacks for flame graphs. Its overhead does not depend on the code profiled.
+        :param interval: The seconds between stack samples, in sampler mode.
+        '''
+        if mode not in MODES:
+            raise ValueError(
+                f"Unknown profiling mode {mode}. Use one of {', '.join(MODES)}.")
+        self.sampleRate = sampleRate
+        self.mode = mode
+        self.interval = interval
+        self.lock = threading.Lock()
+        # endpointIdentifier -> number of profiled calls
+        self.calls = {}
+        # cprofile mode: endpointIdentifier -> pstats.Stats
+        self.stats = {}
+        self.profiling = False
+        # sampler mode: thread ident -> (endpointIdentifier, the frame the call started in)
+        self.active = {}
+        # sampler mode: endpointIdentifier -> {collapsed stack: count}
+        self.stacks = {}
+        self.sampler = None
+        self.stopped = threading.Event()
+
+    def begin(self, endpointIdentifier: str):
+        '''
+        Starts profiling the call from the calling function, if it is sampled.
+        Returns the token to pass to end, or None if the call is not profiled.
+        '''
+        if random.random() >= self.sampleRate:
+            return None
+        if self.mode == 'sampler':
+            if self.sampler is None:
+                self.startSampler()
+            ident = threading.get_ident()
+            self.active[ident] = (endpointIdentifier, sys._getframe(1))
+            return endpointIdentifier, ident
+
+        with self.lock:
+            if self.profiling:
+                return None
+            self.profiling = True
+        # Imported here as few maps profile
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active
+            with self.lock:
+                self.profiling = False
+            return None
+        return endpointIdentifier, profile
+
+    def end(self, token) -> None:
+        endpointIdentifier, state = token
+        if self.mode == 'sampler':
+            self.active.pop(state, None)
+            with self.lock:
+                self.calls[endpointIdentifier] = self.calls.get(
+                    endpointIdentifier, 0) + 1
+            return
+
+        state.disable()
+        import pstats
+        with self.lock:
+            self.profiling = False
+            self.calls[endpointIdentifier] = self.calls.get(
+                endpointIdentifier, 0) + 1
+            if endpointIdentifier in self.stats:
+                self.stats[endpointIdentifier].add(state)
+            else:
+                self.stats[endpointIdentifier] = pstats.Stats(state)
+
+    def startSampler(self) -> None:
+        with self.lock:
+            if self.sampler is not None:
+                return
+            self.sampler = threading.Thread(
+                target=self.sample, name='RequestMap-Profiler', daemon=True)
+            self.sampler.start()
+
+    def sample(self) -> None:
+        while not self.stopped.wait(self.interval):
+            if not self.active:
+                continue
+            frames = sys._current_frames()
+            for ident, (endpointIdentifier, root) in list(self.active.items()):
+                frame = frames.get(ident)
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(
+                        f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'.replace(';', ':'))
+                    if frame is root:
+                        break
+                    frame = frame.f_back
+                if not names:
+                    continue
+                stack = ';'.join(reversed(names))
+                with self.lock:
+                    stacks = self.stacks.setdefault(endpointIdentifier, {})
+                    stacks[stack] = stacks.get(stack, 0) + 1
+            del frames
+
+    def snapshot(self) -> dict:
+        'Returns {endpointIdentifier: number of profiled calls}.'
+        with self.lock:
+            return dict(self.calls)
+
+    def dump(self, directory: str, reset: bool = False) -> list:
+        '''
+        Writes the profile of every endpoint to directory: <endpointIdentifier>.pstats in cprofile mode
+        (read it with pstats or snakeviz), <endpointIdentifier>.collapsed in sampler mode (one "stack count" per line,
+        the input of flamegraph.pl and speedscope). Returns the paths written.
+        :param reset: Clear the profiles after writing them.
+        '''
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        with self.lock:
+            if self.mode == 'sampler':
+                for endpointIdentifier, stacks in self.stacks.items():
+                    path = os.path.join(
+                        directory, getFileName(endpointIdentifier) + '.collapsed')
+                    with open(path, 'w') as file:
+                        for stack, count in stacks.items():
+                            file.write(f'{stack} {count}\n')
+                    paths.append(path)
+            else:
+                for endpointIdentifier, stats in self.stats.items():
+                    path = os.path.join(
+                        directory, getFileName(endpointIdentifier) + '.pstats')
+                    stats.dump_stats(path)
+                    paths.append(path)
+            if reset:
+                self.calls = {}
+                self.stats = {}
+                self.stacks = {}
+        return paths
+
+    def stop(self) -> None:
+        'Stops the sampler thread.'
+        self.stopped.set()
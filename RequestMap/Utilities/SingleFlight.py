@@ -0,0 +1,87 @@
+from concurrent.futures import CancelledError, Future
+from typing import Any, Callable, Hashable
+import threading
+
+
+# The result of a call whose leader was interrupted. Its waiters call again, and one of them leads.
+_ABANDONED = object()
+
+
+def isShared(exception: BaseException) -> bool:
+    '''
+    Whether an exception of the leader is passed to the waiters.
+    Interruptions of the leader, such as cancellation or KeyboardInterrupt, are not about the call itself.
+    '''
+    # CancelledError is an Exception before Python 3.8.
+    return isinstance(exception, Exception) and not isinstance(exception, CancelledError)
+
+
+class SingleFlight():
+    '''
+    Coalesces concurrent calls with the same key into a single execution.
+    Callers that arrive while a call is in flight wait for it and share its result or exception.
+    If the leader is interrupted (see isShared), its waiters call again instead.
+    Threads and event loops can wait on the same call.
+    '''
+
+    def __init__(self) -> None:
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def join(self, key: Hashable):
+        'Returns (future, isLeader). The leader must run the call and then call finish.'
+        with self.lock:
+            future = self.calls.get(key)
+            if future is None:
+                future = self.calls[key] = Future()
+                return future, True
+            return future, False
+
+    def finish(self, key: Hashable, future: Future, result: Any = None, exception: BaseException = None) -> None:
+        with self.lock:
+            del self.calls[key]
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def call(self, key: Hashable, func: Callable) -> Any:
+        while True:
+            future, isLeader = self.join(key)
+            if isLeader:
+                break
+            result = future.result()
+            if result is not _ABANDONED:
+                return result
+        try:
+            result = func()
+        except BaseException as e:
+            if isShared(e):
+                self.finish(key, future, exception=e)
+            else:
+                self.finish(key, future, _ABANDONED)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    async def callAsync(self, key: Hashable, func: Callable) -> Any:
+        'Same as call, where func returns an awaitable.'
+        import asyncio
+        while True:
+            future, isLeader = self.join(key)
+            if isLeader:
+                break
+            # Shielded, so that a waiter that is cancelled does not cancel the call of the others.
+            result = await asyncio.shield(asyncio.wrap_future(future))
+            if result is not _ABANDONED:
+                return result
+        try:
+            result = await func()
+        except BaseException as e:
+            if isShared(e) and not isinstance(e, asyncio.CancelledError):
+                self.finish(key, future, exception=e)
+            else:
+                self.finish(key, future, _ABANDONED)
+            raise
+        self.finish(key, future, result)
+        return result
@@ -0,0 +1,151 @@
+from types import AsyncGeneratorType, GeneratorType
+from typing import Any
+
+
+# The size of the chunks BodyStream reads by default
+CHUNK_SIZE = 64 * 1024
+
+# Sentinel of iterators that are exhausted
+_END = object()
+
+
+def isStream(value: Any) -> bool:
+    'Whether value is a generator or async generator, which is sent as a stream instead of as a whole.'
+    return isinstance(value, (GeneratorType, AsyncGeneratorType, ResponseStream))
+
+
+def toBytes(chunk: Any) -> bytes:
+    if isinstance(chunk, str):
+        return chunk.encode()
+    return bytes(chunk)
+
+
+def iterAsync(chunks):
+    'Iterates an async iterable from synchronous code, on a private event loop.'
+    import asyncio
+    loop = asyncio.new_event_loop()
+    iterator = chunks.__aiter__()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        if hasattr(iterator, 'aclose'):
+            loop.run_until_complete(iterator.aclose())
+        loop.close()
+
+
+class ResponseStream():
+    '''
+    A response that is sent in chunks, as they are produced.
+    Protocols that support streaming send it with chunked transfer encoding.
+    :param chunks: An iterable or async iterable of bytes or str.
+    '''
+
+    def __init__(self, chunks, contentType: str = 'application/octet-stream') -> None:
+        self.chunks = chunks
+        self.contentType = contentType
+
+    @classmethod
+    def fromResponse(cls, response: Any):
+        'Returns the response as a ResponseStream if it is a stream (see isStream), otherwise None.'
+        if isinstance(response, ResponseStream):
+            return response
+        if isinstance(response, (GeneratorType, AsyncGeneratorType)):
+            return cls(response)
+        return None
+
+    def __iter__(self):
+        chunks = self.chunks
+        if hasattr(chunks, '__aiter__'):
+            chunks = iterAsync(chunks)
+        for chunk in chunks:
+            yield toBytes(chunk)
+
+    async def __aiter__(self):
+        if hasattr(self.chunks, '__aiter__'):
+            async for chunk in self.chunks:
+                yield toBytes(chunk)
+            return
+        import asyncio
+        # Synchronous chunks may block, so they are produced in the default executor.
+        loop = asyncio.get_running_loop()
+        iterator = iter(self.chunks)
+        while True:
+            chunk = await loop.run_in_executor(None, next, iterator, _END)
+            if chunk is _END:
+                return
+            yield toBytes(chunk)
+
+
+def iterJSONEnvelope(encoder, envelope: dict, key: str, items, onError=None):
+    '''
+    Encodes envelope as a JSON object, with the items of envelope[key] encoded one at a time as a list.
+    :param onError: Called with an exception raised by items. Its result is added to the object as "error",
+    after the items that were sent.
+    '''
+    head = encoder.dumps({name: value for name, value in envelope.items() if name != key})
+    yield head[:-1] + (b',' if len(head) > 2 else b'') + encoder.dumps(key) + b':['
+    separator = b''
+    try:
+        for item in items:
+            yield separator + encoder.dumps(item)
+            separator = b','
+    except Exception as e:
+        if onError is None:
+            raise
+        yield b'],"error":' + encoder.dumps(onError(e)) + b'}'
+        return
+    yield b']}'
+
+
+async def aiterJSONEnvelope(encoder, envelope: dict, key: str, items, onError=None):
+    'Same as iterJSONEnvelope, for async iterable items.'
+    head = encoder.dumps({name: value for name, value in envelope.items() if name != key})
+    yield head[:-1] + (b',' if len(head) > 2 else b'') + encoder.dumps(key) + b':['
+    separator = b''
+    try:
+        async for item in items:
+            yield separator + encoder.dumps(item)
+            separator = b','
+    except Exception as e:
+        if onError is None:
+            raise
+        yield b'],"error":' + encoder.dumps(onError(e)) + b'}'
+        return
+    yield b']}'
+
+
+class BodyStream():
+    '''
+    A request body that is read as it arrives instead of being loaded into memory.
+    Iterate it for chunks of up to chunkSize bytes, or read it with read and readinto.
+    :param stream: A binary file-like object, such as the WSGI input stream.
+    :param length: The length of the body, if known.
+    '''
+
+    def __init__(self, stream, length: int = None, chunkSize: int = CHUNK_SIZE) -> None:
+        self.stream = stream
+        self.length = length
+        self.chunkSize = chunkSize
+
+    def read(self, size: int = -1) -> bytes:
+        return self.stream.read(size)
+
+    def readinto(self, buffer) -> int:
+        'Reads into a writable buffer, such as a memoryview, without an intermediate copy when the stream supports it.'
+        if hasattr(self.stream, 'readinto'):
+            return self.stream.readinto(buffer)
+        view = memoryview(buffer).cast('B')
+        chunk = self.stream.read(len(view))
+        view[:len(chunk)] = chunk
+        return len(chunk)
+
+    def __iter__(self):
+        while True:
+            chunk = self.stream.read(self.chunkSize)
+            if not chunk:
+                return
+            yield chunk
@@ -1 +1,14 @@
-from . import JITDictionary as JITDictionary
\ No newline at end of file
+import importlib
+
+# Utility modules are imported on first access, see RequestMap.Protocols.
+__all__ = ['Admission', 'Compression', 'ETag', 'JITDictionary', 'JSONEncoding', 'Metrics', 'ProcessPool', 'Profiling', 'SingleFlight', 'Streaming']
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return __all__
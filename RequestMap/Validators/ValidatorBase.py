@@ -5,6 +5,21 @@ class StandardValidator():
     def __init__(self):
         self.map = None
         self.name = None
+        # Validators run from the lowest cost to the highest, so that cheap checks fail first.
+        # Validators of the same cost run in the order they were installed.
+        self.cost = 0
+        # The parameters of the evaluation method that identify an evaluation, such as ('token',).
+        # With a cacheTTL, successful evaluations are remembered for cacheTTL seconds, and not evaluated again.
+        self.cacheKey = None
+        self.cacheTTL = None
+        self.cacheMaxSize = 1024
+        # Whether cached evaluations are shared by every endpoint and protocol. Only set it if the evaluation
+        # method does not depend on the endpoint.
+        self.cacheShared = False
+        # Whether the validator is independent of the others. Concurrent validators that are next to each other
+        # in cost order run at the same time, synchronous ones in the executor of the Map. They should not rely on
+        # thread-local state, such as flask.request.
+        self.concurrent = False
 
     def install(self, map):
         self.map = map
@@ -1,3 +1,4 @@
+from . import Cache as Cache
 from . import Protocols as Protocols
 from . import Response as Response
 from . import Utilities as Utilities
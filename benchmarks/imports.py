@@ -0,0 +1,66 @@
+'''
+Checks that importing RequestMap stays fast and does not import optional dependencies.
+
+    python benchmarks/imports.py
+    python benchmarks/imports.py --max-ms 150
+
+Importing RequestMap and creating a Map must not import any of FORBIDDEN_MODULES:
+protocols, response handlers and utilities are imported on first access.
+The exit code is 1 if a forbidden module is imported, or if the import is slower than --max-ms.
+'''
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that only the protocols, response handlers or utilities that use them may import
+FORBIDDEN_MODULES = ('flask', 'werkzeug', 'uvicorn', 'orjson', 'msgpack',
+                     'asyncio', 'multiprocessing', 'json')
+
+CHECK = '''
+import sys, time
+started = time.perf_counter()
+import RequestMap
+RequestMap.Map()
+elapsed = time.perf_counter() - started
+print(elapsed * 1000)
+print(' '.join(sorted({name.split('.')[0] for name in sys.modules})))
+'''
+
+
+def measureImport():
+    'Returns (milliseconds, top-level modules) of importing RequestMap in a new interpreter.'
+    output = subprocess.run([sys.executable, '-c', CHECK], cwd=ROOT, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout.splitlines()
+    return float(output[0]), set(output[1].split())
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+        description='Checks the import time and imported modules of RequestMap.')
+    parser.add_argument('--max-ms', type=float,
+                        help='Fail if the fastest import takes longer than this.')
+    parser.add_argument('--repeats', type=int, default=5)
+    arguments = parser.parse_args(arguments)
+
+    best = None
+    for _ in range(arguments.repeats):
+        milliseconds, modules = measureImport()
+        best = milliseconds if best is None else min(best, milliseconds)
+
+    failed = False
+    imported = sorted(set(FORBIDDEN_MODULES) & modules)
+    if imported:
+        print(f"FAIL importing RequestMap imports {', '.join(imported)}")
+        failed = True
+    print(f'import RequestMap: {best:.2f} ms')
+    if arguments.max_ms is not None and best > arguments.max_ms:
+        print(f'FAIL the import is slower than {arguments.max_ms} ms')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
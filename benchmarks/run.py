@@ -0,0 +1,291 @@
+'''
+Benchmarks of the RequestMap dispatch core and protocols.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --baseline results.json --threshold 0.1
+
+Every benchmark reports the best time per operation over several repeats.
+With --baseline, benchmarks slower than the baseline by more than the threshold
+are reported as regressions and the exit code is 1.
+'''
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from RequestMap import Map  # noqa: E402
+from RequestMap.Exceptions import ValidationError  # noqa: E402
+from RequestMap.Protocols.ProtocolBase import StandardProtocolHandler  # noqa: E402
+from RequestMap.Response.JSON import JSONStandardizer  # noqa: E402
+from RequestMap.Utilities.JITDictionary import JITDict  # noqa: E402
+from RequestMap.Validators.ValidatorBase import StandardValidator  # noqa: E402
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    'Registers a benchmark. The decorated function sets it up and returns the callable to time.'
+    def _benchmark(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return _benchmark
+
+
+class BenchmarkProtocol(StandardProtocolHandler):
+    def __init__(self):
+        super().__init__()
+        self.name = 'BenchmarkProtocol'
+
+
+class BenchmarkValidator(StandardValidator):
+    def getEvaluationMethod(self, endpoint, protocol):
+        def evaluate(token=None):
+            if endpoint['metadata'].get('authrequired') and token != 'token':
+                raise ValidationError(-2, 'Unauthorised')
+        return evaluate
+
+
+def createMap(validators=0, responseHandler=None):
+    API = Map()
+    protocol = BenchmarkProtocol()
+    API.useProtocol(protocol)
+    if responseHandler:
+        API.useResponseHandler(responseHandler)
+    for _ in range(validators):
+        API.useValidator(BenchmarkValidator())
+
+    @API.endpoint('addition', {'authrequired': True}, a=float, b=float)
+    def addition(a, b):
+        return a + b
+    return API, protocol
+
+
+def dispatchBenchmark(validators):
+    def setup():
+        API, protocol = createMap(validators)
+        data = {'a': '1', 'b': '2', 'token': 'token'}.get
+
+        def run():
+            API.incomingRequest(protocol, 'addition', data, lambda data: data)
+        return run
+    return setup
+
+
+benchmark('incomingRequest/0-validators')(dispatchBenchmark(0))
+benchmark('incomingRequest/1-validator')(dispatchBenchmark(1))
+benchmark('incomingRequest/10-validators')(dispatchBenchmark(10))
+
+
+@benchmark('incomingRequest/JSONStandardizer')
+def dispatchStandardized():
+    API, protocol = createMap(1, JSONStandardizer())
+
+    @API.endpoint('standardized', a=float, b=float)
+    def standardized(a, b, makeResponse):
+        return makeResponse(0, result=a + b)
+    data = {'a': '1', 'b': '2'}.get
+
+    def run():
+        API.incomingRequest(protocol, 'standardized',
+                            data, lambda data: data)
+    return run
+
+
+@benchmark('LocalClient/call')
+def localCall():
+    API, _ = createMap(1, JSONStandardizer())
+    client = API.client()
+
+    def run():
+        client.call('addition', a=1, b=2, token='token')
+    return run
+
+
+@benchmark('getCallDict/20-converters')
+def getCallDictConverters():
+    API = Map()
+    names = [f'parameter{index}' for index in range(20)]
+    converters = {name: int for name in names}
+    data = {name: str(index) for index, name in enumerate(names)}.get
+
+    def run():
+        API.getCallDict(data, None, names, {}, converters)
+    return run
+
+
+@benchmark('JITDict/get-hit')
+def jitDictHit():
+    data = {'key': 'value'}.get
+
+    def run():
+        JITDict(data)['key']
+    return run
+
+
+@benchmark('JITDict/get-miss')
+def jitDictMiss():
+    data = {}.get
+
+    def run():
+        JITDict(data)['key']
+    return run
+
+
+@benchmark('JITDict/contains-then-get-x10')
+def jitDictProbe():
+    keys = [f'key{index}' for index in range(10)]
+    data = {key: key for key in keys[::2]}.get
+
+    def run():
+        dictionary = JITDict(data)
+        for key in keys:
+            if key in dictionary:
+                dictionary[key]
+    return run
+
+
+def encodingBenchmark(items):
+    def setup():
+        standardizer = JSONStandardizer()
+        protocol = BenchmarkProtocol()
+        result = [{'id': index, 'name': f'item{index}', 'score': index / 3, 'tags': ['a', 'b']}
+                  for index in range(items)]
+
+        def run():
+            standardizer.standardizeResponse(0, result=result, protocol=protocol)
+        return run
+    return setup
+
+
+benchmark('JSONStandardizer/1-item')(encodingBenchmark(1))
+benchmark('JSONStandardizer/1000-items')(encodingBenchmark(1000))
+
+
+def batchBenchmark(items, batched=False):
+    def setup():
+        from RequestMap.Protocols.Flask import HTTPViaFlask, HTTPBatchRequestViaFlask
+        API = Map()
+        API.useResponseHandler(JSONStandardizer())
+        flaskProtocol = HTTPViaFlask()
+        API.useProtocol(flaskProtocol)
+        API.useProtocol(HTTPBatchRequestViaFlask(flaskProtocol.app))
+
+        @API.endpoint('addition', a=float, b=float)
+        def addition(a, b, makeResponse):
+            return makeResponse(0, result=a + b)
+
+        if batched:
+            @API.batched('addition')
+            def additions(callDicts):
+                return [callDict['makeResponse'](0, result=callDict['a'] + callDict['b']) for callDict in callDicts]
+        client = flaskProtocol.app.test_client()
+        batch = json.dumps([{'endpointIdentifier': 'addition', 'data': {'a': index, 'b': 1}}
+                            for index in range(items)])
+
+        def run():
+            response = client.post('/batch', data={'batch': batch})
+            assert response.status_code == 200
+        return run
+    return setup
+
+
+for items in (1, 10, 100, 1000):
+    benchmark(f'HTTPBatchRequestViaFlask/{items}-items')(batchBenchmark(items))
+benchmark('HTTPBatchRequestViaFlask/100-items-batched')(batchBenchmark(100, True))
+
+
+def measure(run, minTime, repeats):
+    'Returns statistics of the time per call of run, in nanoseconds.'
+    # Calibrate the number of loops so one repeat takes at least minTime.
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - started
+        if elapsed >= minTime:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(minTime / elapsed) + 1)
+
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(loops):
+            run()
+        samples.append((time.perf_counter() - started) / loops * 1e9)
+    return {
+        'nsPerOp': min(samples),
+        'meanNsPerOp': statistics.mean(samples),
+        'stdevNsPerOp': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'loops': loops,
+        'repeats': repeats
+    }
+
+
+def compare(results, baseline, threshold):
+    'Returns the benchmarks that are slower than the baseline by more than threshold.'
+    regressions = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['nsPerOp'] / baseline[name]['nsPerOp']
+        result['baselineRatio'] = ratio
+        if ratio > 1 + threshold:
+            regressions[name] = ratio
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmarks of the RequestMap dispatch core and protocols.')
+    parser.add_argument('--filter', default='',
+                        help='Only run benchmarks whose name contains this.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--baseline', help='Compare against results written by --output.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Allowed slowdown against the baseline, as a fraction. Defaults to 0.1.')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='Minimum seconds per repeat. Defaults to 0.2.')
+    parser.add_argument('--repeats', type=int, default=5)
+    arguments = parser.parse_args(arguments)
+
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if arguments.filter not in name:
+            continue
+        try:
+            run = setup()
+        except ImportError as e:
+            print(f'{name:<45} skipped ({e})')
+            continue
+        results[name] = measure(run, arguments.min_time, arguments.repeats)
+        print(f"{name:<45} {results[name]['nsPerOp'] / 1000:>12.2f} us/op")
+
+    regressions = {}
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, arguments.threshold)
+        for name, ratio in regressions.items():
+            print(f'REGRESSION {name}: {ratio:.2f}x the baseline')
+
+    if arguments.output:
+        with open(arguments.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'timestamp': time.time(),
+                'results': results
+            }, f, indent=2)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
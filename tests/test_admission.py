@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+
+import pytest
+
+from RequestMap import Map
+from RequestMap.Exceptions import Overloaded
+from RequestMap.Response.JSON import JSONStandardizer
+from RequestMap.Utilities.Admission import AdmissionLimiter
+
+
+def testCallsOverTheLimitAreRejected():
+    API = Map()
+    API.useResponseHandler(JSONStandardizer())
+    started = threading.Event()
+    release = threading.Event()
+
+    @API.endpoint('slow', {'admission': {'maxInFlight': 1}})
+    def slow(makeResponse=None):
+        started.set()
+        release.wait(5)
+        return makeResponse(0)
+
+    client = API.client()
+    with ThreadPoolExecutor(1) as executor:
+        first = executor.submit(client.call, 'slow')
+        assert started.wait(5)
+        assert client.call('slow')['code'] == -10004
+        release.set()
+        assert first.result()['code'] == 0
+    assert API.admissionLimiters['slow'].inFlight == 0
+
+
+def testQueuedCallsTimeOut():
+    limiter = AdmissionLimiter('test', 1, maxQueue=1, queueTimeout=0.05)
+    limiter.acquire()
+
+    async def main():
+        with pytest.raises(Overloaded):
+            await limiter.acquireAsync()
+    asyncio.run(main())
+    with pytest.raises(Overloaded):
+        limiter.acquire()
+    assert limiter.waiters == []
+    limiter.release()
+    assert limiter.inFlight == 0
+
+
+def testCancelledWhileQueued():
+    limiter = AdmissionLimiter('test', 1, maxQueue=1)
+    limiter.acquire()
+
+    async def main():
+        task = asyncio.ensure_future(limiter.acquireAsync())
+        await asyncio.sleep(0.01)
+        assert len(limiter.waiters) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(main())
+    assert limiter.waiters == []
+    limiter.release()
+    assert limiter.inFlight == 0
+
+
+def testCancelledAfterTheSlotIsHandedOver():
+    limiter = AdmissionLimiter('test', 1, maxQueue=1)
+    limiter.acquire()
+
+    async def main():
+        task = asyncio.ensure_future(limiter.acquireAsync())
+        await asyncio.sleep(0.01)
+        # Hands the slot over to the waiting task, which is cancelled before it resumes.
+        limiter.release()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(main())
+    assert limiter.inFlight == 0
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+from RequestMap import Map
+from RequestMap.Response.JSON import JSONStandardizer
+
+
+def makeMap():
+    API = Map()
+    API.useResponseHandler(JSONStandardizer())
+
+    @API.endpoint('double', a=int)
+    async def double(a, makeResponse=None):
+        await asyncio.sleep(0)
+        return makeResponse(0, result=a * 2, loop=id(asyncio.get_running_loop()))
+    return API
+
+
+def testSynchronousCallsShareAnEventLoop():
+    API = makeMap()
+    client = API.client()
+    first = client.call('double', a=1)
+    second = client.call('double', a=2)
+    assert (first['result'], second['result']) == (2, 4)
+    assert first['loop'] == second['loop']
+    API.stop()
+
+
+def testSynchronousCallsFromAnotherEventLoop():
+    API = makeMap()
+    client = API.client()
+
+    async def main():
+        return client.call('double', a=3)
+
+    assert asyncio.run(main())['result'] == 6
+    API.stop()
+
+
+def testSynchronousCallsFromTheEventLoopOfTheMap():
+    API = makeMap()
+    client = API.client()
+    done = threading.Event()
+    errors = []
+
+    def call():
+        try:
+            client.call('double', a=1)
+        except RuntimeError as e:
+            errors.append(e)
+        done.set()
+    API.getEventLoop().call_soon_threadsafe(call)
+    assert done.wait(5)
+    assert 'incomingRequestAsync' in str(errors[0])
+    API.stop()
@@ -0,0 +1,107 @@
+import pytest
+from flask import Flask
+
+from RequestMap import Map
+from RequestMap.Protocols.Flask import HTTPViaFlask
+from RequestMap.Response.JSON import JSONStandardizer
+
+
+def makeMap():
+    API = Map()
+    API.useResponseHandler(JSONStandardizer())
+    return API
+
+
+def testDifferentParametersDoNotShareCache():
+    API = makeMap()
+    calls = []
+
+    @API.endpoint('search', {'cache': {'ttl': 60}})
+    def search(q, page=1, makeResponse=None):
+        calls.append((q, page))
+        return makeResponse(0, result=[q, page])
+
+    client = API.client()
+    assert client.call('search', q='a')['result'] == ['a', 1]
+    assert client.call('search', q='b')['result'] == ['b', 1]
+    assert client.call('search', q='a', page=2)['result'] == ['a', 2]
+    assert client.call('search', q='a')['result'] == ['a', 1]
+    assert calls == [('a', 1), ('b', 1), ('a', 2)]
+
+
+def testVariableKeywordArgumentsArePartOfTheKey():
+    app = Flask(__name__)
+    API = makeMap()
+    API.useProtocol(HTTPViaFlask(app))
+    calls = []
+
+    @API.endpoint('search', {'cache': {'ttl': 60}, 'httpmethods': ['GET']})
+    def search(makeResponse=None, **kwargs):
+        # The request data is passed as a JITDict under the name of the variable keyword argument.
+        query = kwargs['kwargs']
+        calls.append(dict(query))
+        return makeResponse(0, result=query.get('q'))
+
+    client = app.test_client()
+    assert client.get('/search?q=a').get_json()['result'] == 'a'
+    assert client.get('/search?q=b').get_json()['result'] == 'b'
+    assert client.get('/search?q=a').get_json()['result'] == 'a'
+    assert calls == [{'q': 'a'}, {'q': 'b'}]
+
+
+def testGetDataRequiresVaryOn():
+    API = makeMap()
+    API.client()
+
+    def search(getData, makeResponse=None):
+        return makeResponse(0, result=getData('q'))
+
+    with pytest.raises(TypeError):
+        API.register(search, 'search', {'cache': {'ttl': 60}})
+
+    calls = []
+
+    def searchByQuery(getData, makeResponse=None):
+        calls.append(getData('q'))
+        return makeResponse(0, result=getData('q'))
+
+    API.register(searchByQuery, 'searchByQuery', {'cache': {'ttl': 60, 'varyOn': []}, 'singleFlight': True})
+    client = API.client()
+    assert client.call('searchByQuery', q='a')['result'] == 'a'
+    assert client.call('searchByQuery', q='b')['result'] == 'a'
+    assert calls == ['a']
+
+
+def testCachedResponsesAreNotShared():
+    app = Flask(__name__)
+    API = makeMap()
+    API.useProtocol(HTTPViaFlask(app))
+
+    @API.endpoint('profile', {'cache': {'ttl': 60, 'varyOn': []}, 'httpmethods': ['GET']})
+    def profile(makeResponse=None):
+        return makeResponse(0, result='public')
+
+    @app.after_request
+    def setUser(response):
+        from flask import request
+        response.set_cookie('user', request.args['user'])
+        return response
+
+    client = app.test_client()
+    first = client.get('/profile?user=a')
+    second = client.get('/profile?user=b')
+    assert first.headers.getlist('Set-Cookie') == ['user=a; Path=/']
+    assert second.headers.getlist('Set-Cookie') == ['user=b; Path=/']
+    assert second.get_json()['result'] == 'public'
+
+
+def testLocalResponsesAreNotShared():
+    API = makeMap()
+
+    @API.endpoint('items', {'cache': {'ttl': 60}})
+    def items(makeResponse=None):
+        return makeResponse(0, result=[1, 2])
+
+    client = API.client()
+    client.call('items')['result'].append(3)
+    assert client.call('items')['result'] == [1, 2]
@@ -0,0 +1,51 @@
+import gzip
+
+from flask import Flask
+
+from RequestMap import Map
+from RequestMap.Protocols.Flask import HTTPViaFlask
+from RequestMap.Response.JSON import JSONStandardizer
+from RequestMap.Utilities.Compression import CompressionPolicy, Compressor
+
+
+def testPrecompressedBytesAreKeyedOnTheBody():
+    policy = CompressionPolicy(precompress=True)
+    compressor = Compressor()
+    first = compressor.compressCached(b'a' * 2000, 'gzip', policy)
+    assert compressor.compressCached(b'a' * 2000, 'gzip', policy) is first
+    assert gzip.decompress(compressor.compressCached(b'b' * 2000, 'gzip', policy)) == b'b' * 2000
+    assert len(compressor.precompressed) == 2
+    # Entries are keyed on a digest, not the body.
+    assert all(len(key) == 16 for key in compressor.precompressed)
+
+
+def testPrecompressedBytesAreBoundedBySize():
+    policy = CompressionPolicy(precompress=True)
+    size = len(Compressor().compress(b'a' * 2000, 'gzip', policy))
+    compressor = Compressor(maxPrecompressedBytes=2 * size)
+    for body in (b'a' * 2000, b'b' * 2000, b'c' * 2000):
+        assert gzip.decompress(compressor.compressCached(body, 'gzip', policy)) == body
+    assert len(compressor.precompressed) == 2
+    assert compressor.precompressedBytes <= 2 * size
+    # Bodies that do not fit are compressed without being kept.
+    large = bytes(range(256)) * 100
+    assert gzip.decompress(compressor.compressCached(large, 'gzip', policy)) == large
+    assert len(compressor.precompressed) == 2
+
+
+def testCachedResponsesAreCompressedOnce():
+    app = Flask(__name__)
+    API = Map()
+    API.useResponseHandler(JSONStandardizer())
+    protocol = HTTPViaFlask(app)
+    API.useProtocol(protocol)
+
+    @API.endpoint('report', {'cache': {'ttl': 60}, 'compression': {'minSize': 10}, 'httpmethods': ['GET']})
+    def report(n, makeResponse=None):
+        return makeResponse(0, result=n * 100)
+
+    client = app.test_client()
+    headers = {'Accept-Encoding': 'gzip'}
+    bodies = [client.get('/report?n=' + n, headers=headers).data for n in 'aab']
+    assert bodies[0] == bodies[1] != bodies[2]
+    assert len(protocol.compressor.precompressed) == 2
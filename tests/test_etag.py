@@ -0,0 +1,62 @@
+import gzip
+import json
+
+from flask import Flask
+
+from RequestMap import Map
+from RequestMap.Protocols.Flask import HTTPViaFlask
+from RequestMap.Response.JSON import JSONStandardizer
+
+
+def makeApp(metadata):
+    app = Flask(__name__)
+    API = Map()
+    API.useResponseHandler(JSONStandardizer())
+    protocol = HTTPViaFlask(app)
+    API.useProtocol(protocol)
+    calls = []
+
+    @API.endpoint('report', {'httpmethods': ['GET'], **metadata})
+    def report(makeResponse=None):
+        calls.append(1)
+        return makeResponse(0, result='x' * 2000)
+    return app, protocol, calls
+
+
+def testNotModifiedWithCompression():
+    app, protocol, calls = makeApp({'etag': {'cacheControl': 'max-age=60'}, 'compression': True, 'cache': {'ttl': 60}})
+    client = app.test_client()
+    response = client.get('/report', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data))['result'] == 'x' * 2000
+    etag = response.headers['ETag']
+    # The compressed bytes are not the ones the entity tag was computed from.
+    assert etag.startswith('W/')
+
+    for _ in range(5):
+        notModified = client.get('/report', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert notModified.status_code == 304
+        assert notModified.data == b''
+        assert 'Content-Encoding' not in notModified.headers
+        assert notModified.headers['Cache-Control'] == 'max-age=60'
+
+    for _ in range(5):
+        assert client.get('/report', headers={'Accept-Encoding': 'gzip'}).headers['ETag'] == etag
+    assert len(calls) == 1
+    # Every response has the same body, so it is compressed once.
+    assert len(protocol.compressor.precompressed) == 1
+
+
+def testNotModifiedWithVersion():
+    version = {'value': 1}
+    app, protocol, calls = makeApp({'etag': {'version': lambda: version['value']}, 'compression': True})
+    client = app.test_client()
+    etag = client.get('/report').headers['ETag']
+    assert etag == '"1"'
+    assert client.get('/report', headers={'If-None-Match': etag}).status_code == 304
+    assert len(calls) == 1
+    version['value'] = 2
+    response = client.get('/report', headers={'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == 'W/"2"'
+    assert len(calls) == 2
@@ -0,0 +1,49 @@
+import socket
+import time
+
+import pytest
+
+from RequestMap import Map
+from RequestMap.Protocols.HTTP import HTTPViaAsyncio
+
+
+@pytest.fixture
+def API():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    API = Map()
+    API.useProtocol(HTTPViaAsyncio(port=port))
+    API.start()
+    time.sleep(0.2)
+    API.port = port
+    yield API
+    API.stop(1)
+
+
+def testUnencodableResponsesAreAnsweredAndTheConnectionClosed(API):
+    @API.endpoint('unencodable')
+    def unencodable():
+        return {1, 2}
+
+    @API.endpoint('ok')
+    def ok():
+        return {'ok': True}
+
+    with socket.create_connection(('127.0.0.1', API.port), timeout=5) as connection:
+        connection.sendall(b'GET /unencodable HTTP/1.1\r\nHost: x\r\n\r\n'
+                           b'GET /ok HTTP/1.1\r\nHost: x\r\n\r\n')
+        received = b''
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                break
+            received += data
+    assert received.startswith(b'HTTP/1.1 500 ')
+    assert b'Failed to encode the response' in received
+    assert received.count(b'HTTP/1.1 ') == 1
+
+    # The server keeps serving new connections.
+    with socket.create_connection(('127.0.0.1', API.port), timeout=5) as connection:
+        connection.sendall(b'GET /ok HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+        assert connection.recv(65536).startswith(b'HTTP/1.1 200 ')
@@ -0,0 +1,17 @@
+import importlib.util
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loadBenchmark():
+    spec = importlib.util.spec_from_file_location('imports', os.path.join(ROOT, 'benchmarks', 'imports.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def testImportingRequestMapDoesNotImportOptionalDependencies():
+    benchmark = loadBenchmark()
+    _, modules = benchmark.measureImport()
+    assert set(benchmark.FORBIDDEN_MODULES) & modules == set()
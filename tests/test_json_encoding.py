@@ -0,0 +1,30 @@
+from collections import namedtuple
+import json
+
+import pytest
+
+from RequestMap.Utilities.JSONEncoding import StandardJSONEncoder, getDefaultEncoder
+
+orjson = pytest.importorskip('orjson')
+from RequestMap.Utilities.JSONEncoding import ORJSONEncoder  # noqa: E402
+
+Point = namedtuple('Point', 'x y')
+
+
+def testStandardEncoderIsTheDefault():
+    assert type(getDefaultEncoder()) is StandardJSONEncoder
+
+
+@pytest.mark.parametrize('value', [
+    {'big': 2 ** 70},
+    {'point': Point(1, 2)},
+    {'nested': [Point(1, 2), {'n': -2 ** 80}]},
+    {1: 'a', 'b': [1.5, None, True]},
+])
+def testORJSONMatchesTheStandardLibrary(value):
+    assert json.loads(ORJSONEncoder().dumps(value)) == json.loads(StandardJSONEncoder().dumps(value))
+
+
+def testORJSONRaisesForUnsupportedObjects():
+    with pytest.raises(TypeError):
+        ORJSONEncoder().dumps({'value': object()})
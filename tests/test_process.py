@@ -0,0 +1,33 @@
+import os
+import time
+
+import pytest
+
+from RequestMap import Map
+from RequestMap.Response.JSON import JSONStandardizer
+from RequestMap.Utilities.ProcessPool import SHARED_MEMORY_THRESHOLD
+
+SHM = '/dev/shm'
+
+
+def slowLargeResult():
+    time.sleep(0.5)
+    return b'a' * SHARED_MEMORY_THRESHOLD
+
+
+@pytest.mark.skipif(not os.path.isdir(SHM), reason='needs /dev/shm')
+def testTimedOutResultsAreUnlinked():
+    API = Map(maxProcessWorkers=1)
+    API.useResponseHandler(JSONStandardizer())
+    API.endpoint('slow', metadata={'executor': 'process', 'processTimeout': 0.1})(slowLargeResult)
+    client = API.client()
+    # Starts the worker, so its start-up is not part of the timed call.
+    assert client.call('slow')['code'] == -10003
+    time.sleep(1)
+    before = set(os.listdir(SHM))
+    try:
+        assert client.call('slow')['code'] == -10003
+        time.sleep(1)
+        assert set(os.listdir(SHM)) - before == set()
+    finally:
+        API.stop(1)
@@ -0,0 +1,37 @@
+import pytest
+
+from RequestMap import Map
+from RequestMap.Response.JSON import JSONStandardizer
+
+
+def add(a, b, makeResponse=None):
+    return makeResponse(0, result=int(a) + int(b))
+
+
+@pytest.mark.parametrize('installFirst', [False, True])
+def testInvalidMetadataDoesNotRegister(installFirst):
+    API = Map()
+    API.useResponseHandler(JSONStandardizer())
+    if installFirst:
+        API.client()
+
+    with pytest.raises(TypeError):
+        API.register(add, 'add', {'etag': 'yes'})
+    assert 'add' not in API.endpointMap
+
+    API.register(add, 'add', {'etag': True})
+    assert API.client().call('add', a=1, b=2)['result'] == 3
+
+
+def testInvalidAdmissionDoesNotKeepALimiter():
+    API = Map()
+    API.useResponseHandler(JSONStandardizer())
+    API.client()
+
+    def search(getData, makeResponse=None):
+        return makeResponse(0)
+
+    with pytest.raises(TypeError):
+        API.register(search, 'search', {'admission': {'maxInFlight': 1}, 'cache': {'ttl': 1}})
+    assert 'search' not in API.endpointMap
+    assert 'search' not in API.admissionLimiters
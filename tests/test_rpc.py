@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+from RequestMap import Map
+from RequestMap.Protocols.RPC import RPCClient, RPCViaSocket
+from RequestMap.Response.JSON import JSONStandardizer
+
+
+@pytest.fixture
+def API(tmp_path):
+    path = str(tmp_path / 'rpc.sock')
+    API = Map()
+    API.useResponseHandler(JSONStandardizer())
+    API.useProtocol(RPCViaSocket(path=path))
+    API.start()
+    time.sleep(0.2)
+    API.path = path
+    yield API
+    API.stop(1)
+
+
+def testUnencodableResponsesAreAnswered(API):
+    @API.endpoint('unencodable')
+    def unencodable(makeResponse=None):
+        return makeResponse(0, result=object())
+
+    @API.endpoint('add', a=int, b=int)
+    def add(a, b, makeResponse=None):
+        return makeResponse(0, result=a + b)
+
+    client = RPCClient(path=API.path, poolSize=1, timeout=5)
+    try:
+        with pytest.raises(ValueError, match='Failed to handle the request'):
+            client.call('unencodable')
+        # The connection keeps serving requests.
+        assert client.call('add', {'a': 1, 'b': 2})['result'] == 3
+    finally:
+        client.close()
+
+
+def testInvalidPayloadsAreAnswered(API):
+    client = RPCClient(path=API.path, poolSize=1, timeout=5)
+    try:
+        with pytest.raises(ValueError, match='Invalid payload'):
+            client.call('add', [1, 2])
+    finally:
+        client.close()
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from RequestMap.Protocols.HTTP import HTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def testBlockedEventLoopIsNotAlive():
+    server = HTTPServer()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        server.loop = loop
+        assert server.isAlive(1)
+        loop.call_soon_threadsafe(time.sleep, 0.5)
+        assert not server.isAlive(0.1)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+    assert not server.isAlive(0.1)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='serve forks its workers')
+def testCrashingWorkersAreRestartedWithBackoffAndALimit(tmp_path):
+    log = tmp_path / 'starts'
+    script = textwrap.dedent(f'''
+        from RequestMap import Map
+        from RequestMap.Protocols.ProtocolBase import StandardProtocolHandler
+
+        class Crashing(StandardProtocolHandler):
+            def __init__(self):
+                super().__init__()
+                self.name = 'Crashing'
+
+            def start(self):
+                with open({str(log)!r}, 'a') as file:
+                    file.write('start\\n')
+                raise RuntimeError('failed to start')
+
+        API = Map()
+        API.useProtocol(Crashing())
+        API.serve(workers=2, healthCheckInterval=0.05, restartDelay=0.05, maxRestarts=4, restartWindow=60)
+    ''')
+    started = time.monotonic()
+    process = subprocess.run([sys.executable, '-c', script], cwd=ROOT,
+                             capture_output=True, text=True, timeout=60)
+    elapsed = time.monotonic() - started
+    assert process.returncode != 0
+    assert 'Workers were restarted 4 times' in process.stderr
+    # 2 workers and 4 restarts, the last of which may still be waiting when the 5th exit stops serve
+    assert log.read_text().count('start') in (5, 6)
+    # The delays double: 0.05, 0.1, 0.2 and 0.4 seconds. The 5th exit is of a worker restarted after 0.2 seconds or more.
+    assert elapsed >= 0.2
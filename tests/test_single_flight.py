@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import time
+
+from RequestMap import Map
+from RequestMap.Response.JSON import JSONStandardizer
+from RequestMap.Utilities.SingleFlight import SingleFlight
+
+
+def makeMap():
+    API = Map()
+    API.useResponseHandler(JSONStandardizer())
+    return API
+
+
+def testConcurrentCallsWithDifferentParameters():
+    API = makeMap()
+    calls = []
+    lock = threading.Lock()
+
+    @API.endpoint('search', {'singleFlight': True})
+    def search(q, makeResponse=None):
+        with lock:
+            calls.append(q)
+        time.sleep(0.2)
+        return makeResponse(0, result=q)
+
+    client = API.client()
+    queries = ['a', 'b', 'a', 'b', 'a', 'c']
+    with ThreadPoolExecutor(len(queries)) as executor:
+        responses = list(executor.map(
+            lambda q: client.call('search', q=q), queries))
+
+    assert [response['result'] for response in responses] == queries
+    assert sorted(calls) == ['a', 'b', 'c']
+    # Every caller gets its own response.
+    assert len({id(response) for response in responses}) == len(queries)
+
+
+def testConcurrentCallsAsync():
+    API = makeMap()
+    calls = []
+
+    @API.endpoint('search', {'singleFlight': True, 'cache': {'ttl': 60}})
+    async def search(q, makeResponse=None):
+        calls.append(q)
+        await asyncio.sleep(0.1)
+        return makeResponse(0, result=[q])
+
+    client = API.client()
+
+    async def main():
+        return await asyncio.gather(*[client.callAsync('search', q=q) for q in 'abab'])
+
+    responses = asyncio.run(main())
+    assert [response['result'] for response in responses] == [['a'], ['b'], ['a'], ['b']]
+    assert sorted(calls) == ['a', 'b']
+    responses[0]['result'].append('x')
+    assert responses[2]['result'] == ['a']
+    assert client.call('search', q='a')['result'] == ['a']
+
+
+def testExceptionsAreShared():
+    API = makeMap()
+    calls = []
+
+    @API.endpoint('fail', {'singleFlight': True})
+    def fail(makeResponse=None):
+        calls.append(1)
+        time.sleep(0.2)
+        raise ValueError('failed')
+
+    client = API.client()
+    with ThreadPoolExecutor(3) as executor:
+        responses = list(executor.map(lambda _: client.call('fail'), range(3)))
+    assert len(calls) == 1
+    assert all(response['code'] != 0 for response in responses)
+
+
+def testCancelledLeaderDoesNotFailWaiters():
+    singleFlight = SingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return len(calls)
+
+    async def main():
+        leader = asyncio.ensure_future(singleFlight.callAsync('key', slow))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(singleFlight.callAsync('key', slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        # The waiter calls again, as the new leader.
+        assert await waiter == 2
+        assert leader.cancelled()
+
+    asyncio.run(main())
+    assert singleFlight.calls == {}
+
+
+def testCancelledWaiterDoesNotCancelTheCall():
+    singleFlight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return 'done'
+
+    async def main():
+        leader = asyncio.ensure_future(singleFlight.callAsync('key', slow))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(singleFlight.callAsync('key', slow))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        assert await leader == 'done'
+
+    asyncio.run(main())
+
+
+def testInterruptedLeaderDoesNotFailWaiters():
+    singleFlight = SingleFlight()
+    started = threading.Event()
+    results = []
+
+    def interrupted():
+        started.set()
+        time.sleep(0.1)
+        raise KeyboardInterrupt
+
+    def wait():
+        started.wait(5)
+        results.append(singleFlight.call('key', lambda: 'retried'))
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    try:
+        singleFlight.call('key', interrupted)
+    except KeyboardInterrupt:
+        pass
+    waiter.join(5)
+    assert results == ['retried']
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import time
+
+from flask import Flask
+
+from RequestMap import Map
+from RequestMap.Protocols.Flask import HTTPViaFlask
+from RequestMap.Response.JSON import JSONStandardizer
+
+
+def makeApp():
+    app = Flask(__name__)
+    API = Map()
+    API.useResponseHandler(JSONStandardizer())
+    API.useProtocol(HTTPViaFlask(app))
+    return app, API
+
+
+def testStreamsAreNotCached():
+    app, API = makeApp()
+    calls = []
+
+    @API.endpoint('numbers', {'cache': {'ttl': 60}, 'httpmethods': ['GET']}, n=int)
+    def numbers(n, makeResponse=None):
+        calls.append(n)
+        return makeResponse(0, result=(i for i in range(n)))
+
+    @API.endpoint('chunks', {'cache': {'ttl': 60}, 'httpmethods': ['GET']})
+    def chunks():
+        yield 'a'
+        yield 'b'
+
+    client = app.test_client()
+    for _ in range(2):
+        assert json.loads(client.get('/numbers?n=3').data)['result'] == [0, 1, 2]
+        assert client.get('/chunks').data == b'ab'
+    assert calls == [3, 3]
+
+
+def testStreamsAreNotCoalesced():
+    app, API = makeApp()
+    calls = []
+
+    @API.endpoint('numbers', {'cache': {'ttl': 60}, 'singleFlight': True, 'httpmethods': ['GET']})
+    def numbers(makeResponse=None):
+        calls.append(1)
+        time.sleep(0.2)
+        return makeResponse(0, result=(i for i in range(3)))
+
+    def get(_):
+        return json.loads(app.test_client().get('/numbers').data)['result']
+
+    with ThreadPoolExecutor(3) as executor:
+        results = list(executor.map(get, range(3)))
+    assert results == [[0, 1, 2]] * 3
+    assert len(calls) == 3
+
+
+def testAsyncGeneratorsAreCollectedForProtocolsThatDoNotStream():
+    app, API = makeApp()
+    from RequestMap.Protocols.Flask import HTTPBatchRequestViaFlask, HTTPRequestByEndpointIdentifier
+    API.useProtocol(HTTPBatchRequestViaFlask(app))
+    API.useProtocol(HTTPRequestByEndpointIdentifier(app))
+
+    async def numbers():
+        for i in range(3):
+            yield i
+
+    @API.endpoint('numbers', {'httpmethods': ['GET']})
+    def endpoint(makeResponse=None):
+        return makeResponse(0, result=numbers())
+
+    @API.endpoint('asyncNumbers')
+    async def asyncEndpoint(makeResponse=None):
+        return makeResponse(0, result=numbers())
+
+    client = app.test_client()
+    assert json.loads(client.get('/numbers').data)['result'] == [0, 1, 2]
+    response = client.get('/science?endpointIdentifier=numbers')
+    assert response.status_code == 200 and response.get_json()['result'] == [0, 1, 2]
+    response = client.post('/batch', json={'batch': [{'endpointIdentifier': 'numbers', 'data': {}}]})
+    assert response.status_code == 200
+    assert response.get_json()[0]['response']['result'] == [0, 1, 2]
+    assert API.client().call('numbers')['result'] == [0, 1, 2]
+    # From a coroutine, the items can not be collected.
+    failed = API.client().call('asyncNumbers')
+    assert failed['code'] != 0 and 'Return a list' in failed['exception']
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from RequestMap import Map
+from RequestMap.Exceptions import ValidationError
+from RequestMap.Response.JSON import JSONStandardizer
+from RequestMap.Validators.ValidatorBase import StandardValidator
+
+
+class TokenValidator(StandardValidator):
+    def __init__(self, evaluate, cacheKey=('token',)):
+        super().__init__()
+        self.name = 'TokenValidator'
+        self.evaluate = evaluate
+        self.cacheKey = cacheKey
+        self.cacheTTL = 60
+
+    def getEvaluationMethod(self, endpoint, protocol):
+        return self.evaluate
+
+
+class RecordingValidator(StandardValidator):
+    def __init__(self, name, cost, calls, concurrent=False, delay=0):
+        super().__init__()
+        self.name = name
+        self.cost = cost
+        self.calls = calls
+        self.concurrent = concurrent
+        self.delay = delay
+
+    def getEvaluationMethod(self, endpoint, protocol):
+        def evaluate():
+            self.calls.append((self.name, threading.get_ident()))
+            time.sleep(self.delay)
+        return evaluate
+
+
+def makeMap():
+    API = Map()
+    API.useResponseHandler(JSONStandardizer())
+
+    @API.endpoint('secret')
+    def secret(makeResponse=None):
+        return makeResponse(0)
+    return API
+
+
+def checkToken(token=None):
+    if token != 'good':
+        raise ValidationError(-403, 'Invalid token')
+
+
+def testCachedEvaluationsAreKeyedOnTheToken():
+    API = makeMap()
+    API.useValidator(TokenValidator(checkToken))
+    client = API.client()
+    assert client.call('secret', token='good')['code'] == 0
+    assert client.call('secret', token='bad')['code'] == -403
+    assert client.call('secret')['code'] == -403
+
+
+@pytest.mark.parametrize('evaluate', [
+    lambda getData: checkToken(getData('token')),
+    lambda **kw: checkToken(kw['kw'].get('token')),
+    lambda user=None: None,
+])
+def testCacheKeyMustNameParametersOfTheEvaluationMethod(evaluate):
+    API = makeMap()
+    client = API.client()
+    with pytest.raises(TypeError):
+        API.useValidator(TokenValidator(evaluate))
+    assert API.installedValidators == []
+    # The map keeps working without the rejected validator.
+    assert client.call('secret')['code'] == 0
+
+
+def testValidatorsRunByCost():
+    API = makeMap()
+    calls = []
+    for name, cost in (('expensive', 10), ('cheap', 1), ('default', 0), ('alsoExpensive', 10)):
+        API.useValidator(RecordingValidator(name, cost, calls))
+    assert API.client().call('secret')['code'] == 0
+    assert [name for name, _ in calls] == ['default', 'cheap', 'expensive', 'alsoExpensive']
+
+
+def testConcurrentValidatorsRunTogether():
+    API = makeMap()
+    calls = []
+    API.useValidator(RecordingValidator('first', 1, calls))
+    for name in ('a', 'b', 'c'):
+        API.useValidator(RecordingValidator(name, 2, calls, concurrent=True, delay=0.2))
+    API.useValidator(RecordingValidator('last', 3, calls))
+    started = time.monotonic()
+    assert API.client().call('secret')['code'] == 0
+    assert time.monotonic() - started < 0.5
+    names = [name for name, _ in calls]
+    assert names[0] == 'first' and names[-1] == 'last'
+    assert sorted(names[1:4]) == ['a', 'b', 'c']
+    assert len({ident for name, ident in calls if name in 'abc'}) == 3